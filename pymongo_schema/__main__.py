@@ -15,10 +15,16 @@ from time import time
 
 import pymongo
 
-from pymongo_schema.compare import compare_schemas_bases
+from pymongo_schema.binary_schema import load_schema
+from pymongo_schema.schema_file import load_schema_file
+from pymongo_schema.compare import compare_schemas_bases, iter_schemas_drift
 from pymongo_schema.export import transform_data_to_file, HtmlOutput, TsvOutput
 from pymongo_schema.extract import extract_pymongo_client_schema
-from pymongo_schema.filter import filter_mongo_schema_namespaces
+from pymongo_schema.filter import filter_mongo_schema_namespaces, NamespaceFilter
+from pymongo_schema.fingerprint import (mongo_schema_fingerprint, compare_fingerprints,
+                                        restrict_schema_to_namespaces, write_fingerprint,
+                                        load_fingerprint)
+from pymongo_schema.load import load_pymongo_client_data
 from pymongo_schema.tosql import mongo_schema_to_mapping
 
 logger = logging.getLogger()
@@ -38,6 +44,23 @@ def add_subparser_extract(subparsers, parent_parsers):
                            help='Port to connect to MongoDB [default: 27017]')
     subparser.add_argument('--host', default='localhost',
                            help='Server to connect to MongoDB [default: localhost]')
+    subparser.add_argument('-n', '--filter',
+                           help='Config file to read namespace to filter while extracting. '
+                                'json format expected, as for transform.')
+    subparser.add_argument('--fingerprint', action='store_true',
+                           help='Write a fingerprint manifest alongside json output file')
+    subparser.add_argument('--with-stats', action='store_true',
+                           help='Add values statistics to fields schemas (numbers range, strings '
+                                'max length, approximate distinct count), used by tosql to '
+                                'choose precise SQL types')
+    subparser.add_argument('--with-sketches', action='store_true',
+                           help='Add approximate cardinality and most frequent values to fields '
+                                'schemas, from fixed-size sketches (CARDINALITY and TOP_VALUES '
+                                'columns)')
+    subparser.add_argument('--with-indexes', action='store_true',
+                           help='Add indexes (index_information) and storage stats (collStats) '
+                                'to collections schemas, and indexes names to indexed fields '
+                                '(INDEXES column)')
 
 
 def add_subparser_transform(subparsers, parent_parsers):
@@ -46,13 +69,17 @@ def add_subparser_transform(subparsers, parent_parsers):
                                       help='Transform a json schema to another format, potentially '
                                            'filtering or changing columns outputs')
     subparser.add_argument('input', nargs='?',
-                           help='json formatted input file (schema, mapping, ...). '
+                           help='json, msgpack or schemaidx formatted input file (schema, '
+                                'mapping, ...). '
                                 '[default standard input]')
     subparser.add_argument('--category', default='schema',
                            help='category of input (schema, mapping, diff) [default schema]')
     subparser.add_argument('-n', '--filter',
                            help='Config file to read namespace to filter for schema input. '
                                 'json format expected.')
+    subparser.add_argument('--fingerprint', action='store_true',
+                           help='Write a fingerprint manifest alongside json output file '
+                                '(schema category only)')
 
 
 def add_subparser_tosql(subparsers, parent_parsers):
@@ -61,8 +88,10 @@ def add_subparser_tosql(subparsers, parent_parsers):
                                       help='Create a mapping from mongo schema to relational '
                                            'schema (json input and output)')
     subparser.add_argument('input', nargs='?',
-                           help='Input schema file to map to sql (json format). '
-                                'Default to standard input')
+                           help='Input schema file to map to sql (json, msgpack or schemaidx '
+                                'format). Default to standard input')
+    subparser.add_argument('--with-indexes', action='store_true',
+                           help='Create indexes on foreign keys columns in sql (DDL) output')
 
 
 def add_subparser_compare(subparsers, parent_parsers):
@@ -74,6 +103,48 @@ def add_subparser_compare(subparsers, parent_parsers):
     subparser.add_argument('new_schema', nargs='?',
                            help='Expected schema')
     subparser.add_argument('--detailed_diff', action='store_true')
+    subparser.add_argument('--fingerprint', action='store_true',
+                           help='Compare fingerprint manifests first (written by extract or '
+                                'transform --fingerprint) and only compare collections whose '
+                                'fingerprints differ')
+    subparser.add_argument('--drift', action='store_true',
+                           help='Also compare counts, to detect statistical drifts of '
+                                'collections count, fields presence and types proportions')
+    subparser.add_argument('--prop-threshold', default=0.1, type=float,
+                           help='Minimal absolute variation of a field prop_in_object '
+                                'reported as a drift [default: 0.1]')
+    subparser.add_argument('--types-threshold', default=0.001, type=float,
+                           help='Minimal absolute variation of a type proportion in a field '
+                                'reported as a drift [default: 0.001]')
+    subparser.add_argument('--count-threshold', default=0.5, type=float,
+                           help='Minimal relative variation of a collection count '
+                                'reported as a drift [default: 0.5]')
+
+
+def add_subparser_load(subparsers):
+    """CLI argument parser for load module"""
+    subparser = subparsers.add_parser('load',
+                                      help='Load MongoDB documents as PostgreSQL COPY scripts, '
+                                           'following a mapping (from tosql)')
+    subparser.add_argument('mapping',
+                           help='Mapping file (json or msgpack format, possibly compressed)')
+    subparser.add_argument('-d', '--databases', nargs='*',
+                           help='Only load those databases. By default load all databases '
+                                'in mapping')
+    subparser.add_argument('-c', '--collections', nargs='*',
+                           help='Only load those collections. By default load all '
+                                'collections in mapping')
+    subparser.add_argument('-o', '--output',
+                           help='Output directory, with one sql file per collection. '
+                                'Default to standard output')
+    subparser.add_argument('--batch-size', default=1000, type=int,
+                           help='Number of documents read and written at once [default: 1000]')
+    subparser.add_argument('--workers', default=1, type=int,
+                           help='Number of collections loaded in parallel [default: 1]')
+    subparser.add_argument('--port', default=27017, type=int,
+                           help='Port to connect to MongoDB [default: 27017]')
+    subparser.add_argument('--host', default='localhost',
+                           help='Server to connect to MongoDB [default: localhost]')
 
 
 def main(argv=None):
@@ -85,11 +156,15 @@ def main(argv=None):
     parent_parser = ArgumentParser(add_help=False)
     parent_parser.add_argument('-f', '--formats', nargs='*', default=['json'],
                                help="List Output formats:  "
-                                    "'tsv', 'xlsx', 'yaml', 'html', 'md' or 'json'"
+                                    "'tsv', 'xlsx', 'arrow', 'parquet', 'yaml', 'html', 'md', "
+                                    "'json', 'jsonl', "
+                                    "'msgpack' (binary schema), 'schemaidx' (indexed schema) "
+                                    "'sql' (DDL from mapping) or 'sqlite' (SQLite database) "
                                     "Multiple format may be specified. [default: json]")
     parent_parser.add_argument('--columns', nargs='+',
                                help='''
-                               Columns to get in 'tsv', 'html', 'md' or 'xlsx' format.
+                               Columns to get in 'tsv', 'html', 'md', 'xlsx', 'arrow' or 'parquet'
+                               format.
                                For schema, columns are to be chosen in :
                                    FIELD_FULL_NAME ('.' for subfields, ':' for subfields in arrays)
                                    FIELD_COMPACT_NAME (idem, without parent object names)
@@ -100,16 +175,30 @@ def main(argv=None):
                                    PROP_IN_OBJECT
                                    PERCENTAGE
                                    TYPES_COUNT
+                                   CARDINALITY (extract --with-sketches)
+                                   TOP_VALUES (extract --with-sketches)
+                                   INDEXES (extract --with-indexes)
                                Columns have to be separated by whitespace, and are case insensitive.
                                Default for 'html' and 'md' output is {}
                                Default for 'tsv' and 'xlsx' output is {}'''.format(
                                    HtmlOutput.get_default_columns()['schema'],
                                    TsvOutput.get_default_columns()['schema']))
+    parent_parser.add_argument('--md-column-width', type=int,
+                               help="Fixed width of columns in 'md' format, to write it in a "
+                                    "single pass. Default fits columns to their values")
+    parent_parser.add_argument('--template-dirs', nargs='+', metavar='TEMPLATE_DIR',
+                               help="Directories where to look for data_dict.tmpl template of "
+                                    "'html' format, before default one")
+    parent_parser.add_argument('--compact', action='store_true',
+                               help="Write 'json' format without indentation")
+    parent_parser.add_argument('--binary-compression', choices=['gzip', 'zstd'],
+                               help="Compress payload of 'msgpack' format")
     parent_parser.add_argument('--without-counts', action='store_true',
-                               help='Remove counts information from json and yaml outputs')
+                               help='Remove counts information from json, jsonl and yaml outputs')
     parent_parser.add_argument('-o', '--output',
                                help='Output file. Default to standard output. Extension added '
-                                    'automatically if omitted (useful for multi-format outputs)')
+                                    'automatically if omitted (useful for multi-format outputs). '
+                                    'Compressed if it ends with .gz, .bz2, .xz or .zst')
     parser = ArgumentParser("extract schemas from MongoDB")
     parser.add_argument('--quiet', action='store_true',
                         help='Remove logging on standard output')
@@ -119,9 +208,15 @@ def main(argv=None):
     add_subparser_transform(subparsers, [parent_parser])
     add_subparser_tosql(subparsers, [parent_parser])
     add_subparser_compare(subparsers, [parent_parser])
+    add_subparser_load(subparsers)
 
     args = parser.parse_args(argv)
 
+    # Load mongo data following a mapping, output is written while loading
+    if args.command == 'load':
+        load_data(args)
+        return
+
     # Parse command line argument
     preprocess_args(args)
 
@@ -146,7 +241,9 @@ def main(argv=None):
     # Output dict
     logger.info('=== Write output')
     if output_dict:
-        transform_data_to_file(output_dict, **vars(args))
+        filenames = transform_data_to_file(output_dict, **vars(args))
+        if args.command in ['extract', 'transform'] and args.fingerprint:
+            write_schema_fingerprint(output_dict, args, filenames)
     else:
         logger.warn("WARNING : output is empty, we do not write any file.")
 
@@ -172,10 +269,17 @@ def extract_schema(args):
     start_time = time()
     logger.info('=== Start MongoDB schema analysis')
     client = pymongo.MongoClient(host=args.host, port=args.port)
+    namespace_filter = None
+    if args.filter is not None:
+        namespace_filter = NamespaceFilter(load_namespaces(args.filter))
 
     mongo_schema = extract_pymongo_client_schema(client,
                                                  database_names=args.databases,
-                                                 collection_names=args.collections)
+                                                 collection_names=args.collections,
+                                                 namespace_filter=namespace_filter,
+                                                 with_stats=args.with_stats,
+                                                 with_sketches=args.with_sketches,
+                                                 with_indexes=args.with_indexes)
 
     logger.info('--- MongoDB schema analysis took %.2f s', time() - start_time)
     return mongo_schema
@@ -186,14 +290,34 @@ def transform_schema(args):
     logger.info('=== Transform existing mongo schema (filter, new format, and/or select infos)')
     input_schema = load_input_schema(args)
     if args.filter is not None:
-        with open(args.filter, 'r') as f:
-            config = json.load(f)
-        output_schema = filter_mongo_schema_namespaces(input_schema, config['namespaces'])
+        output_schema = filter_mongo_schema_namespaces(input_schema,
+                                                       load_namespaces(args.filter))
     else:
         output_schema = input_schema
     return output_schema
 
 
+def load_data(args):
+    """ Main entry point function to load data following a mapping."""
+    start_time = time()
+    logger.info('=== Start MongoDB data load')
+    mapping = load_schema_file(args.mapping)
+    client = pymongo.MongoClient(host=args.host, port=args.port)
+    n_documents = load_pymongo_client_data(client, mapping, output=args.output,
+                                           database_names=args.databases,
+                                           collection_names=args.collections,
+                                           batch_size=args.batch_size, workers=args.workers)
+    logger.info('--- MongoDB data load of %s documents took %.2f s', n_documents,
+                time() - start_time)
+
+
+def load_namespaces(filename):
+    """Load namespaces from a mongo-connector json config file."""
+    with open(filename, 'r') as f:
+        config = json.load(f)
+    return config['namespaces']
+
+
 def schema_to_sql(args):
     """ Main entry point function to generate a mapping from mongo to sql."""
     logger.info('=== Generate mapping from mongo to sql')
@@ -202,24 +326,79 @@ def schema_to_sql(args):
     return mongo_to_sql_mapping
 
 
+def write_schema_fingerprint(mongo_schema, args, filenames):
+    """ Write fingerprint manifest alongside output schema files (filenames)."""
+    if getattr(args, 'category', 'schema') != 'schema':
+        logger.warn("WARNING : fingerprint is only available for schema category, "
+                    "we do not write it.")
+    elif args.output is None:
+        logger.warn("WARNING : fingerprint is not supported on standard output, "
+                    "we do not write it.")
+    else:
+        write_fingerprint(mongo_schema, args.output, schema_filenames=filenames)
+
+
 def compare_schemas(args):
     """ Main entry point function to compare two schemas."""
     logger.info('=== Compare schemas')
+    if args.fingerprint:
+        if not args.drift:
+            return compare_schemas_with_fingerprints(args)
+        logger.warn("WARNING : fingerprints do not account for counts, "
+                    "they are not used to detect drifts.")
     prev_schema = load_input_schema(args, opt='prev_schema')
     new_schema = load_input_schema(args, opt='new_schema')
     diff = compare_schemas_bases(prev_schema, new_schema, detailed_diff=args.detailed_diff)
+    if args.drift:
+        diff += iter_schemas_drift(prev_schema, new_schema,
+                                   prop_threshold=args.prop_threshold,
+                                   types_threshold=args.types_threshold,
+                                   count_threshold=args.count_threshold)
     return diff
 
 
+def compare_schemas_with_fingerprints(args):
+    """ Compare fingerprints manifests, then schemas of collections whose fingerprint differ.
+
+    Schemas are only loaded if their manifest is missing, or if fingerprints differ.
+    """
+    schemas = dict()
+    fingerprints = dict()
+    for opt in ['prev_schema', 'new_schema']:
+        fingerprints[opt] = load_fingerprint(getattr(args, opt)) if getattr(args, opt) else None
+        if fingerprints[opt] is None:
+            logger.info('No fingerprint found for %s, compute it from schema', opt)
+            schemas[opt] = load_input_schema(args, opt=opt)
+            fingerprints[opt] = mongo_schema_fingerprint(schemas[opt])
+
+    changed_namespaces = compare_fingerprints(fingerprints['prev_schema'],
+                                              fingerprints['new_schema'])
+    if not changed_namespaces:
+        logger.info('Schemas fingerprints are identical')
+        return []
+    logger.info('%s namespaces have different fingerprints', len(changed_namespaces))
+
+    for opt in ['prev_schema', 'new_schema']:
+        if opt not in schemas:
+            schemas[opt] = load_input_schema(args, opt=opt)
+        schemas[opt] = restrict_schema_to_namespaces(schemas[opt], changed_namespaces)
+
+    return compare_schemas_bases(schemas['prev_schema'], schemas['new_schema'],
+                                 detailed_diff=args.detailed_diff)
+
+
 def load_input_schema(args, opt='input'):
-    """Load schema from file or stdin."""
+    """ Load schema from json or binary schema (msgpack) file or stdin.
+
+    Indexed schema files (schemaidx) are mapped in memory, collections being loaded lazily.
+    Files ending with .gz, .bz2, .xz or .zst are decompressed while they are read.
+    """
     try:
         filename = getattr(args, opt)
     except AttributeError:
-        input_schema = json.load(sys.stdin)
+        input_schema = load_schema(getattr(sys.stdin, 'buffer', sys.stdin))
     else:
-        with open(filename, 'r') as f:
-            input_schema = json.load(f)
+        input_schema = load_schema_file(filename)
 
     return input_schema
 
@@ -0,0 +1,112 @@
+# coding: utf8
+"""
+This module intends to store schemas (or mappings, diffs) in a binary container, faster to write
+and to load than json text.
+
+The container is made of:
+- MAGIC bytes, allowing to detect binary schemas among json ones (see load_schema),
+- one byte for the compression of the payload: COMPRESSIONS keys,
+- the payload: data serialized with MessagePack (msgpack library), possibly compressed
+  with gzip or zstd (zstandard library).
+
+BSON types (ObjectId, datetime, ...) are serialized as MongoDB extended json dicts
+(bson.json_util), so that a binary schema loads to the same data as a json schema.
+"""
+import gzip
+import io
+
+from bson import json_util
+
+from pymongo_schema import json_backend
+
+MAGIC = b'PMSCHEMA'
+
+# Compression byte, by compression name
+COMPRESSIONS = {None: b'n', 'gzip': b'g', 'zstd': b'z'}
+
+
+def is_binary_schema(header):
+    """ Check if the first bytes of a file are those of a binary schema.
+
+    :param header: bytes - first bytes of a file (at least len(MAGIC))
+    :return is_binary: bool
+    """
+    return header[:len(MAGIC)] == MAGIC
+
+
+def dumps_binary_schema(data, compression=None):
+    """ Serialize data to a binary schema container.
+
+    :param data: json like structure, possibly with BSON types
+    :param compression: str, default None - None, 'gzip' or 'zstd'
+    :return binary_schema: bytes
+    """
+    import msgpack
+
+    if compression not in COMPRESSIONS:
+        raise ValueError("Compression of binary schema should be one of {}, not {}".format(
+            sorted(COMPRESSIONS, key=str), compression))
+    payload = msgpack.packb(data, default=json_util.default, use_bin_type=True)
+    if compression == 'gzip':
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_fd:
+            gzip_fd.write(payload)
+        payload = compressed.getvalue()
+    elif compression == 'zstd':
+        import zstandard
+        payload = zstandard.ZstdCompressor().compress(payload)
+    return MAGIC + COMPRESSIONS[compression] + payload
+
+
+def loads_binary_schema(binary_schema):
+    """ Deserialize a binary schema container.
+
+    :param binary_schema: bytes - from dumps_binary_schema
+    :return data: json like structure
+    """
+    return load_binary_schema(io.BytesIO(binary_schema))
+
+
+def load_binary_schema(file_descr):
+    """ Deserialize a binary schema container from a file, decompressing and decoding its
+    payload while it is read.
+
+    :param file_descr: file like object, opened in binary mode
+    :return data: json like structure
+    """
+    header = file_descr.read(len(MAGIC))
+    if not is_binary_schema(header):
+        raise ValueError("Not a binary schema, it should start with {!r}".format(MAGIC))
+    return _load_binary_payload(file_descr)
+
+
+def _load_binary_payload(file_descr):
+    """Decode the payload of a binary schema, file_descr being positioned after MAGIC bytes."""
+    import msgpack
+
+    compression_byte = file_descr.read(1)
+    if compression_byte == COMPRESSIONS['gzip']:
+        file_descr = gzip.GzipFile(fileobj=file_descr, mode='rb')
+    elif compression_byte == COMPRESSIONS['zstd']:
+        import zstandard
+        file_descr = zstandard.ZstdDecompressor().stream_reader(file_descr)
+    elif compression_byte != COMPRESSIONS[None]:
+        raise ValueError("Unknown compression of binary schema: {!r}".format(compression_byte))
+    # max_buffer_size=0: no limit on the size of the payload (100MiB by default)
+    unpacker = msgpack.Unpacker(file_descr, raw=False, strict_map_key=False, max_buffer_size=0)
+    return unpacker.unpack()
+
+
+def load_schema(file_descr):
+    """ Load a schema (or mapping, ...) from a binary schema or json file.
+
+    The format is detected from MAGIC bytes. Binary schemas are decoded while they are read,
+    json text is read entirely by json libraries.
+
+    :param file_descr: file like object, opened in binary mode
+    :return data: json like structure
+    """
+    header = file_descr.read(len(MAGIC))
+    if is_binary_schema(header):
+        return _load_binary_payload(file_descr)
+    return json_backend.loads(header + file_descr.read())
@@ -0,0 +1,186 @@
+# coding: utf8
+"""
+This module intends to write schemas, mappings and diffs into a SQLite database, as normalized
+tables, so that they can be queried with SQL. For example:
+
+    SELECT c.name, f.path FROM fields f JOIN collections c ON c.id = f.collection_id
+    WHERE f.name = 'email' AND f.type = 'string';
+
+Tables by category (see CATALOG_DDL):
+- schema: databases, collections, fields (with parent_id for subfields) and types_count
+  (one row per type of each field, in_array being 1 for types counted in arrays).
+  Field path is its full name in other outputs:
+  '.' separates object subfields, ':' separates subfields of arrays of objects.
+- mapping: mapping_tables and mapping_columns
+- diff: diffs, previous and new schemas being json texts
+
+Rows are inserted with executemany, collection by collection (or table by table),
+in a single transaction. Indexes are created once rows are inserted.
+"""
+from itertools import count
+
+from pymongo_schema import json_backend
+from pymongo_schema.schema_index import SchemaIndex
+
+CATALOG_DDL = {
+    'schema': [
+        'CREATE TABLE databases (id INTEGER PRIMARY KEY, name TEXT NOT NULL)',
+        'CREATE TABLE collections (id INTEGER PRIMARY KEY, '
+        'database_id INTEGER NOT NULL REFERENCES databases (id), name TEXT NOT NULL, '
+        'count INTEGER)',
+        'CREATE TABLE fields (id INTEGER PRIMARY KEY, '
+        'collection_id INTEGER NOT NULL REFERENCES collections (id), '
+        'parent_id INTEGER REFERENCES fields (id), name TEXT NOT NULL, path TEXT NOT NULL, '
+        'depth INTEGER NOT NULL, type TEXT, array_type TEXT, count INTEGER, '
+        'prop_in_object REAL)',
+        'CREATE TABLE types_count (field_id INTEGER NOT NULL REFERENCES fields (id), '
+        'type TEXT NOT NULL, count INTEGER NOT NULL, in_array INTEGER NOT NULL)',
+    ],
+    'mapping': [
+        'CREATE TABLE mapping_tables (id INTEGER PRIMARY KEY, database TEXT NOT NULL, '
+        'name TEXT NOT NULL, pk TEXT, comment TEXT)',
+        'CREATE TABLE mapping_columns (id INTEGER PRIMARY KEY, '
+        'table_id INTEGER NOT NULL REFERENCES mapping_tables (id), field TEXT NOT NULL, '
+        'dest TEXT, type TEXT, fk TEXT, value_field TEXT)',
+    ],
+    'diff': [
+        'CREATE TABLE diffs (id INTEGER PRIMARY KEY, database TEXT NOT NULL, collection TEXT, '
+        'hierarchy TEXT NOT NULL, prev_schema TEXT, new_schema TEXT)',
+    ],
+}
+
+CATALOG_INDEXES = {
+    'schema': [
+        'CREATE INDEX collections_name ON collections (name)',
+        'CREATE INDEX fields_collection_id ON fields (collection_id)',
+        'CREATE INDEX fields_name ON fields (name)',
+        'CREATE INDEX fields_path ON fields (path)',
+        'CREATE INDEX fields_type ON fields (type)',
+        'CREATE INDEX types_count_field_id ON types_count (field_id)',
+        'CREATE INDEX types_count_type ON types_count (type)',
+    ],
+    'mapping': [
+        'CREATE INDEX mapping_tables_name ON mapping_tables (name)',
+        'CREATE INDEX mapping_columns_table_id ON mapping_columns (table_id)',
+        'CREATE INDEX mapping_columns_field ON mapping_columns (field)',
+        'CREATE INDEX mapping_columns_type ON mapping_columns (type)',
+    ],
+    'diff': [
+        'CREATE INDEX diffs_database_collection ON diffs (database, collection)',
+    ],
+}
+
+
+def write_catalog(data, connection, category='schema'):
+    """ Write data into a SQLite database, in a single transaction.
+
+    :param data: schema, mapping or diff (iterable of dicts)
+    :param connection: sqlite3.Connection - to an empty database
+    :param category: str in 'schema', 'mapping', 'diff'
+    """
+    if category not in CATALOG_DDL:
+        raise ValueError("category should be one of {}, not {}".format(
+            sorted(CATALOG_DDL), category))
+    write_rows = {'schema': write_schema_rows, 'mapping': write_mapping_rows,
+                  'diff': write_diff_rows}[category]
+    with connection:  # commit at the end, or rollback on error
+        connection.execute('BEGIN')  # also for CREATE statements
+        for statement in CATALOG_DDL[category]:
+            connection.execute(statement)
+        write_rows(data, connection)
+        for statement in CATALOG_INDEXES[category]:
+            connection.execute(statement)
+
+
+def write_schema_rows(mongo_schema, connection):
+    """ Insert rows of databases, collections, fields and types_count tables.
+
+    :param mongo_schema: dict
+    :param connection: sqlite3.Connection
+    """
+    field_ids = count(1)
+    collection_id = 0
+    for database_id, db in enumerate(sorted(mongo_schema), 1):
+        connection.execute('INSERT INTO databases (id, name) VALUES (?, ?)', (database_id, db))
+        for collection in sorted(mongo_schema[db]):
+            collection_id += 1
+            collection_schema = mongo_schema[db][collection]
+            connection.execute(
+                'INSERT INTO collections (id, database_id, name, count) VALUES (?, ?, ?, ?)',
+                (collection_id, database_id, collection, collection_schema.get('count')))
+            fields_rows, types_count_rows = make_fields_rows(
+                SchemaIndex(collection_schema.get('object', {})), collection_id, field_ids)
+            connection.executemany(
+                'INSERT INTO fields (id, collection_id, parent_id, name, path, depth, type, '
+                'array_type, count, prop_in_object) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                fields_rows)
+            connection.executemany(
+                'INSERT INTO types_count (field_id, type, count, in_array) VALUES (?, ?, ?, ?)',
+                types_count_rows)
+
+
+def make_fields_rows(schema_index, collection_id, field_ids):
+    """ Make rows of fields and types_count tables, for fields of a collection.
+
+    :param schema_index: SchemaIndex - of collection object schema
+    :param collection_id: int
+    :param field_ids: iterator of field ids
+    :return fields_rows, types_count_rows: lists of tuples
+    """
+    ids_by_path = {(): None}
+    fields_rows = []
+    types_count_rows = []
+    for path, field_schema in schema_index.items():  # parents come before their subfields
+        field_id = ids_by_path[path] = next(field_ids)
+        fields_rows.append((field_id, collection_id, ids_by_path[schema_index.parent(path)],
+                            path[-1], schema_index.full_name(path), schema_index.depth(path),
+                            field_schema.get('type'), field_schema.get('array_type'),
+                            field_schema.get('count'), field_schema.get('prop_in_object')))
+        for in_array, key in enumerate(['types_count', 'array_types_count']):
+            for type_str, type_count in sorted(field_schema.get(key, {}).items()):
+                types_count_rows.append((field_id, type_str, type_count, in_array))
+    return fields_rows, types_count_rows
+
+
+def write_mapping_rows(mapping, connection):
+    """ Insert rows of mapping_tables and mapping_columns tables.
+
+    :param mapping: dict
+    :param connection: sqlite3.Connection
+    """
+    column_ids = count(1)
+    table_id = 0
+    for db in sorted(mapping):
+        for table in sorted(mapping[db]):
+            table_id += 1
+            table_mapping = mapping[db][table]
+            connection.execute(
+                'INSERT INTO mapping_tables (id, database, name, pk, comment) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (table_id, db, table, table_mapping.get('pk'), table_mapping.get('comment')))
+            connection.executemany(
+                'INSERT INTO mapping_columns (id, table_id, field, dest, type, fk, value_field) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(next(column_ids), table_id, field, field_mapping.get('dest'),
+                  field_mapping.get('type'), field_mapping.get('fk'),
+                  field_mapping.get('valueField'))
+                 for field, field_mapping in sorted(table_mapping.items())
+                 if field not in ['pk', 'comment']])
+
+
+def write_diff_rows(diff, connection):
+    """ Insert rows of diffs table.
+
+    :param diff: iterable of dicts - from compare module
+    :param connection: sqlite3.Connection
+    """
+    def make_row(line):
+        """Closure - diff line to row, database and collection being the start of hierarchy."""
+        hierarchy = line['hierarchy'].split('.')
+        return (hierarchy[0], hierarchy[1] if len(hierarchy) > 1 else None, line['hierarchy'],
+                None if line['prev_schema'] is None else json_backend.dumps(line['prev_schema']),
+                None if line['new_schema'] is None else json_backend.dumps(line['new_schema']))
+
+    connection.executemany(
+        'INSERT INTO diffs (database, collection, hierarchy, prev_schema, new_schema) '
+        'VALUES (?, ?, ?, ?, ?)', (make_row(line) for line in diff))
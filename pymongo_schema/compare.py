@@ -4,10 +4,17 @@ This module intends to compare two mongo schemas (from extract module)
 """
 from collections import OrderedDict
 
+from pymongo_schema.schema_index import SchemaIndex
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
+
 
 def sort_dict(dict_to_sort):
     """Recursively copy dictionary alphabetically sorted."""
-    if not isinstance(dict_to_sort, dict):
+    if not isinstance(dict_to_sort, Mapping):
         return dict_to_sort
     sorted_dict = OrderedDict()
     for k in sorted(dict_to_sort):
@@ -47,51 +54,112 @@ def compare_schemas_bases(prev_schema, new_schema, hierarchy='', detailed_diff=F
                   'prev_schema': differing_value_in_prev_schema,
                   'new_schema': differing_value_in_new_schema}]
     """
+    return list(iter_schemas_bases_diff(prev_schema, new_schema, hierarchy=hierarchy,
+                                        detailed_diff=detailed_diff))
+
+
+def iter_schemas_bases_diff(prev_schema, new_schema, hierarchy='', detailed_diff=False):
+    """
+    Generator version of compare_schemas_bases, yielding differences as they are found.
+
+    Differences are yielded in the same order as in compare_schemas_bases result.
+    It allows to stop comparing at the first difference needed (see is_retrocompatible).
+
+    :param prev_schema: dict - previous schema to compare to
+    :param new_schema: dict - new schema to be compared
+    :param hierarchy: string - describe level of recursion (keep tracks of previous levels)
+    :param detailed_diff: boolean - display full diff if True else just first difference
+                                    default False
+    :return: generator of dicts describing differences (see compare_schemas_bases)
+    """
     if detailed_diff:
-        make_diff = lambda f, schema: sort_dict(schema[f])
+        make_diff = lambda f, f_schema: sort_dict(f_schema)
     else:
-        make_diff = lambda f, schema: f
-
-    diff = []
+        make_diff = lambda f, f_schema: f
 
     additional_fields = set(new_schema) - set(prev_schema)
     missing_fields = set(prev_schema) - set(new_schema)
 
     # manage additional / missing fields
     for field in missing_fields:
-        diff.append({'hierarchy': '{}.{}'.format(hierarchy, field) if hierarchy else field,
-                     'prev_schema': make_diff(field, prev_schema), 'new_schema': None})
+        yield {'hierarchy': '{}.{}'.format(hierarchy, field) if hierarchy else field,
+               'prev_schema': make_diff(field, prev_schema[field]), 'new_schema': None}
     for field in additional_fields:
-        diff.append({'hierarchy': '{}.{}'.format(hierarchy, field) if hierarchy else field,
-                     'prev_schema': None, 'new_schema': make_diff(field, new_schema)})
+        yield {'hierarchy': '{}.{}'.format(hierarchy, field) if hierarchy else field,
+               'prev_schema': None, 'new_schema': make_diff(field, new_schema[field])}
 
     # manage differences
     for field in sorted(set(prev_schema) & set(new_schema)):
         # manage initial case: field is db name and values are collections (not fields yet)
 
         if not hierarchy:
-            diff += compare_schemas_bases(prev_schema[field], new_schema[field], hierarchy=field,
-                                          detailed_diff=detailed_diff)
+            for line in iter_schemas_bases_diff(prev_schema[field], new_schema[field],
+                                                hierarchy=field, detailed_diff=detailed_diff):
+                yield line
 
         # manage regular case (differences of fields type)
         if prev_schema[field].get('type') != new_schema[field].get('type'):
-            diff.append({'hierarchy': '{}.{}'.format(hierarchy, field),
-                         'prev_schema': {'type': prev_schema[field]['type']},
-                         'new_schema': {'type': new_schema[field]['type']}})
+            yield {'hierarchy': '{}.{}'.format(hierarchy, field),
+                   'prev_schema': {'type': prev_schema[field]['type']},
+                   'new_schema': {'type': new_schema[field]['type']}}
 
         # manage array case (differences of fields array_type) only if both types are ARRAY
         elif prev_schema[field].get('array_type') != new_schema[field].get('array_type'):
-            diff.append({'hierarchy': '{}.{}'.format(hierarchy, field),
-                         'prev_schema': {'array_type': prev_schema[field]['array_type']},
-                         'new_schema': {'array_type': new_schema[field]['array_type']}})
+            yield {'hierarchy': '{}.{}'.format(hierarchy, field),
+                   'prev_schema': {'array_type': prev_schema[field]['array_type']},
+                   'new_schema': {'array_type': new_schema[field]['array_type']}}
 
-        # recursion in case of nested object
+        # comparison of fields of nested object, walked through their index
         if 'object' in prev_schema[field] and 'object' in new_schema[field]:
-            diff += compare_schemas_bases(prev_schema[field]['object'],
-                                          new_schema[field]['object'],
-                                          hierarchy='{}.{}'.format(hierarchy, field),
-                                          detailed_diff=detailed_diff)
-    return diff
+            for line in _iter_indexed_fields_diff(SchemaIndex(prev_schema[field]['object']),
+                                                  SchemaIndex(new_schema[field]['object']),
+                                                  (), '{}.{}'.format(hierarchy, field),
+                                                  make_diff):
+                yield line
+
+
+def _iter_indexed_fields_diff(prev_index, new_index, path, hierarchy, make_diff):
+    """
+    Recursively yield differences of subfields of path, as iter_schemas_bases_diff.
+
+    :param prev_index: SchemaIndex - of previous object schema
+    :param new_index: SchemaIndex - of new object schema
+    :param path: tuple - path of parent field in both indexes, () for top-level fields
+    :param hierarchy: string - hierarchy of the object schemas (db_name.coll_name)
+    :param make_diff: function (field, field_schema) -> value describing a missing field
+    :return: generator of dicts describing differences
+    """
+    prev_fields = prev_index.children(path)
+    new_fields = new_index.children(path)
+
+    def field_hierarchy(schema_index, field_path):
+        """Closure - hierarchy of a field, being only built for a difference."""
+        return '{}.{}'.format(hierarchy, schema_index.dotted_name(field_path))
+
+    for field in set(prev_fields) - set(new_fields):
+        yield {'hierarchy': field_hierarchy(prev_index, prev_fields[field]),
+               'prev_schema': make_diff(field, prev_index[prev_fields[field]]),
+               'new_schema': None}
+    for field in set(new_fields) - set(prev_fields):
+        yield {'hierarchy': field_hierarchy(new_index, new_fields[field]),
+               'prev_schema': None,
+               'new_schema': make_diff(field, new_index[new_fields[field]])}
+
+    for field in sorted(set(prev_fields) & set(new_fields)):
+        prev_field, new_field = prev_index[prev_fields[field]], new_index[new_fields[field]]
+        if prev_field.get('type') != new_field.get('type'):
+            yield {'hierarchy': field_hierarchy(prev_index, prev_fields[field]),
+                   'prev_schema': {'type': prev_field['type']},
+                   'new_schema': {'type': new_field['type']}}
+        elif prev_field.get('array_type') != new_field.get('array_type'):
+            yield {'hierarchy': field_hierarchy(prev_index, prev_fields[field]),
+                   'prev_schema': {'array_type': prev_field['array_type']},
+                   'new_schema': {'array_type': new_field['array_type']}}
+
+        if 'object' in prev_field and 'object' in new_field:
+            for line in _iter_indexed_fields_diff(prev_index, new_index, prev_fields[field],
+                                                  hierarchy, make_diff):
+                yield line
 
 
 def is_retrocompatible(diff):
@@ -105,10 +173,124 @@ def is_retrocompatible(diff):
     - a field (or collection or database) has been removed
     - a field has been modified
 
-    :param diff: list of dicts containing differences between two schemas (compare_schemas_bases)
+    Iteration stops at the first breaking difference,
+    so a generator from iter_schemas_bases_diff is only consumed up to this difference.
+
+    :param diff: iterable of dicts containing differences between two schemas
+                (compare_schemas_bases or iter_schemas_bases_diff)
     :return: boolean
     """
     for line in diff:
         if line['prev_schema'] is not None:
             return False
     return True
+
+
+def is_schema_retrocompatible(prev_schema, new_schema):
+    """
+    Determine whether new_schema is retrocompatible with prev_schema (see is_retrocompatible).
+
+    Schemas are compared lazily: comparison stops at the first breaking difference.
+
+    :param prev_schema: dict - previous schema to compare to
+    :param new_schema: dict - new schema to be compared
+    :return: boolean
+    """
+    return is_retrocompatible(iter_schemas_bases_diff(prev_schema, new_schema))
+
+
+def iter_schemas_drift(prev_schema, new_schema, prop_threshold=0.1, types_threshold=0.001,
+                       count_threshold=0.5):
+    """
+    Compare counts of two schemas, yielding statistical drifts as compare_schemas_bases lines.
+
+    Databases, collections and fields present in both schemas are visited once.
+    Drifts compared are:
+    - collections 'count': relative variation is at least count_threshold
+    - fields 'prop_in_object': absolute variation is at least prop_threshold
+    - fields proportion of each type in 'types_count' and 'array_types_count':
+      absolute variation is at least types_threshold (reported as 'types_prop'
+      and 'array_types_prop', only for drifting types)
+
+    example:
+    with inputs:
+    prev_schema = {'db': {'coll': {'count': 100, 'object': {
+        'field1': {'count': 99, 'prop_in_object': 0.99, 'types_count': {'integer': 99}}}}}}
+    new_schema = {'db': {'coll': {'count': 100, 'object': {
+        'field1': {'count': 40, 'prop_in_object': 0.4, 'types_count': {'integer': 40}}}}}}
+
+    result will be:
+    [{'hierarchy': 'db.coll.field1',
+      'prev_schema': {'prop_in_object': 0.99},
+      'new_schema': {'prop_in_object': 0.4}}]
+
+    :param prev_schema: dict - previous schema to compare to
+    :param new_schema: dict - new schema to be compared
+    :param prop_threshold: float - minimal absolute variation of 'prop_in_object'
+    :param types_threshold: float - minimal absolute variation of a type proportion
+    :param count_threshold: float - minimal relative variation of a collection 'count'
+    :return: generator of dicts describing drifts
+                {'hierarchy': db_name.coll_name.field_name,
+                 'prev_schema': {drifting_key: prev_value},
+                 'new_schema': {drifting_key: new_value}}
+    """
+    for db in sorted(set(prev_schema) & set(new_schema)):
+        for coll in sorted(set(prev_schema[db]) & set(new_schema[db])):
+            hierarchy = '{}.{}'.format(db, coll)
+            prev_coll, new_coll = prev_schema[db][coll], new_schema[db][coll]
+            prev_count, new_count = prev_coll.get('count'), new_coll.get('count')
+            if prev_count is not None and new_count is not None and prev_count != new_count:
+                variation = abs(new_count - prev_count) / float(prev_count) if prev_count else 1.
+                if variation >= count_threshold:
+                    yield {'hierarchy': hierarchy,
+                           'prev_schema': {'count': prev_count},
+                           'new_schema': {'count': new_count}}
+
+            for line in _iter_objects_drift(prev_coll.get('object', {}),
+                                            new_coll.get('object', {}), hierarchy,
+                                            prop_threshold, types_threshold):
+                yield line
+
+
+def _iter_objects_drift(prev_object, new_object, hierarchy, prop_threshold, types_threshold):
+    """Recursively yield drifts of fields present in both object schemas."""
+    for field in sorted(set(prev_object) & set(new_object)):
+        field_hierarchy = '{}.{}'.format(hierarchy, field)
+        prev_field, new_field = prev_object[field], new_object[field]
+        prev_drift, new_drift = dict(), dict()
+
+        prev_prop, new_prop = prev_field.get('prop_in_object'), new_field.get('prop_in_object')
+        if prev_prop is not None and new_prop is not None and \
+                abs(new_prop - prev_prop) >= prop_threshold:
+            prev_drift['prop_in_object'] = prev_prop
+            new_drift['prop_in_object'] = new_prop
+
+        for types_key, prop_key in [('types_count', 'types_prop'),
+                                    ('array_types_count', 'array_types_prop')]:
+            if types_key not in prev_field or types_key not in new_field:
+                continue
+            prev_types_prop = _types_proportions(prev_field[types_key])
+            new_types_prop = _types_proportions(new_field[types_key])
+            drifting_types = [t for t in sorted(set(prev_types_prop) | set(new_types_prop))
+                              if abs(new_types_prop.get(t, 0.) - prev_types_prop.get(t, 0.))
+                              >= types_threshold]
+            if drifting_types:
+                prev_drift[prop_key] = {t: prev_types_prop.get(t, 0.) for t in drifting_types}
+                new_drift[prop_key] = {t: new_types_prop.get(t, 0.) for t in drifting_types}
+
+        if prev_drift:
+            yield {'hierarchy': field_hierarchy,
+                   'prev_schema': prev_drift, 'new_schema': new_drift}
+
+        if 'object' in prev_field and 'object' in new_field:
+            for line in _iter_objects_drift(prev_field['object'], new_field['object'],
+                                            field_hierarchy, prop_threshold, types_threshold):
+                yield line
+
+
+def _types_proportions(types_count):
+    """Proportion of each type in types_count, rounded as 'prop_in_object'."""
+    total = float(sum(types_count.values()))
+    if not total:
+        return {}
+    return {type_name: round(count / total, 4) for type_name, count in types_count.items()}
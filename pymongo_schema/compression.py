@@ -0,0 +1,68 @@
+# coding: utf8
+"""
+This module intends to read and write compressed files, the compression being given
+by the file extension: COMPRESSION_EXTENSIONS ('.gz', '.bz2', '.xz', '.zst').
+
+Compressed files are opened as streams: data is (de)compressed while it is written or read.
+zstd compression needs zstandard library.
+"""
+import bz2
+import gzip
+import io
+import os
+
+# Compression by file extension
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+
+
+def split_compression_extension(filename):
+    """ Split the compression extension of a filename, if any.
+
+    >>> split_compression_extension('mongo_schema.json.gz')
+    ('mongo_schema.json', '.gz')
+    >>> split_compression_extension('mongo_schema.json')
+    ('mongo_schema.json', '')
+
+    :param filename: str
+    :return: tuple (filename without compression extension, compression extension or '')
+    """
+    base_filename, extension = os.path.splitext(filename)
+    if extension in COMPRESSION_EXTENSIONS:
+        return base_filename, extension
+    return filename, ''
+
+
+def get_compression(filename):
+    """ Get the compression of a file from its extension.
+
+    :param filename: str
+    :return compression: str in COMPRESSION_EXTENSIONS values, or None if not compressed
+    """
+    return COMPRESSION_EXTENSIONS.get(split_compression_extension(filename)[1])
+
+
+def open_compressed(filename, mode='rb'):
+    """ Open a compressed file as a stream, compression being given by its extension.
+
+    :param filename: str
+    :param mode: str - 'rb', 'wb', or 'r', 'w' for text (utf-8) streams
+    :return file_descr: file like object
+    """
+    compression = get_compression(filename)
+    binary_mode = mode[0] + 'b'
+    if compression == 'gzip':
+        file_descr = gzip.GzipFile(filename, mode=binary_mode)
+    elif compression == 'bz2':
+        file_descr = bz2.BZ2File(filename, mode=binary_mode)
+    elif compression == 'xz':
+        import lzma
+        file_descr = lzma.LZMAFile(filename, mode=binary_mode)
+    elif compression == 'zstd':
+        import zstandard
+        file_descr = zstandard.open(filename, mode=binary_mode)
+    else:
+        raise ValueError("{} is not a compressed file, extension should be in {}".format(
+            filename, sorted(COMPRESSION_EXTENSIONS)))
+    if 'b' in mode:
+        return file_descr
+    return io.TextIOWrapper(file_descr, encoding='utf-8')
@@ -14,38 +14,94 @@ The opener method should be overridden as well if open method is not enough
 (to manage non ascii for example).
 
 It is inherited by two base classes, that represent two groups of outputs:
-HierarchicalOutput for nested formats (yaml and json)
-ListOutput for table like formats (tsv, md, html - since this format displays a table, xlsx).
+HierarchicalOutput for nested formats (yaml, json, jsonl, msgpack and schemaidx)
+ListOutput for table like formats (tsv, md, html - since this format displays a table, xlsx,
+arrow and parquet).
 They intend to preprocess data as this is common to each group of output.
 They use OutputPreProcessing class to deal with this preprocessing.
 This class is a factory that will allow to use the right preprocessing methods
 depending on the category treated (schema, mapping, ...).
+Filtered data of hierarchical outputs, and field indexes (SchemaIndex) and lines of table like
+outputs, can be shared between outputs through a cache dict,
+so that transform_data_to_file preprocesses data once for several formats.
+Lines are kept in cache by (category, columns) only if several table like formats are written
+(SHARE_LINES_KEY set in cache), otherwise they are streamed.
+
+Table like formats are written from lines generated by OutputPreProcessing.iter_lines,
+without building a pandas dataframe: TsvOutput, MdOutput and XlsxOutput stream them into
+the file, ArrowOutput and ParquetOutput write them by typed record batches,
+HtmlOutput groups them by collection in a single pass.
 
 Then those base classes are used (inherited from) to define each format:
-JsonOutput, YamlOutput, TsvOutput, HtmlOutput, MdOutput, XlsxOutput
+JsonOutput, JsonlOutput, YamlOutput, MsgpackOutput, SchemaidxOutput,
+TsvOutput, HtmlOutput, MdOutput, XlsxOutput, ArrowOutput, ParquetOutput
+
+SqlOutput directly inherits from BaseOutput, to write DDL from a mapping,
+as SqliteOutput, to write normalized tables in a SQLite database.
 """
 import abc
 import codecs
-import csv
 import json
 import logging
 import os
 import re
+import shutil
+import sqlite3
 import sys
 from contextlib import contextmanager
 from functools import partial
+from itertools import islice
 from numbers import Number
 
 import yaml
 import jinja2
-from bson import json_util
 from future.moves.collections import OrderedDict
 from past.builtins import basestring
-import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from pymongo_schema import json_backend
+from pymongo_schema.binary_schema import dumps_binary_schema
+from pymongo_schema.catalog import write_catalog
+from pymongo_schema.compression import open_compressed, split_compression_extension
+from pymongo_schema.schema_file import SchemaFile, dump_indexed_schema
+from pymongo_schema.schema_index import SchemaIndex
+from pymongo_schema.tosql import mapping_to_ddl
 
 logger = logging.getLogger(__name__)
 
+# Arrow types of columns in parquet and arrow outputs, by snake case column name (default string)
+ARROW_COLUMNS_TYPES = {'count': 'int64', 'cardinality': 'int64', 'depth': 'int8',
+                       'percentage': 'float64', 'prop_in_object': 'float64'}
+
+# Separators of parent objects in field full names, counted by depth and kept in compact names
+FIELD_SEPARATORS_REGEX = re.compile('[.:]')
+
+# Directory of default templates (data_dict.tmpl for html output)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources')
+
+# jinja2 environments by user templates directories, compiled templates being kept in memory
+# and their bytecode in a file system cache, shared between processes
+_TEMPLATE_ENVIRONMENTS = dict()
+
+
+def get_template_environment(template_dirs=None):
+    """ Get the jinja2 environment loading templates from template_dirs, then TEMPLATES_DIR.
+
+    Environments are created once by template_dirs, so that templates are compiled once.
+
+    :param template_dirs: list of str, default None - directories of user templates,
+                          overriding default templates with the same name
+    :return environment: jinja2.Environment
+    """
+    template_dirs = tuple(template_dirs or ())
+    if template_dirs not in _TEMPLATE_ENVIRONMENTS:
+        _TEMPLATE_ENVIRONMENTS[template_dirs] = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(list(template_dirs) + [TEMPLATES_DIR]),
+            bytecode_cache=jinja2.FileSystemBytecodeCache())
+    return _TEMPLATE_ENVIRONMENTS[template_dirs]
+
 
 class BaseOutput(object):
     """
@@ -63,11 +119,19 @@ class BaseOutput(object):
     opener
     closer
 
+    Class attributes:
+    binary: bool - written data is bytes, compressed files are opened in binary mode
+    compressible: bool - whether file can be compressed (see compression module)
+
     Other public method (should not be overridden):
     open: context manager that yields the file ready to be written into by write_data.
         It uses private methods opener and closer to define how to open and close the file
+        If filename ends with a compression extension ('.gz', '.bz2', '.xz', '.zst'),
+        the file is compressed while it is written.
     """
     __metaclass__ = abc.ABCMeta
+    binary = False
+    compressible = True
 
     @property
     @abc.abstractmethod
@@ -78,24 +142,48 @@ class BaseOutput(object):
     @contextmanager
     def open(self, filename):
         """Yields a file descriptor as expected in self.write_data"""
+        opener = None
         if not filename:  # output is stdout, opener and closer must be adapted
             self.opener = self._stdout_opener
             self.closer = self._stdout_closer
         else:
-            if not filename.endswith('.' + self.output_format):  # Add extension
-                filename += '.' + self.output_format
-        file_descr = self.opener()(filename)
+            compression_extension = split_compression_extension(filename)[1]
+            filename = self.output_filename(filename)
+            if compression_extension and not self.compressible:
+                logger.warning('WARNING : %s format cannot be compressed, write %s',
+                               self.output_format, filename)
+            elif compression_extension:
+                opener = partial(open_compressed, mode='wb' if self.binary else 'w')
+        file_descr = (opener or self.opener())(filename)
         try:
             yield file_descr
         finally:
             self.closer(file_descr)
 
+    def output_filename(self, filename):
+        """ Name of the file written by open(filename).
+
+        Format extension is added if missing, before compression extension if any
+        (which is dropped if format cannot be compressed).
+
+        :param filename: str
+        :return output_filename: str
+        """
+        filename, compression_extension = split_compression_extension(filename)
+        if not filename.endswith('.' + self.output_format):  # Add extension
+            filename += '.' + self.output_format
+        if compression_extension and self.compressible:
+            filename += compression_extension
+        return filename
+
     def opener(self):
         """Return the function used to open the file (only filename will be passed as argument)."""
         return partial(open, mode='w')
 
     def _stdout_opener(self):
-        """Mock opener if output is stdout"""
+        """Mock opener if output is stdout (its bytes buffer for binary outputs)"""
+        if self.binary:
+            return lambda x: getattr(sys.stdout, 'buffer', sys.stdout)
         return lambda x: sys.stdout
 
     def closer(self, file_descr):
@@ -122,7 +210,9 @@ class OutputPreProcessing(object):
     Abstract methods to override:
     property category: string - specifies what category the child is managing (schema, mapping, ...)
     property default_columns: list - name of columns to display in table like outputs
-    convert_to_dataframe: convert data into a dataframe - used for list outputs
+    property index_columns: list - name of first columns of table like outputs, identifying
+        the table of each line (database, collection or table)
+    iter_lines: generate lines of table like outputs, starting with index columns values
 
     Public method that should be overridden:
     columns_values_makers: dict - indicate how to extract data for each columns
@@ -133,6 +223,7 @@ class OutputPreProcessing(object):
     Public methods that should not be overridden:
     regularize_column_name: reformat column name to fill columns_values_makers format
     make_column_value: use columns_values_makers to extract column data
+    convert_to_dataframe: convert data into a pandas dataframe (not used by outputs)
     """
     __metaclass__ = abc.ABCMeta
 
@@ -170,11 +261,31 @@ class OutputPreProcessing(object):
             return cls.printable_value(cls.columns_values_makers()[column](data, *infos))
         return cls.printable_value(data.get(column))
 
+    @property
+    @abc.abstractmethod
+    def index_columns(self):
+        """List of names of columns identifying the table of each line."""
+        pass
+
     @classmethod
     @abc.abstractmethod
-    def convert_to_dataframe(cls, data, **kwargs):
-        """Create a dataframe from data"""
-        return
+    def iter_lines(cls, data, columns_to_get, cache=None):
+        """ Generate lines (lists of index columns and columns_to_get values) from data.
+
+        :param data: json like structure
+        :param columns_to_get: iterable
+        :param cache: dict, default None - preprocessed data shared with other outputs
+        """
+        return iter([])
+
+    @classmethod
+    def convert_to_dataframe(cls, data, columns_to_get=None, **kwargs):
+        """Create a dataframe from data, with lines from iter_lines."""
+        import pandas as pd  # only needed by dataframe based outputs
+
+        columns_to_get = columns_to_get or cls.default_columns
+        return pd.DataFrame(list(cls.iter_lines(data, columns_to_get)),
+                            columns=cls.index_columns + list(columns_to_get))
 
     @classmethod
     def filter_data(cls, data):
@@ -196,6 +307,7 @@ class _MappingPreProcessing(OutputPreProcessing):
     """Preprocess 'mapping' data from to_sql module"""
     category = 'mapping'
     default_columns = ['Field_name', 'Description', 'Type']
+    index_columns = ['Database', 'Table']
 
     @classmethod
     def columns_values_makers(cls):
@@ -207,16 +319,12 @@ class _MappingPreProcessing(OutputPreProcessing):
         }
 
     @classmethod
-    def convert_to_dataframe(cls, data, columns_to_get=None, **kwargs):
-        """Transform data (mapping dict) into a dataframe."""
-        columns_to_get = columns_to_get or cls.default_columns
-        lines = []
+    def iter_lines(cls, data, columns_to_get, cache=None):
+        """Generate lines from data (mapping dict), table by table."""
         for db in sorted(data):
             for table in sorted(data[db]):
-                lines += cls._table_dict_to_lines(db, table, data[db][table], columns_to_get)
-
-        header = ['Database', 'Table'] + columns_to_get
-        return pd.DataFrame(lines, columns=header)
+                for line in cls._table_dict_to_lines(db, table, data[db][table], columns_to_get):
+                    yield line
 
     @classmethod
     def _table_dict_to_lines(cls, db_name, table_name, table_dict, columns_to_get):
@@ -235,6 +343,7 @@ class _DiffPreProcessing(OutputPreProcessing):
     """Preprocess 'diff' data from compare module"""
     category = 'diff'
     default_columns = ['Hierarchy', 'Previous Schema', 'New Schema']
+    index_columns = ['Database', 'Collection']
 
     @classmethod
     def columns_values_makers(cls):
@@ -245,28 +354,22 @@ class _DiffPreProcessing(OutputPreProcessing):
         }
 
     @classmethod
-    def convert_to_dataframe(cls, data, columns_to_get=None, **kwargs):
-        """Transform data (list of dicts) into a dataframe."""
-        columns_to_get = columns_to_get or cls.default_columns
-
-        table = []
+    def iter_lines(cls, data, columns_to_get, cache=None):
+        """Generate lines from data (list of dicts), in diff order."""
         for d in data:
             hierarchy = d['hierarchy'].split('.')
             db = hierarchy.pop(0)
             coll = hierarchy.pop(0) if hierarchy else ''
 
-            table.append([db, coll] +
-                         [cls.make_column_value(col_name, d, hierarchy)
-                          for col_name in columns_to_get])
-
-        header = ['Database', 'Collection'] + columns_to_get
-        return pd.DataFrame(table, columns=header)
+            yield ([db, coll] +
+                   [cls.make_column_value(col_name, d, hierarchy) for col_name in columns_to_get])
 
 
 class _SchemaPreProcessing(OutputPreProcessing):
     """Prepocess mongo schema"""
     category = 'schema'
     default_columns = ['Field_full_name', 'Depth', 'Field_name', 'Type']
+    index_columns = ['Database', 'Collection']
 
     @classmethod
     def columns_values_makers(cls):
@@ -281,6 +384,10 @@ class _SchemaPreProcessing(OutputPreProcessing):
                                                          if 'prop_in_object' in f_schema else None),
             'types_count': lambda f_schema, f, f_prefix: cls._format_types_count(
                 f_schema.get('types_count', None), f_schema.get('array_types_count', None)),
+            'top_values': lambda f_schema, f, f_prefix: cls._format_top_values(
+                f_schema.get('top_values', None)),
+            'indexes': lambda f_schema, f, f_prefix: (', '.join(f_schema['indexes'])
+                                                      if 'indexes' in f_schema else None),
         }
 
     @classmethod
@@ -293,35 +400,40 @@ class _SchemaPreProcessing(OutputPreProcessing):
         if isinstance(data, dict):
             schema_filtered = dict()
             for k, v in data.items():
-                if k not in ['count', 'types_count', 'prop_in_object', 'array_types_count']:
+                if k not in ['count', 'types_count', 'prop_in_object', 'array_types_count',
+                             'top_values', 'sketches']:
                     schema_filtered[k] = cls.filter_data(v)
             return schema_filtered
         return data
 
     @classmethod
-    def convert_to_dataframe(cls, data, columns_to_get=None, **kwargs):
+    def iter_lines(cls, data, columns_to_get, cache=None):
         """
-        Load schema (data) into dataframe, filtering on columns_to_get (column names list).
+        Generate lines from schema (data), collection by collection, with columns_to_get.
+
+        Fields of each collection are walked through a SchemaIndex, kept in cache
+        so that other outputs of the same schema reuse it.
         """
-        columns_to_get = columns_to_get or cls.default_columns
-        line_tuples = list()
+        schema_indexes = {} if cache is None else cache.setdefault('schema_indexes', {})
+        make_line = cls._make_line_maker(columns_to_get)
         for database, database_schema in sorted(list(data.items())):
             for collection, collection_schema in sorted(list(database_schema.items())):
-                collection_line_tuples = cls._object_schema_to_line_tuples(
-                    collection_schema['object'], columns_to_get, field_prefix='')
-                for line in collection_line_tuples:
-                    line_tuples.append([database, collection] + list(line))
-
-        header = tuple(['Database', 'Collection'] + columns_to_get)
-        return pd.DataFrame(line_tuples, columns=header)
+                if (database, collection) not in schema_indexes:
+                    schema_indexes[(database, collection)] = SchemaIndex(
+                        collection_schema['object'])
+                for line in cls._iter_indexed_line_tuples(
+                        schema_indexes[(database, collection)], (), make_line):
+                    yield [database, collection] + list(line)
 
     @classmethod
     def _object_schema_to_line_tuples(cls, object_schema, columns_to_get, field_prefix):
-        """ Get the list of tuples describing lines in object_schema
+        """List of lines tuples of object_schema, from _iter_object_schema_line_tuples."""
+        return list(cls._iter_object_schema_line_tuples(object_schema, columns_to_get,
+                                                        field_prefix))
 
-        - Sort fields by count
-        - Add the tuples describing each field in object
-        - Recursively add tuples for nested objects
+    @classmethod
+    def _iter_object_schema_line_tuples(cls, object_schema, columns_to_get, field_prefix):
+        """ Generate the tuples describing lines in object_schema
 
         :param object_schema: dict
         :param columns_to_get: iterable
@@ -330,32 +442,42 @@ class _SchemaPreProcessing(OutputPreProcessing):
             allows to create full name.
             '.' is the separator for object subfields
             ':' is the separator for list of objects subfields
-        :return line_tuples: list of tuples describing lines
+        :return: generator of tuples describing lines
         """
-        line_tuples = []
-        sorted_fields = sorted(list(object_schema.items()),
-                               key=lambda x: (-x[1]['count'], x[0]) if 'count' in x[1] else x[0])
+        return cls._iter_indexed_line_tuples(SchemaIndex(object_schema, prefix=field_prefix), (),
+                                             cls._make_line_maker(columns_to_get))
 
-        for field, field_schema in sorted_fields:
-            line_columns = cls._field_schema_to_columns(
-                field, field_schema, field_prefix, columns_to_get)
-            line_tuples.append(line_columns)
+    @classmethod
+    def _iter_indexed_line_tuples(cls, schema_index, path, make_line):
+        """ Generate the tuples describing lines of subfields of path in schema_index
+
+        - Sort fields by count
+        - Add the tuples describing each field in object
+        - Recursively add tuples for nested objects
+
+        :param schema_index: SchemaIndex
+        :param path: tuple - path of parent field, () for top-level fields
+        :param make_line: function (field_schema, field_name, field_prefix) -> tuple
+            from _make_line_maker
+        :return: generator of tuples describing lines
+        """
+        sorted_fields = sorted(
+            [(field, field_path, schema_index[field_path])
+             for field, field_path in schema_index.children(path).items()],
+            key=lambda x: (-x[2]['count'], x[0]) if 'count' in x[2] else x[0])
 
-            types = field_schema.get('types_count', [field_schema['type']])
+        for field, field_path, field_schema in sorted_fields:
+            yield make_line(field_schema, field, schema_index.prefix(field_path))
 
             if 'object' in field_schema:
-                if 'ARRAY' in types:
-                    current_prefix = field_prefix + field + ':'
-                elif 'OBJECT' in types:
-                    current_prefix = field_prefix + field + '.'
-                else:
+                types = field_schema.get('types_count', [field_schema['type']])
+                if 'ARRAY' not in types and 'OBJECT' not in types:
                     logger.warning('Field {} has key "object" but has types {} while should have '
                                    '"OBJECT" or "ARRAY"'.format(field, types))
                     continue
-                line_tuples += cls._object_schema_to_line_tuples(
-                    field_schema['object'], columns_to_get, field_prefix=current_prefix)
-
-        return line_tuples
+                for line_columns in cls._iter_indexed_line_tuples(schema_index, field_path,
+                                                                  make_line):
+                    yield line_columns
 
     @classmethod
     def _field_schema_to_columns(cls, field_name, field_schema, field_prefix, columns_to_get):
@@ -368,29 +490,81 @@ class _SchemaPreProcessing(OutputPreProcessing):
             columns to create for each field
         :return field_columns: tuple
         """
-        field_columns = list()
+        return cls._make_line_maker(columns_to_get)(field_schema, field_name, field_prefix)
+
+    @classmethod
+    def _make_line_maker(cls, columns_to_get):
+        """ Resolve columns_to_get once, into a function making the tuple of a field line.
+
+        - the function making each column value is looked up once per column,
+          rather than once per cell through make_column_value
+        - depth and compact name prefix only depend on field prefix, which is shared by
+          fields of an object: they are computed once per object
+
+        :param columns_to_get: iterable
+        :return make_line: function (field_schema, field_name, field_prefix) -> tuple
+        """
+        prefixes_values = dict()
+
+        def prefix_values(field_prefix):
+            """Closure - depth and compact name prefix, computed once by field prefix."""
+            if field_prefix not in prefixes_values:
+                separators = cls._prefix_separators(field_prefix)
+                prefixes_values[field_prefix] = (len(separators),
+                                                 cls._compact_separators(separators))
+            return prefixes_values[field_prefix]
+
+        columns_values_makers = cls.columns_values_makers()
+        columns_values_makers.update({
+            'depth': lambda f_schema, f, f_prefix: prefix_values(f_prefix)[0],
+            'field_compact_name': lambda f_schema, f, f_prefix: prefix_values(f_prefix)[1] + f,
+        })
+        makers = []
         for column in columns_to_get:
-            field_columns.append(cls.make_column_value(column, field_schema, field_name, field_prefix))
+            column = cls.regularize_column_name(column)
+            if column in columns_values_makers:  # values are already printable
+                makers.append(columns_values_makers[column])
+            else:
+                makers.append(lambda f_schema, f, f_prefix, column=column:
+                              cls.printable_value(f_schema.get(column)))
+
+        def make_line(field_schema, field_name, field_prefix):
+            """Closure - tuple of columns values of a field."""
+            return tuple([maker(field_schema, field_name, field_prefix) for maker in makers])
 
-        return tuple(field_columns)
+        return make_line
 
     @staticmethod
-    def _field_compact_name(field_schema, field_name, field_prefix):
-        """ Return a compact version of field name, without parent object names.
+    def _prefix_separators(field_prefix):
+        """ Return separators of parent objects in a field prefix.
 
-        >>> field_compact_name(None, 'baz', 'foo.bar:')
-        " .  : baz"
+        >>> _SchemaPreProcessing._prefix_separators('foo.bar:')
+        '.:'
         """
-        separators = re.sub('[^.:]', '', field_prefix)
-        separators = re.sub('\.', ' . ', separators)
-        separators = re.sub(':', ' : ', separators)
-        return separators + field_name
+        return ''.join(FIELD_SEPARATORS_REGEX.findall(field_prefix))
 
     @staticmethod
-    def _field_depth(field_schema, field_name, field_prefix):
+    def _compact_separators(separators):
+        """ Return separators spaced as in compact field names.
+
+        >>> _SchemaPreProcessing._compact_separators('.:')
+        ' .  : '
+        """
+        return separators.replace('.', ' . ').replace(':', ' : ')
+
+    @classmethod
+    def _field_compact_name(cls, field_schema, field_name, field_prefix):
+        """ Return a compact version of field name, without parent object names.
+
+        >>> _SchemaPreProcessing._field_compact_name(None, 'baz', 'foo.bar:')
+        ' .  : baz'
+        """
+        return cls._compact_separators(cls._prefix_separators(field_prefix)) + field_name
+
+    @classmethod
+    def _field_depth(cls, field_schema, field_name, field_prefix):
         """ Return the level of imbrication of a field."""
-        separators = re.sub('[^.:]', '', field_prefix)
-        return len(separators)
+        return len(cls._prefix_separators(field_prefix))
 
     @staticmethod
     def _field_type(field_schema, field_name, field_prefix):
@@ -416,6 +590,9 @@ class _SchemaPreProcessing(OutputPreProcessing):
         """
         if types_count is None:
             return str(None)
+        if len(types_count) == 1 and 'ARRAY' not in types_count:  # most fields have one type
+            type_name, count = next(iter(types_count.items()))
+            return str(type_name) + ' : ' + str(count)
 
         types_count = sorted(types_count.items(), key=lambda x: x[1], reverse=True)
 
@@ -430,30 +607,52 @@ class _SchemaPreProcessing(OutputPreProcessing):
         types_count_string = ', '.join(type_count_list)
         return types_count_string
 
+    @staticmethod
+    def _format_top_values(top_values):
+        """ Format top_values to a readable string, as types_count.
+
+        >>> format_top_values([['Paris', 10], [75, 3]])
+        'Paris : 10, 75 : 3'
+
+        :param top_values: list of [value, count], default None
+        :return top_values_string : str
+        """
+        if top_values is None:
+            return None
+        return ', '.join(u'{} : {}'.format(value, count) for value, count in top_values)
+
 
 class HierarchicalOutput(BaseOutput):
     """
     Abstract base class. Preprocessing for outputs that keep the json hierarchical structure.
     """
 
-    def __init__(self, data, category='schema', without_counts=False, **kwargs):
+    def __init__(self, data, category='schema', without_counts=False, cache=None, **kwargs):
         """
         :param data: json like structure - schema, mapping, ...
         :param without_counts: bool - default False, remove all count fields in output if True
+        :param cache: dict, default None - preprocessed data shared with other outputs
         :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
         """
-        data_processor = OutputPreProcessing(category)
-        if without_counts:
-            self.data = data_processor.filter_data(data)
-        else:
+        if not without_counts:
             self.data = data
+            return
+        cache = {} if cache is None else cache
+        cache_key = ('filtered_data', category)
+        if cache_key not in cache:
+            cache[cache_key] = OutputPreProcessing(category).filter_data(data)
+        self.data = cache[cache_key]
+
+
+# Cache key telling table like outputs to keep their lines in cache, for other outputs
+SHARE_LINES_KEY = 'share_lines'
 
 
 class ListOutput(BaseOutput):
     """
     Abstract base class. Preprocessing for outputs with a table like format.
 
-    Class attribute:
+    Class attributes:
     _default_columns: allow to override PreProcessing class default_columns
                         {category: [default_columns]}
     """
@@ -467,34 +666,92 @@ class ListOutput(BaseOutput):
             'mapping': cls._default_columns.get('mapping', _MappingPreProcessing.default_columns),
             'diff': cls._default_columns.get('diff', _DiffPreProcessing.default_columns)}
 
-    def __init__(self, data, category='schema', columns_to_get=None, **kwargs):
+    def __init__(self, data, category='schema', columns_to_get=None, cache=None, **kwargs):
         """
         :param data: json like structure - schema, mapping, ...
         :param columns_to_get: list - column names to display in output
                                 default will use default_columns class attribute
+        :param cache: dict, default None - preprocessed data shared with other outputs
         :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
         """
-        data_processor = OutputPreProcessing(category)
         if not columns_to_get:
             columns_to_get = self.get_default_columns()[category]
-
-        self.data_df = data_processor.convert_to_dataframe(data, columns_to_get=columns_to_get)
+        if not isinstance(data, (dict, list)):
+            data = list(data)  # iterators (as diff generators) would be consumed by first pass
+        self.data = data
+        self.category = category
+        self.data_processor = OutputPreProcessing(category)
+        self.columns_to_get = list(columns_to_get)
+        self.header = self.data_processor.index_columns + self.columns_to_get
+        self.cache = cache
+
+    def iter_lines(self):
+        """Generate lines of the table (without header), from data, or from cache if shared."""
+        if self.cache is not None and self.cache.get(SHARE_LINES_KEY):
+            return iter(self.get_lines())
+        return self.data_processor.iter_lines(self.data, self.columns_to_get, cache=self.cache)
+
+    def get_lines(self):
+        """ List of lines of the table (without header), computed once by (category, columns)
+        when there is a cache.
+
+        :return lines: list of tuples
+        """
+        if self.cache is None:
+            return list(self.data_processor.iter_lines(self.data, self.columns_to_get))
+        cache_key = ('lines', self.category, tuple(self.columns_to_get))
+        if cache_key not in self.cache:
+            self.cache[cache_key] = list(self.data_processor.iter_lines(
+                self.data, self.columns_to_get, cache=self.cache))
+        return self.cache[cache_key]
 
 
 class JsonOutput(HierarchicalOutput):
     """
-    Write data in json file.
+    Write data in json file, with json_backend (fastest json library installed).
     """
     output_format = 'json'
 
+    def __init__(self, data, category='schema', compact=False, **kwargs):
+        """
+        :param data: json like structure - schema, mapping, ...
+        :param compact: bool - default False, write json without indentation if True
+        :param kwargs: may contain without_counts and cache (see HierarchicalOutput)
+        """
+        super(JsonOutput, self).__init__(data, category=category, **kwargs)
+        self.compact = compact
+
+    def opener(self):
+        """Use codecs module open function to support non ascii characters."""
+        return partial(codecs.open, mode='w', encoding="utf-8")
+
+    def write_data(self, file_descr):
+        """Use json_backend dump function to write into file_descr (opened with opener)."""
+        json_backend.dump(self.data, file_descr, indent=None if self.compact else 4)
+
+
+class JsonlOutput(HierarchicalOutput):
+    """
+    Write data in json lines file, one json document per line.
+
+    Lists (or generators, as from compare.iter_schemas_bases_diff) are written one item per line.
+    Dicts (schema, mapping) are written one {key: value} document per line (ie per database).
+    """
+    output_format = 'jsonl'
+
     def opener(self):
         """Use codecs module open function to support non ascii characters."""
         return partial(codecs.open, mode='w', encoding="utf-8")
 
     def write_data(self, file_descr):
-        """Use json module dump function to write into file_descr (opened with opener)."""
-        json.dump(self.data, file_descr, indent=4, ensure_ascii=False,
-                  default=json_util.default)
+        """Use json_backend dumps function to write each line into file_descr (compact)."""
+        if isinstance(self.data, dict):
+            lines = ({key: value} for key, value in sorted(self.data.items()))
+        else:
+            lines = self.data
+        for line in lines:
+            file_descr.write(json_backend.dumps(line))
+            file_descr.write('\n')
 
 
 class YamlOutput(HierarchicalOutput):
@@ -508,117 +765,290 @@ class YamlOutput(HierarchicalOutput):
         yaml.safe_dump(self.data, file_descr, default_flow_style=False, encoding='utf-8')
 
 
+class MsgpackOutput(HierarchicalOutput):
+    """
+    Write data in binary schema file (MessagePack container, see binary_schema module).
+    """
+    output_format = 'msgpack'
+    binary = True
+
+    def __init__(self, data, category='schema', binary_compression=None, **kwargs):
+        """
+        :param data: json like structure - schema, mapping, ...
+        :param binary_compression: str - default None, 'gzip' or 'zstd' to compress payload
+        :param kwargs: may contain without_counts and cache (see HierarchicalOutput)
+        """
+        super(MsgpackOutput, self).__init__(data, category=category, **kwargs)
+        self.binary_compression = binary_compression
+
+    def opener(self):
+        """Open file in binary mode."""
+        return partial(open, mode='wb')
+
+    def write_data(self, file_descr):
+        """Use binary_schema dumps_binary_schema function to write into file_descr."""
+        file_descr.write(dumps_binary_schema(self.data, compression=self.binary_compression))
+
+
+class SchemaidxOutput(HierarchicalOutput):
+    """
+    Write schema in indexed schema file, to be accessed lazily (see schema_file.SchemaFile).
+    """
+    output_format = 'schemaidx'
+    binary = True
+
+    def opener(self):
+        """Open file in binary mode."""
+        return partial(open, mode='wb')
+
+    def write_data(self, file_descr):
+        """Use schema_file dump_indexed_schema function to write into file_descr."""
+        dump_indexed_schema(self.data, file_descr)
+
+
 class TsvOutput(ListOutput):
     """
-    Write data from self.data_df as a table in csv file.
+    Write data as a table in tsv file, line by line.
     """
     output_format = 'tsv'
 
+    def opener(self):
+        """Use codecs module open function to support non ascii characters."""
+        return partial(codecs.open, mode='w', encoding="utf-8")
+
     def write_data(self, file_descr):
-        """Use dataframe to_csv method to write into file_descr."""
-        self.data_df.to_csv(file_descr, sep='\t', index=False, encoding="utf-8",
-                            quoting=csv.QUOTE_NONE)
+        """Write header, then each line as it is generated, into file_descr."""
+        file_descr.write(self._make_line(self.header))
+        for line in self.iter_lines():
+            file_descr.write(self._make_line(line))
+
+    @staticmethod
+    def _make_line(values):
+        """Tab separated values, None being written as empty strings."""
+        return u'\t'.join(u'' if value is None else u'{}'.format(value) for value in values) + u'\n'
 
 
 class HtmlOutput(ListOutput):
     """
-    Write data from self.data_df as a table in html file, one table per collection.
+    Write data as a table in html file, one table per collection.
 
-    Uses resources/data_dict.tmpl template.
+    Lines are grouped by database and collection in a single pass, and rendered with
+    data_dict.tmpl template, from template_dirs or resources directory.
+    The document is written into the file while it is rendered.
     """
     output_format = 'html'
     _default_columns = {
         'schema': ['Field_compact_name', 'Field_name', 'Count',
                    'Percentage', 'Types_count']}
+    template_name = 'data_dict.tmpl'
+
+    def __init__(self, data, category='schema', columns_to_get=None, template_dirs=None,
+                 **kwargs):
+        """
+        :param data: json like structure - schema, mapping, ...
+        :param columns_to_get: list - column names to display in output
+        :param template_dirs: list of str, default None - directories where to look for
+                              data_dict.tmpl before resources directory
+        :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
+        """
+        super(HtmlOutput, self).__init__(data, category=category, columns_to_get=columns_to_get,
+                                         **kwargs)
+        self.template_dirs = template_dirs
 
     def opener(self):
         """Use codecs module open function to support non ascii characters."""
         return partial(codecs.open, mode='w', encoding="utf-8")
 
-    def write_data(self, file_descr):
+    def group_lines(self):
         """
-        Format data from self.data_df, write into file_descr (opened with opener).
+        Group lines generated from data by database and collection (index columns).
+
+        :return tmpl_variables: OrderedDict {db: OrderedDict {col: list of lines}}
+                                lines without index columns, in order of appearance
         """
-        columns = self.data_df.columns
-        col0 = columns[0]  # First column title (usually Database)
-        col1 = columns[1]  # Second column title (usually Collection or Table)
         tmpl_variables = OrderedDict()
-        for db in self.data_df[col0].unique():
-            tmpl_variables[db] = OrderedDict()
-            df_db = self.data_df.query('{} == @db'.format(col0)).iloc[:, 1:]
-            for col in df_db[col1].unique():
-                df_col = df_db.query('{} == @col'.format(col1)).iloc[:, 1:]
-                tmpl_variables[db][col] = df_col.values.tolist()
-
-        tmpl_filename = os.path.join(os.path.dirname(os.path.dirname(__file__)),
-                                     'resources', 'data_dict.tmpl')
-        with open(tmpl_filename) as tmpl_fd:
-            tmpl = jinja2.Template(tmpl_fd.read())
+        for line in self.iter_lines():
+            db_variables = tmpl_variables.setdefault(line[0], OrderedDict())
+            db_variables.setdefault(line[1], []).append(list(line[2:]))
+        return tmpl_variables
 
-        file_descr.write(tmpl.render(col_titles=list(self.data_df)[2:],
-                                     data=tmpl_variables))
+    def write_data(self, file_descr):
+        """
+        Format lines generated from data, write into file_descr (opened with opener).
+        """
+        tmpl = get_template_environment(self.template_dirs).get_template(self.template_name)
+        for chunk in tmpl.generate(col_titles=self.header[2:], data=self.group_lines()):
+            file_descr.write(chunk)
 
 
 class MdOutput(ListOutput):
     """
-    Write data from self.data_df as a table in markdown file, one table per Collection.
+    Write data as a table in markdown file, one table per Collection, line by line.
+
+    Columns are aligned, with a width fitted to their values by a first pass over lines
+    (generated once and kept in memory), or a fixed width (md_column_width) to stream lines.
     """
     output_format = 'md'
     _default_columns = {
         'schema': ['Field_compact_name', 'Field_name', 'Count',
                    'Percentage', 'Types_count']}
 
+    def __init__(self, data, category='schema', columns_to_get=None, md_column_width=None,
+                 **kwargs):
+        """
+        :param data: json like structure - schema, mapping, ...
+        :param columns_to_get: list - column names to display in output
+        :param md_column_width: int, default None - fixed width of columns
+                                default fits each column to its longest value
+        :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
+        """
+        super(MdOutput, self).__init__(data, category=category, columns_to_get=columns_to_get,
+                                       **kwargs)
+        self.md_column_width = md_column_width
+
     def opener(self):
         """Use codecs module open function to support non ascii characters."""
         return partial(codecs.open, mode='w', encoding="utf-8")
 
     def write_data(self, file_descr):
         """
-        Format data from self.data_df, write into file_descr (opened with opener).
-        """
-        columns = list(self.data_df.columns)
-        col0 = columns.pop(0)       # First column title (usually Database)
-        col1 = columns.pop(0)       # Second column title (usually Collection or Table)
-        columns_length = []
-        for col in columns:
-            columns_length.append(max(self.data_df[col].map(
-                lambda s: len(s) if isinstance(s, basestring) else len(str(s))).max(),
-                                      len(col)) + 5)
-
-        def format_column(col_name, value, repeat=False):
-            """Closure - format columns based on existing data length."""
-            col_length = columns_length[columns.index(col_name)]
-            if repeat:
-                return value * col_length
-            return u'{{:<{}}}'.format(col_length).format(u'{}'.format(value))
-
-        str_column_names = self._make_line([format_column(col, col) for col in columns])
-        str_sep_header = self._make_line([format_column(col, '-', repeat=True) for col in columns])
-        output_str = []
-        for db in self.data_df[col0].unique():
-            output_str.append('\n### {}: {}\n'.format(col0, db))
-            df_db = self.data_df.query('{} == @db'.format(col0)).iloc[:, 1:]
-            for col in df_db[col1].unique():
-                if col:
-                    output_str.append('#### {}: {} \n'.format(col1, col))
-                df_col = df_db.query('{} == @col'.format(col1)).iloc[:, 1:]
-                output_str.append("\n".join([str_column_names, str_sep_header] +
-                                            [self._make_line([format_column(columns[i], value)
-                                                              for i, value in enumerate(line)])
-                                             for line in df_col.values.tolist()]))
-                output_str.append('\n\n')
+        Format lines generated from data, write them into file_descr (opened with opener).
 
-        file_descr.write("".join(output_str))
+        A table is started each time database or collection (index columns) changes.
+        """
+        col0, col1 = self.header[:2]  # Index columns titles (usually Database and Collection)
+        columns = self.header[2:]
+        if self.md_column_width:
+            columns_length = [self.md_column_width] * len(columns)
+            lines = self.iter_lines()
+        else:  # first pass over lines to fit columns to values
+            lines = self.get_lines()
+            columns_length = [len(col) for col in columns]
+            for line in lines:
+                columns_length = [max(length, len(u'{}'.format(value)))
+                                  for length, value in zip(columns_length, line[2:])]
+            columns_length = [length + 5 for length in columns_length]
+        columns_formats = [u'{{:<{}}}'.format(length) for length in columns_length]
+
+        def format_line(values):
+            """Closure - format values to columns length."""
+            return self._make_line([column_format.format(u'{}'.format(value))
+                                    for column_format, value in zip(columns_formats, values)])
+
+        str_table_header = u'\n'.join([
+            format_line(columns), self._make_line(['-' * length for length in columns_length])])
+        previous_db = previous_col = None
+        for line in lines:
+            db, col = line[0], line[1]
+            if previous_db is None or (db, col) != (previous_db, previous_col):
+                if previous_db is not None:
+                    file_descr.write(u'\n\n')
+                if db != previous_db:
+                    file_descr.write(u'\n### {}: {}\n'.format(col0, db))
+                if col:
+                    file_descr.write(u'#### {}: {} \n'.format(col1, col))
+                file_descr.write(str_table_header)
+                previous_db, previous_col = db, col
+            file_descr.write(u'\n' + format_line(line[2:]))
+        if previous_db is not None:
+            file_descr.write(u'\n\n')
 
     def _make_line(self, values):
         return u'|{}|'.format('|'.join(values))
 
 
+class ArrowOutput(ListOutput):
+    """
+    Write data as a table in arrow IPC file (feather v2 format), with typed columns.
+
+    Lines are written by record batches of batch_size lines, so that memory usage does not
+    grow with the number of lines.
+    Column types are given by ARROW_COLUMNS_TYPES, other columns are strings.
+    """
+    output_format = 'arrow'
+    binary = True
+    batch_size = 10000
+
+    def opener(self):
+        """Open file in binary mode."""
+        return partial(open, mode='wb')
+
+    def arrow_schema(self):
+        """ Arrow schema of the table, with a field by column of header.
+
+        :return schema: pyarrow.Schema
+        """
+        import pyarrow as pa
+
+        return pa.schema([
+            (column, pa.type_for_alias(ARROW_COLUMNS_TYPES.get(
+                self.data_processor.regularize_column_name(column), 'string')))
+            for column in self.header])
+
+    def iter_record_batches(self, schema):
+        """ Generate record batches of lines generated from data.
+
+        :param schema: pyarrow.Schema - from arrow_schema
+        :return: generator of pyarrow.RecordBatch
+        """
+        import pyarrow as pa
+
+        string_columns = [index for index, field in enumerate(schema)
+                          if pa.types.is_string(field.type)]
+        lines = self.iter_lines()
+        while True:
+            batch_lines = list(islice(lines, self.batch_size))
+            if not batch_lines:
+                break
+            columns = [list(column) for column in zip(*batch_lines)]
+            for index in string_columns:
+                columns[index] = [None if value is None else u'{}'.format(value)
+                                  for value in columns[index]]
+            yield pa.record_batch([pa.array(column, type=field.type)
+                                   for column, field in zip(columns, schema)], schema=schema)
+
+    def make_writer(self, file_descr, schema):
+        """Arrow IPC file writer."""
+        import pyarrow as pa
+        return pa.ipc.new_file(file_descr, schema)
+
+    def write_data(self, file_descr):
+        """Write record batches of lines generated from data into file_descr (binary)."""
+        schema = self.arrow_schema()
+        writer = self.make_writer(file_descr, schema)
+        try:
+            for record_batch in self.iter_record_batches(schema):
+                writer.write_batch(record_batch)
+        finally:
+            writer.close()
+
+
+class ParquetOutput(ArrowOutput):
+    """
+    Write data as a table in parquet file, with typed columns (see ArrowOutput).
+
+    Each record batch is written as a row group.
+    """
+    output_format = 'parquet'
+    compressible = False  # compressed by pages
+
+    def make_writer(self, file_descr, schema):
+        """Parquet file writer."""
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(file_descr, schema)
+
+
 class XlsxOutput(ListOutput):
     """
-    Write data from self.data_df as a table in csv file.
+    Write data as a table in xlsx file, in 'Mongo_Schema' sheet, line by line.
+
+    Rows are streamed through an openpyxl write-only workbook, so that memory usage does not
+    grow with the number of lines. If the file exists, its other sheets are kept: their values
+    are copied row by row from a read-only workbook (without their formatting).
     """
     output_format = 'xlsx'
+    compressible = False  # already a zip archive
+    sheet_name = 'Mongo_Schema'
 
     def opener(self):
         """
@@ -630,21 +1060,112 @@ class XlsxOutput(ListOutput):
 
     def write_data(self, file_descr):
         """
-        Use dataframe to_excel to write into file_descr (filename) - open first if file exists.
+        Write lines generated from data into file_descr (filename), keeping existing sheets.
+
+        The workbook is written to a temporary file, replacing file_descr once complete.
         """
+        book = Workbook(write_only=True)
+        tmp_filename = file_descr + '.tmp'
         if os.path.isfile(file_descr):
-            print(file_descr, 'exists')
-            # Solution to keep existing data
-            book = load_workbook(file_descr)
-            writer = pd.ExcelWriter(file_descr, engine='openpyxl')
-            writer.book = book
-            writer.sheets = dict((ws.title, ws) for ws in book.worksheets)
-            self.data_df.to_excel(writer, sheet_name='Mongo_Schema', index=True,
-                                  float_format='%.2f')
-            writer.save()
+            existing_book = load_workbook(file_descr, read_only=True)
+            try:
+                for existing_sheet in existing_book.worksheets:
+                    if existing_sheet.title == self.sheet_name:
+                        self._write_sheet(book)
+                        continue
+                    sheet = book.create_sheet(existing_sheet.title)
+                    for row in existing_sheet.iter_rows(values_only=True):
+                        sheet.append(row)
+                if self.sheet_name not in existing_book.sheetnames:
+                    self._write_sheet(book)
+                book.save(tmp_filename)
+            finally:
+                existing_book.close()
         else:
-            self.data_df.to_excel(file_descr, sheet_name='Mongo_Schema', index=True,
-                                  float_format='%.2f')
+            self._write_sheet(book)
+            book.save(tmp_filename)
+        shutil.move(tmp_filename, file_descr)
+
+    def _write_sheet(self, book):
+        """ Stream header and lines into a new sheet of book, with a row index as first column.
+
+        Floats are rounded to 2 decimals.
+
+        :param book: openpyxl.Workbook - in write-only mode
+        """
+        sheet = book.create_sheet(self.sheet_name)
+        header = [WriteOnlyCell(sheet, value=title) for title in [None] + self.header]
+        for cell in header:
+            cell.font = Font(bold=True)
+        sheet.append(header)
+        for index, line in enumerate(self.iter_lines()):
+            sheet.append([index] + [float('%.2f' % value) if isinstance(value, float) else value
+                                    for value in line])
+
+
+class SqlOutput(BaseOutput):
+    """
+    Write PostgreSQL DDL generated from a mapping (see tosql.mapping_to_ddl) in sql file.
+    """
+    output_format = 'sql'
+
+    def __init__(self, data, category='mapping', with_indexes=False, **kwargs):
+        """
+        :param data: mapping
+        :param with_indexes: bool - default False, create indexes on foreign keys if True
+        :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
+        """
+        if category != 'mapping':
+            raise ValueError("sql format is only supported for mapping category, "
+                             "not {}".format(category))
+        self.data = data
+        self.with_indexes = with_indexes
+
+    def opener(self):
+        """Use codecs module open function to support non ascii characters."""
+        return partial(codecs.open, mode='w', encoding="utf-8")
+
+    def write_data(self, file_descr):
+        """Write DDL statements into file_descr (opened with opener)."""
+        file_descr.write(mapping_to_ddl(self.data, with_indexes=self.with_indexes))
+
+
+class SqliteOutput(BaseOutput):
+    """
+    Write data (schema, mapping or diff) as normalized tables in a SQLite database file,
+    to be queried with SQL (see catalog module).
+
+    An existing file is replaced.
+    """
+    output_format = 'sqlite'
+    compressible = False
+
+    def __init__(self, data, category='schema', **kwargs):
+        """
+        :param data: json like structure - schema, mapping, ...
+        :param category: str in 'schema', 'mapping', 'diff'
+        :param kwargs: unused - exists for a unified interface with other subclasses of BaseOutput
+        """
+        self.data = data
+        self.category = category
+
+    def opener(self):
+        """Connect to a new SQLite database."""
+        def connect(filename):
+            """Closure - remove existing file, then connect."""
+            if os.path.isfile(filename):
+                os.remove(filename)
+            return sqlite3.connect(filename)
+        return connect
+
+    def _stdout_opener(self):
+        """SQLite databases cannot be written on standard output."""
+        raise ValueError("sqlite format cannot be written on standard output, "
+                         "an output file is needed")
+
+    def write_data(self, file_descr):
+        """Write tables into file_descr (sqlite3 connection, closed by closer)."""
+        write_catalog(self.data, file_descr, category=self.category)
 
 
 def rec_find_right_subclass(attribute_value, attribute='output_format', start_class=BaseOutput):
@@ -665,24 +1186,62 @@ def transform_data_to_file(data, formats, output=None, category='schema', **kwar
 
     :param data: dict (schema, mapping or diff)
     :param formats: list of str - extensions of output desired among:
-                            'json', 'yaml' (hierarchical formats)
-                            'tsv', 'html', 'md' or 'xlsx' (list like formats)
+                            'json', 'jsonl', 'yaml', 'msgpack' (hierarchical formats)
+                            'schemaidx' (indexed schema, schema category only)
+                            'tsv', 'html', 'md', 'xlsx', 'arrow' or 'parquet' (list like formats)
+                            'sql' (DDL, mapping category only)
+                            'sqlite' (SQLite database of normalized tables)
     :param output: str full path to file where formatted output will be saved saved
-                            (default is std out)
+                            (default is std out), compressed if it ends with '.gz', '.bz2',
+                            '.xz' or '.zst' (extension of format is inserted before)
     :param category: string in 'schema', 'mapping', 'diff' - describe input data
     :param kwargs: may contain additional specific arguments
            columns: list of columns to display in the output for list like formats
            without_counts: bool to display count fields in output for hierarchical formats
+           with_indexes: bool to create indexes on foreign keys in sql output
+           md_column_width: int fixed width of columns in md output
+           template_dirs: list of directories of user templates for html output
+           compact: bool to write json output without indentation
+           binary_compression: str compression of msgpack output payload (gzip or zstd)
+
+    :return filenames: list of str - names of files written (empty list for stdout)
+
+    Data is preprocessed once for all formats: hierarchical formats share the same
+    filtered data, and list like formats generate their lines from data.
     """
-    wrong_formats = set(formats) - {'tsv', 'xlsx', 'json', 'yaml', 'html', 'md'}
+    wrong_formats = set(formats) - {'tsv', 'xlsx', 'json', 'jsonl', 'yaml', 'msgpack',
+                                    'schemaidx', 'html', 'md', 'arrow', 'parquet', 'sql', 'sqlite'}
 
     if wrong_formats:
-        raise ValueError("Output format should be tsv, xlsx, html, md, json or yaml. "
-                         "{} is/are not supported".format(wrong_formats))
-
-    for output_format in formats:
-        output_maker = rec_find_right_subclass(output_format)(
+        raise ValueError("Output format should be tsv, xlsx, html, md, arrow, parquet, json, "
+                         "jsonl, yaml, msgpack, schemaidx, sql or sqlite. {} is/are not "
+                         "supported".format(wrong_formats))
+    if 'schemaidx' in formats and category != 'schema':
+        raise ValueError("schemaidx format is only supported for schema category, "
+                         "not {}".format(category))
+
+    if isinstance(data, SchemaFile):
+        data = data.to_dict()  # outputs expect dicts
+
+    if len(formats) > 1 and not isinstance(data, (dict, list)):
+        data = list(data)  # iterators (as diff generators) are consumed by each format
+
+    cache = dict()
+    output_classes = [rec_find_right_subclass(output_format) for output_format in formats]
+    # lines of table like outputs are only kept in memory if several of them need them
+    cache[SHARE_LINES_KEY] = sum(issubclass(output_class, ListOutput)
+                                 for output_class in output_classes) > 1
+    filenames = []
+    for output_class in output_classes:
+        output_maker = output_class(
             data, category=category,
-            columns_to_get=kwargs.get('columns'), without_counts=kwargs.get('without_counts'))
+            columns_to_get=kwargs.get('columns'), without_counts=kwargs.get('without_counts'),
+            with_indexes=kwargs.get('with_indexes'),
+            md_column_width=kwargs.get('md_column_width'),
+            template_dirs=kwargs.get('template_dirs'), compact=kwargs.get('compact'),
+            binary_compression=kwargs.get('binary_compression'), cache=cache)
         with output_maker.open(output) as file_descr:
             output_maker.write_data(file_descr)
+        if output:
+            filenames.append(output_maker.output_filename(output))
+    return filenames
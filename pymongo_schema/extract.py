@@ -18,7 +18,9 @@ Schema are hierarchically nested : (see also README.md)
 - A collection maintains a 'count' and contains 1 object
     {
         "count" : int,
-        "object": object_schema
+        "object": object_schema,
+        "indexes": {}, # (optional if extracted with indexes) {index_name: index_info}
+        "storage": {}, # (optional if extracted with indexes) collection storage stats
     }
 
 - An object contains fields.
@@ -37,26 +39,59 @@ Objects are initialized as defaultdict(empty_field_schema) to simplify the code
         'array_type', 'type_str', # (optional: if array)
         'array_types_count': defaultdict(int), # (optional: if array) count for each type  in array
         'object': {}, # (optional if object) object_schema
+        'stats': {}, # (optional if extracted with stats) field_stats
+        'cardinality': int, # (optional if extracted with sketches) approximate distinct count
+        'top_values': [[value, count], ...], # (optional if extracted with sketches)
+        'sketches': {}, # (optional if extracted with sketches) mergeable sketches
+        'indexes': [], # (optional if extracted with indexes) names of indexes on this field
+    }
+
+- Field stats summarize scalar values of a field (including values in arrays),
+  to choose precise SQL types in tosql
+    {
+        'distinct': int, # approximate number of distinct values (sketch shared with 'cardinality')
+        'min': number, 'max': number, # (optional if numbers)
+        'max_scale': int, # (optional if floats) max number of decimal digits
+        'max_length': int, # (optional if strings)
+    }
+
+- Field sketches are fixed-size summaries of scalar values of a field (see sketch module),
+  serialized so that schemas of partial extractions can be merged (merge_mongo_schemas)
+    {
+        'cardinality': HyperLogLog dict,
+        'top_values': SpaceSaving dict,
     }
 """
 
 import logging
+import math
 from collections import defaultdict
+from decimal import Decimal
 
 from past.builtins import basestring
+from pymongo.errors import PyMongoError
 
 from pymongo_schema.mongo_sql_types import get_type_string, common_parent_type
+from pymongo_schema.sketch import HyperLogLog, SpaceSaving
 
 logger = logging.getLogger(__name__)
 
 
-def extract_pymongo_client_schema(pymongo_client, database_names=None, collection_names=None):
+def extract_pymongo_client_schema(pymongo_client, database_names=None, collection_names=None,
+                                  namespace_filter=None, with_stats=False, with_sketches=False,
+                                  with_indexes=False):
     """ Extract the schema for every database in database_names
 
     :param pymongo_client: pymongo.mongo_client.MongoClient
     :param database_names: str, list of str, default None
     :param collection_names: str, list of str, default None
         Will be used for every database in database_names list
+    :param namespace_filter: filter.NamespaceFilter, default None
+        Databases and collections excluded by the filter are not scanned.
+        Fields filters are used as projections, then collection schemas are filtered.
+    :param with_stats: bool, default False - add 'stats' to field schemas
+    :param with_sketches: bool, default False - add 'cardinality' and 'top_values' to field schemas
+    :param with_indexes: bool, default False - add indexes and storage stats to collection schemas
     :return mongo_schema: dict
     """
 
@@ -68,22 +103,33 @@ def extract_pymongo_client_schema(pymongo_client, database_names=None, collectio
         database_names.remove('admin')
         database_names.remove('local')
 
+    if namespace_filter is not None:
+        database_names = [db for db in database_names
+                          if namespace_filter.may_include_database(db)]
+
     mongo_schema = dict()
     for database in database_names:
         logger.info('Extract schema of database %s', database)
         pymongo_database = pymongo_client[database]
-        database_schema = extract_database_schema(pymongo_database, collection_names)
+        database_schema = extract_database_schema(pymongo_database, collection_names,
+                                                  namespace_filter, with_stats, with_sketches,
+                                                  with_indexes)
         if database_schema:  # Do not add a schema if it is empty
             mongo_schema[database] = database_schema
 
     return mongo_schema
 
 
-def extract_database_schema(pymongo_database, collection_names=None):
+def extract_database_schema(pymongo_database, collection_names=None, namespace_filter=None,
+                            with_stats=False, with_sketches=False, with_indexes=False):
     """ Extract the database schema, for every collection in collection_names
 
     :param pymongo_database: pymongo.database.Database
     :param collection_names: str, list of str, default None
+    :param namespace_filter: filter.NamespaceFilter, default None
+    :param with_stats: bool, default False
+    :param with_sketches: bool, default False
+    :param with_indexes: bool, default False
     :return database_schema: dict
     """
     if isinstance(collection_names, basestring):
@@ -97,14 +143,29 @@ def extract_database_schema(pymongo_database, collection_names=None):
 
     database_schema = dict()
     for collection in collection_names:
+        if namespace_filter is not None:
+            collection_filter = namespace_filter.collection_filter(pymongo_database.name,
+                                                                   collection)
+            if collection_filter is None:
+                logger.info('...collection %s is skipped by filter', collection)
+                continue
         logger.info('...collection %s', collection)
         pymongo_collection = pymongo_database[collection]
-        database_schema[collection] = extract_collection_schema(pymongo_collection)
+        projection = None
+        if namespace_filter is not None and collection_filter is not True:
+            projection = collection_filter.projection
+        collection_schema = extract_collection_schema(pymongo_collection, projection,
+                                                      with_stats, with_sketches, with_indexes)
+        if namespace_filter is not None:
+            collection_schema = namespace_filter.filter_collection_schema(
+                pymongo_database.name, collection, collection_schema)
+        database_schema[collection] = collection_schema
 
     return database_schema
 
 
-def extract_collection_schema(pymongo_collection):
+def extract_collection_schema(pymongo_collection, projection=None, with_stats=False,
+                              with_sketches=False, with_indexes=False):
     """ Iterate through all document of a collection to create its schema
 
     - Init collection schema
@@ -112,16 +173,25 @@ def extract_collection_schema(pymongo_collection):
     - Post-process schema
 
     :param pymongo_collection: pymongo.collection.Collection
+    :param projection: dict, default None
+        MongoDB projection, to only scan some fields of documents (see filter.FieldsFilter)
+    :param with_stats: bool, default False
+        Add 'stats' to field schemas: value ranges, max length and approximate distinct count
+    :param with_sketches: bool, default False
+        Add approximate 'cardinality' and most frequent 'top_values' to field schemas,
+        with their mergeable 'sketches'
+    :param with_indexes: bool, default False
+        Add 'indexes' and 'storage' stats to collection schema, and 'indexes' to indexed fields
     :return collection_schema: dict
     """
     collection_schema = {
         'count': 0,
-        "object": init_empty_object_schema()
+        "object": init_empty_object_schema(with_stats, with_sketches)
     }
 
     n = pymongo_collection.count()
     i = 0
-    for document in pymongo_collection.find({}):
+    for document in pymongo_collection.find({}, projection):
         collection_schema['count'] += 1
         add_document_to_object_schema(document, collection_schema['object'])
         i += 1
@@ -130,9 +200,104 @@ def extract_collection_schema(pymongo_collection):
 
     post_process_schema(collection_schema)
     collection_schema = recursive_default_to_regular_dict(collection_schema)
+    if with_indexes:
+        index_information, collection_stats = get_collection_indexes_information(
+            pymongo_collection)
+        add_indexes_to_collection_schema(collection_schema, index_information, collection_stats)
     return collection_schema
 
 
+###
+# Indexes and storage statistics of collections
+
+# Keys of collStats command kept in collection 'storage'
+STORAGE_STATS_KEYS = ['size', 'storageSize', 'avgObjSize', 'totalIndexSize', 'nindexes']
+
+
+def get_collection_indexes_information(pymongo_collection):
+    """ Get indexes of a collection, and its storage stats (collStats command).
+
+    :param pymongo_collection: pymongo.collection.Collection
+    :return index_information, collection_stats: dict, dict (None if collStats failed)
+    """
+    index_information = pymongo_collection.index_information()
+    try:
+        collection_stats = pymongo_collection.database.command('collStats',
+                                                               pymongo_collection.name)
+    except PyMongoError as e:
+        logger.warning("WARNING : collStats failed for collection '%s' (%s). Storage stats are "
+                       "skipped.", pymongo_collection.name, e)
+        collection_stats = None
+    return index_information, collection_stats
+
+
+def add_indexes_to_collection_schema(collection_schema, index_information,
+                                     collection_stats=None):
+    """ Add indexes and storage stats to a collection schema, and indexes names to fields.
+
+    - collection 'indexes': {index_name: {'key': [[field, direction], ...], 'unique': bool,
+        'size': int (if collection_stats)}}
+    - collection 'storage': STORAGE_STATS_KEYS from collection_stats
+    - field 'indexes': names of indexes including this field. Index keys on fields in arrays
+    of objects are added to these sub fields, which are columns of linked tables in tosql.
+
+    :param collection_schema: dict
+    :param index_information: dict - from pymongo_collection.index_information()
+    :param collection_stats: dict, default None - from collStats command
+    """
+    index_sizes = (collection_stats or {}).get('indexSizes', {})
+    collection_schema['indexes'] = dict()
+    for index_name, index_info in sorted(index_information.items()):
+        index_fields = get_index_fields(index_info)
+        collection_schema['indexes'][index_name] = {
+            'key': [list(key) for key in index_info['key']],
+            'unique': bool(index_info.get('unique', False)),
+        }
+        if index_name in index_sizes:
+            collection_schema['indexes'][index_name]['size'] = index_sizes[index_name]
+
+        for field in index_fields:
+            field_schema = get_field_schema(collection_schema['object'], field)
+            if field_schema is None:
+                logger.info("   field '%s' of index '%s' is not in schema", field, index_name)
+                continue
+            field_schema.setdefault('indexes', []).append(index_name)
+
+    if collection_stats is not None:
+        collection_schema['storage'] = {key: collection_stats[key] for key in STORAGE_STATS_KEYS
+                                        if key in collection_stats}
+
+
+def get_index_fields(index_info):
+    """ Names of fields of an index, in dot notation.
+
+    Text indexes fields are read from their 'weights', and wildcard keys are skipped.
+
+    :param index_info: dict - value of index_information()
+    :return fields: list of str
+    """
+    if 'weights' in index_info:
+        return sorted(index_info['weights'])
+    return [field for field, _ in index_info['key']
+            if not field.startswith('_fts') and '$**' not in field]
+
+
+def get_field_schema(object_schema, field):
+    """ Get the schema of a field in dot notation, going through objects and arrays of objects.
+
+    :param object_schema: dict
+    :param field: str - field name in dot notation
+    :return field_schema: dict, or None if field is not in object_schema
+    """
+    field_schema = None
+    for name in field.split('.'):
+        if object_schema is None or name not in object_schema:
+            return None
+        field_schema = object_schema[name]
+        object_schema = field_schema.get('object')
+    return field_schema
+
+
 def recursive_default_to_regular_dict(value):
     """ If value is a dictionary, recursively replace defaultdict to regular dict
 
@@ -164,6 +329,10 @@ def post_process_schema(object_count_schema):
 
         summarize_types(field_schema)
         field_schema['prop_in_object'] = round((field_schema['count']) / float(object_count), 4)
+        if 'stats' in field_schema:
+            summarize_stats(field_schema['stats'])
+        if 'sketches' in field_schema:
+            summarize_sketches(field_schema)
         if 'object' in field_schema:
             post_process_schema(field_schema)
 
@@ -195,10 +364,47 @@ def summarize_types(field_schema):
         field_schema['type'] = common_type
 
 
-def init_empty_object_schema():
+def summarize_stats(field_stats):
+    """ Replace the distinct values sketch of field stats by its estimate.
+
+    :param field_stats: dict
+    """
+    field_stats['distinct'] = field_stats['distinct'].cardinality()
+
+
+def summarize_sketches(field_schema):
+    """ Add 'cardinality' and 'top_values' estimates of field sketches, and serialize sketches.
+
+    :param field_schema: dict - with 'sketches' either as objects or as dicts
+    """
+    cardinality_sketch, top_values_sketch = load_field_sketches(field_schema)
+    field_schema['cardinality'] = cardinality_sketch.cardinality()
+    field_schema['top_values'] = [list(value_count) for value_count in top_values_sketch.top()]
+    field_schema['sketches'] = {'cardinality': cardinality_sketch.to_dict(),
+                                'top_values': top_values_sketch.to_dict()}
+
+
+def load_field_sketches(field_schema):
+    """ Get sketches of a field schema, deserializing them if needed.
+
+    :param field_schema: dict
+    :return cardinality_sketch, top_values_sketch: HyperLogLog, SpaceSaving
+    """
+    sketches = field_schema['sketches']
+    cardinality_sketch, top_values_sketch = sketches['cardinality'], sketches['top_values']
+    if isinstance(cardinality_sketch, dict):
+        cardinality_sketch = HyperLogLog.from_dict(cardinality_sketch)
+    if isinstance(top_values_sketch, dict):
+        top_values_sketch = SpaceSaving.from_dict(top_values_sketch)
+    return cardinality_sketch, top_values_sketch
+
+
+def init_empty_object_schema(with_stats=False, with_sketches=False):
     """ Generate an empty object schema.
 
     We use a defaultdict of empty fields schema. This avoid to test for the presence of fields.
+    :param with_stats: bool, default False - fields schemas are initialized with 'stats'
+    :param with_sketches: bool, default False - fields schemas are initialized with 'sketches'
     :return: defaultdict(empty_field_schema)
     """
 
@@ -207,6 +413,12 @@ def init_empty_object_schema():
             'types_count': defaultdict(int),
             'count': 0,
         }
+        if with_stats or with_sketches:
+            distinct_sketch = HyperLogLog()  # shared by stats and sketches
+        if with_stats:
+            field_dict['stats'] = {'distinct': distinct_sketch}
+        if with_sketches:
+            field_dict['sketches'] = {'cardinality': distinct_sketch, 'top_values': SpaceSaving()}
         return field_dict
 
     empty_object = defaultdict(empty_field_schema)
@@ -238,6 +450,7 @@ def add_value_to_field_schema(value, field_schema):
     """
     field_schema['count'] += 1
     add_value_type(value, field_schema)
+    add_value_to_field_summaries(value, field_schema)
     add_potential_list_to_field_schema(value, field_schema)
     add_potential_document_to_field_schema(value, field_schema)
 
@@ -252,7 +465,8 @@ def add_potential_document_to_field_schema(document, field_schema):
     """
     if isinstance(document, dict):
         if 'object' not in field_schema:
-            field_schema['object'] = init_empty_object_schema()
+            field_schema['object'] = init_empty_object_schema(
+                with_stats='stats' in field_schema, with_sketches='sketches' in field_schema)
         add_document_to_object_schema(document, field_schema['object'])
 
 
@@ -275,6 +489,7 @@ def add_potential_list_to_field_schema(value_list, field_schema):
 
         for value in value_list:
             add_value_type(value, field_schema, type_str='array_types_count')
+            add_value_to_field_summaries(value, field_schema)
             add_potential_document_to_field_schema(value, field_schema)
 
 
@@ -288,3 +503,172 @@ def add_value_type(value, field_schema, type_str='types_count'):
     """
     value_type_str = get_type_string(value)
     field_schema[type_str][value_type_str] += 1
+
+
+def add_value_to_field_summaries(value, field_schema):
+    """ Add a scalar value to field stats and sketches, if extracted with them.
+
+    The distinct values sketch shared by stats and sketches is only updated once.
+
+    :param value:
+    :param field_schema: dict
+    """
+    if 'stats' in field_schema:
+        add_value_to_field_stats(value, field_schema['stats'])
+    if 'sketches' in field_schema:
+        add_value_to_field_sketches(value, field_schema['sketches'],
+                                    with_cardinality='stats' not in field_schema)
+
+
+def add_value_to_field_stats(value, field_stats):
+    """ Add a scalar value to field stats. Arrays, objects and null values are skipped.
+
+    - numbers update 'min' and 'max', and floats 'max_scale'
+    - strings update 'max_length', as oid and dbref, mapped to the same column when merged
+      with strings, with the length of their text (as loaded by load module)
+    - all scalars are added to the 'distinct' sketch
+
+    :param value:
+    :param field_stats: dict
+    """
+    value_type_str = get_type_string(value)
+    if value_type_str in ['ARRAY', 'OBJECT', 'null']:
+        return
+    field_stats['distinct'].add(value)
+
+    if value_type_str in ['integer', 'biginteger', 'float']:
+        if value_type_str == 'float':
+            if math.isinf(value) or math.isnan(value):
+                return
+            exponent = Decimal(repr(value)).as_tuple().exponent
+            field_stats['max_scale'] = max(field_stats.get('max_scale', 0), -exponent)
+        field_stats['min'] = min(field_stats.get('min', value), value)
+        field_stats['max'] = max(field_stats.get('max', value), value)
+
+    elif value_type_str == 'string':
+        field_stats['max_length'] = max(field_stats.get('max_length', 0), len(value))
+
+    elif value_type_str in ['oid', 'dbref']:
+        field_stats['max_length'] = max(field_stats.get('max_length', 0),
+                                        len(u'{}'.format(value)))
+
+
+def add_value_to_field_sketches(value, field_sketches, with_cardinality=True):
+    """ Add a scalar value to field sketches. Arrays, objects and null values are skipped.
+
+    Values which are not json serializable (oid, date, ...) are added as strings.
+
+    :param value:
+    :param field_sketches: dict {'cardinality': HyperLogLog, 'top_values': SpaceSaving}
+    :param with_cardinality: bool, default True - False if 'cardinality' sketch is shared with
+                             field stats, and value already added to it
+    """
+    value_type_str = get_type_string(value)
+    if value_type_str in ['ARRAY', 'OBJECT', 'null']:
+        return
+    if value_type_str not in ['boolean', 'integer', 'biginteger', 'float', 'string']:
+        value = u'{}'.format(value)
+    if with_cardinality:
+        field_sketches['cardinality'].add(value)
+    field_sketches['top_values'].add(value)
+
+
+###
+# Merge of schemas from partial extractions (disjoint sets of documents)
+
+def merge_mongo_schemas(mongo_schema, other_mongo_schema):
+    """ Merge schemas extracted from disjoint sets of documents, as if extracted at once.
+
+    Counts are summed, types and proportions are computed again and sketches are merged.
+    'stats' 'distinct' is not mergeable: it is taken from merged sketches 'cardinality' if
+    schemas were extracted with sketches, otherwise the maximum is kept.
+    Stats and sketches of a field are dropped if only one of the schemas has them.
+
+    :param mongo_schema: dict
+    :param other_mongo_schema: dict
+    :return merged_mongo_schema: dict - new schema, sharing unmerged parts with inputs
+    """
+    merged_mongo_schema = dict(mongo_schema)
+    for database, other_database_schema in other_mongo_schema.items():
+        merged_database_schema = dict(mongo_schema.get(database, {}))
+        for collection, other_collection_schema in other_database_schema.items():
+            if collection in merged_database_schema:
+                merged_database_schema[collection] = merge_object_count_schemas(
+                    merged_database_schema[collection], other_collection_schema)
+            else:
+                merged_database_schema[collection] = other_collection_schema
+        merged_mongo_schema[database] = merged_database_schema
+    return merged_mongo_schema
+
+
+# Keys of field schemas summarizing values, only kept when merged schemas both have them
+SUMMARY_KEYS = ['stats', 'sketches', 'cardinality', 'top_values']
+
+
+def merge_object_count_schemas(object_count_schema, other_object_count_schema):
+    """ Merge collection (or field) schemas extracted from disjoint sets of documents.
+
+    :param object_count_schema: dict - collection or field schema
+    :param other_object_count_schema: dict
+    :return merged_object_count_schema: dict
+    """
+    merged = {k: v for k, v in object_count_schema.items()
+              if k not in ['object', 'prop_in_object', 'type', 'array_type'] + SUMMARY_KEYS}
+    merged['count'] = object_count_schema['count'] + other_object_count_schema['count']
+    for types_key in ['types_count', 'array_types_count']:
+        if types_key in object_count_schema or types_key in other_object_count_schema:
+            merged[types_key] = _merge_counts(object_count_schema.get(types_key, {}),
+                                              other_object_count_schema.get(types_key, {}))
+    # stats and sketches of only one side would describe part of the documents: they are dropped
+    if 'stats' in object_count_schema and 'stats' in other_object_count_schema:
+        merged['stats'] = _merge_field_stats(object_count_schema['stats'],
+                                             other_object_count_schema['stats'])
+    if 'sketches' in object_count_schema and 'sketches' in other_object_count_schema:
+        cardinality_sketch, top_values_sketch = load_field_sketches(object_count_schema)
+        other_cardinality_sketch, other_top_values_sketch = load_field_sketches(
+            other_object_count_schema)
+        cardinality_sketch.merge(other_cardinality_sketch)
+        top_values_sketch.merge(other_top_values_sketch)
+        merged['sketches'] = {'cardinality': cardinality_sketch, 'top_values': top_values_sketch}
+        summarize_sketches(merged)
+        if 'stats' in merged:  # same estimate as a distinct values sketch of merged values
+            merged['stats']['distinct'] = merged['cardinality']
+
+    if 'object' in object_count_schema or 'object' in other_object_count_schema:
+        object_schema = object_count_schema.get('object', {})
+        other_object_schema = other_object_count_schema.get('object', {})
+        merged['object'] = dict()
+        for field in set(object_schema) | set(other_object_schema):
+            if field in object_schema and field in other_object_schema:
+                merged['object'][field] = merge_object_count_schemas(object_schema[field],
+                                                                     other_object_schema[field])
+            else:
+                merged['object'][field] = dict(object_schema.get(field) or
+                                               other_object_schema[field])
+            field_schema = merged['object'][field]
+            field_schema['prop_in_object'] = round(field_schema['count'] / float(merged['count']),
+                                                   4)
+    if 'types_count' in merged:
+        summarize_types(merged)
+    return merged
+
+
+def _merge_counts(counts, other_counts):
+    """Sum counts of two dicts {key: count}."""
+    merged_counts = dict(counts)
+    for key, count in other_counts.items():
+        merged_counts[key] = merged_counts.get(key, 0) + count
+    return merged_counts
+
+
+def _merge_field_stats(field_stats, other_field_stats):
+    """Merge field stats, keeping the widest ranges."""
+    merged_stats = dict(field_stats)
+    for key, value in other_field_stats.items():
+        if key not in merged_stats:
+            merged_stats[key] = value
+        elif key == 'min':
+            merged_stats[key] = min(merged_stats[key], value)
+        else:  # 'max', 'max_scale', 'max_length', 'distinct'
+            merged_stats[key] = max(merged_stats[key], value)
+    return merged_stats
@@ -9,9 +9,31 @@ The namespace uses mongo-connector config format:
      db_name_1.coll_name_2 : False,
      db_name_1.coll_name_1 : {"includeFields: [field1, field2.subfield1]},
      db_name_1.coll_name_1 : {"excludeFields: [field1, field2.subfield1]}}
+
+Database, collection and field names may use glob wildcards ('*', '?', '[...]'):
+
+    {"tenant_*.users": {"excludeFields": ["password", "*.secret"]}}
+
+A namespace, or a field, prefixed with 're:' is a regular expression,
+matched against the full name (db_name.coll_name, or field.subfield):
+
+    {"re:tenant_\\d+\\.logs_.*": False}
+
+When several namespaces match a collection:
+- an exact 'db_name.coll_name' namespace takes precedence
+- otherwise, a matching False namespace excludes the collection
+- otherwise, the first matching namespace is used
+
+Namespaces are compiled once in a NamespaceFilter object,
+that can be used to filter a schema or to skip collections while extracting.
 """
-from copy import deepcopy
+import fnmatch
 import logging
+import re
+
+from past.builtins import basestring
+
+from pymongo_schema.schema_index import SchemaIndex
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +41,9 @@ logger = logging.getLogger(__name__)
 # PRESENT_VALUE is used as the value for those keys to keep
 PRESENT_VALUE = 'present'
 
+# Prefix of namespaces and fields defined as regular expressions
+REGEX_PREFIX = 're:'
+
 
 def filter_mongo_schema_namespaces(mongo_schema, namespaces_dict):
     """ Filter the schema with namespaces
@@ -27,56 +52,15 @@ def filter_mongo_schema_namespaces(mongo_schema, namespaces_dict):
     :param namespaces_dict: dict
     :return filtered_schema: dict
     """
-    filtered_schema = init_filtered_schema(namespaces_dict)
-
-    for namespace, filt in namespaces_dict.items():
-        if filt is False:
-            continue
-
-        db, collection = namespace.split('.', 1)
-
-        if db not in mongo_schema:
-            logger.warning('WARNING : Database %s is supposed to be filtered, but is not present '
-                           'in mongo schema', db)
-            continue
-        database_schema = mongo_schema[db]
-
-        if collection == '*':
-            collection_list = database_schema.keys()
-        else:
-            collection_list = [collection]
-
-        for collection in collection_list:
-            if collection not in database_schema:
-                logger.warning('WARNING : Collection %s is supposed to be filtered from database '
-                               '%s, but is not present in mongo schema', collection, db)
-                continue
-            collection_schema = database_schema[collection]
-
-            if filt is True:
-                logger.info("Include the whole collection %s", collection)
-                filtered_schema[db][collection] = collection_schema
-            else:
-                if 'excludeFields' in filt:
-                    logger.info("Exclude fields from collection %s", collection)
-                    filtered_schema[db][collection] = exclude_fields_from_collection_schema(
-                        filt['excludeFields'], collection_schema)
-                elif 'includeFields' in filt:
-                    logger.info("Include fields from collection %s", collection)
-                    filtered_schema[db][collection] = include_fields_from_collection_schema(
-                        filt['includeFields'], collection_schema)
-                else:
-                    raise NotImplementedError('unknown option, not implemented : %s', filt.keys())
-
-    for db in list(filtered_schema):
-        if not filtered_schema[db]:
-            del filtered_schema[db]
-    return filtered_schema
+    return NamespaceFilter(namespaces_dict).filter_schema(mongo_schema)
 
 
 def init_filtered_schema(namespaces_dict):
     """ Initialize filtered_schema dict for databases present in namespace
 
+    Deprecated, no longer used: NamespaceFilter.filter_schema only creates databases
+    with included collections. Kept for backward compatibility.
+
     :param namespaces_dict: dict
     :return filtered_schema: dict
     """
@@ -107,39 +91,28 @@ def include_fields_from_collection_schema(include_fields_list, collection_schema
     :param include_fields_list: list
     :param collection_schema: dict
     """
-    include_fields_dict = field_list_to_dict(include_fields_list)
-    return include_fields_from_object_schema(include_fields_dict, collection_schema)
+    return FieldsFilter(include_fields_list, patterns=False).filter_collection_schema(
+        collection_schema)
 
 
 def include_fields_from_object_schema(include_fields_dict, object_count_schema):
-    """ Add fields from include_fields_dict to object schema.
+    """ Copy object schema, keeping only fields from include_fields_dict.
 
-    :param include_fields_dict: dict
+    Deprecated, use FieldsFilter: kept for backward compatibility.
+
+    :param include_fields_dict: dict - as returned by field_list_to_dict
     :param object_count_schema: dict
+    :return object_count_schema_filtered: dict
     """
-    object_schema_filtered = {k: v for k, v in object_count_schema.items() if k != 'object'}
-    object_schema_filtered['object'] = {}
-
-    object_schema = object_count_schema['object']
-    for field, value in include_fields_dict.items():
-        if field not in object_schema:
-            logger.warning("WARNING: Field '%s' is present in includeFields but not in schema",
-                           field)
-            continue
-
-        if value is PRESENT_VALUE:
-            object_schema_filtered['object'][field] = object_schema[field]
-        else:
-            subfield_dict = value
-            field_schema = object_schema[field]
-            object_schema_filtered['object'][field] = include_fields_from_object_schema(
-                subfield_dict, field_schema)
-
-    return object_schema_filtered
+    return include_fields_from_collection_schema(field_dict_to_list(include_fields_dict),
+                                                 object_count_schema)
 
 
 def exclude_fields_from_collection_schema(exclude_fields_list, collection_schema):
-    """ Deep copy collection_schema and exclude fields from it.
+    """ Copy collection_schema, excluding fields from it.
+
+    Only dicts on the paths to excluded fields are copied,
+    untouched sub-schemas are shared with collection_schema.
 
     >>> collection_schema = {\
         'object': {\
@@ -158,33 +131,40 @@ def exclude_fields_from_collection_schema(exclude_fields_list, collection_schema
 
     :param exclude_fields_list: list
     :param collection_schema: dict
-    :return collection_schema_copied_filtered: dict
+    :return collection_schema_filtered: dict
     """
-    collection_schema_copied_filtered = deepcopy(collection_schema)
-    exclude_fields_dict = field_list_to_dict(exclude_fields_list)
-    exclude_fields_from_object_schema(exclude_fields_dict,
-                                      collection_schema_copied_filtered['object'])
-    return collection_schema_copied_filtered
+    return FieldsFilter(exclude_fields_list, exclude=True,
+                        patterns=False).filter_collection_schema(collection_schema)
+
+
+def exclude_fields_from_object_count_schema(exclude_fields_dict, object_count_schema):
+    """ Copy object schema without fields from exclude_fields_dict, sharing untouched fields.
+
+    Deprecated, use FieldsFilter: kept for backward compatibility.
+
+    :param exclude_fields_dict: dict - as returned by field_list_to_dict
+    :param object_count_schema: dict
+    :return object_count_schema_filtered: dict
+    """
+    return exclude_fields_from_collection_schema(field_dict_to_list(exclude_fields_dict),
+                                                 object_count_schema)
 
 
 def exclude_fields_from_object_schema(exclude_fields_dict, object_schema):
     """ Exclude fields from object schema, with no return value.
 
-    :param exclude_fields_dict: dict
+    Deprecated, use FieldsFilter: kept for backward compatibility.
+    Parents of excluded subfields are replaced by filtered copies in object_schema.
+
+    :param exclude_fields_dict: dict - as returned by field_list_to_dict
     :param object_schema: dict
     """
-    for field, value in exclude_fields_dict.items():
-        if field not in object_schema:
-            logger.warning("WARNING: Field '%s' is present in excludeFields, but not in schema",
-                           field)
-            continue
-
-        if value is PRESENT_VALUE:
-            object_schema.pop(field)
-        else:
-            subfield_dict = value
-            field_schema = object_schema[field]
-            exclude_fields_from_object_schema(subfield_dict, field_schema['object'])
+    filtered_object_schema = exclude_fields_from_collection_schema(
+        field_dict_to_list(exclude_fields_dict), {'object': object_schema})['object']
+    if filtered_object_schema is not object_schema:
+        for field in set(object_schema) - set(filtered_object_schema):
+            del object_schema[field]
+        object_schema.update(filtered_object_schema)
 
 
 def field_list_to_dict(field_list):
@@ -219,3 +199,327 @@ def add_field_to_dict(field, fields_dict):
             if not fields_dict[parent_field] is PRESENT_VALUE:
                 # Test if parent field is not already forced to be included
                 add_field_to_dict(subfield, fields_dict[parent_field])
+
+
+def field_dict_to_list(fields_dict):
+    """ Transform a recursive field dictionary back to a field list
+
+    >>> field_dict_to_list({'field': 'present', 'sub': {'field': 'present'}})
+    ['field', 'sub.field']
+
+    :param fields_dict: dict
+    :return field_list: list
+    """
+    field_list = []
+    for field, value in sorted(fields_dict.items()):
+        if value is PRESENT_VALUE:
+            field_list.append(field)
+        else:
+            field_list.extend('{}.{}'.format(field, subfield)
+                              for subfield in field_dict_to_list(value))
+    return field_list
+
+
+def _compile_name_pattern(pattern):
+    """ Compile a database, collection or field name pattern.
+
+    :param pattern: str - name, potentially with glob wildcards
+    :return: str if pattern is an exact name, else compiled regex
+    """
+    if any(char in pattern for char in '*?['):
+        return re.compile(fnmatch.translate(pattern))
+    return pattern
+
+
+def _match_name(compiled_pattern, name):
+    """ Test if name matches a pattern compiled with _compile_name_pattern.
+
+    :param compiled_pattern: str or compiled regex
+    :param name: str
+    :return: bool
+    """
+    if isinstance(compiled_pattern, basestring):
+        return compiled_pattern == name
+    return compiled_pattern.match(name) is not None
+
+
+def _compile_regex(pattern):
+    """Compile a regular expression that must match the entire string."""
+    return re.compile('(?:{})\\Z'.format(pattern[len(REGEX_PREFIX):]))
+
+
+class FieldsFilter(object):
+    """
+    Compiled includeFields or excludeFields option, applied to a collection schema.
+
+    Each field is either an exact path ('field.subfield'), a path with glob wildcards in
+    any of its parts ('*.secret'), or a regular expression prefixed with 're:'.
+    """
+
+    def __init__(self, fields_list, exclude=False, patterns=True):
+        """
+        :param fields_list: list of str - fields to include (or exclude)
+        :param exclude: bool - if True, fields are excluded, else only those fields are included
+        :param patterns: bool, default True - if False, fields are exact paths, even with
+                         wildcards or 're:' prefix (as in legacy helpers)
+        """
+        self.fields_list = list(fields_list)
+        self.exclude = exclude
+        self._patterns = []
+        for field in self.fields_list:
+            if not patterns:
+                self._patterns.append(tuple(field.split('.')))
+            elif field.startswith(REGEX_PREFIX):
+                self._patterns.append(_compile_regex(field))
+            else:
+                self._patterns.append(tuple(_compile_name_pattern(part)
+                                            for part in field.split('.')))
+
+    @property
+    def projection(self):
+        """ MongoDB find projection, to only fetch fields needed to apply this filter.
+
+        Applying the filter on a schema extracted with this projection gives the same result
+        as applying it on a schema extracted without projection:
+        - excluded exact fields are projected out (nested fields included),
+          patterns with wildcards or regular expressions are left to the filter
+        - included fields are projected on their top-level field, so that counts of parents
+          of included nested fields are unchanged. There is no projection if a pattern
+          with wildcards or regular expressions may match any top-level field.
+
+        :return projection: dict or None if all fields are needed
+        """
+        if self.exclude:
+            exact_fields = [field for field, pattern in zip(self.fields_list, self._patterns)
+                            if isinstance(pattern, tuple) and
+                            all(isinstance(part, basestring) for part in pattern)]
+            # Avoid path collisions, when a parent field is also excluded
+            projected_fields = [field for field in exact_fields
+                                if not any(field.startswith(other + '.')
+                                           for other in exact_fields)]
+            return {field: 0 for field in set(projected_fields)} or None
+
+        top_fields = set()
+        for pattern in self._patterns:
+            if not isinstance(pattern, tuple) or not isinstance(pattern[0], basestring):
+                return None
+            top_fields.add(pattern[0])
+        return {field: 1 for field in top_fields} or None
+
+    def _field_status(self, path, used_patterns, schema_index):
+        """ Tell how a field given by its path is concerned by patterns.
+
+        :param path: tuple - field path (parent names and field name)
+        :param used_patterns: set - indexes of patterns matching a field, updated
+        :param schema_index: SchemaIndex - index of the collection schema, giving field names
+        :return: 'all' if field is matched,
+                 'partial' if some subfields may be matched by exact or glob patterns,
+                 'maybe' if some subfields may be matched by regular expressions,
+                 None if neither the field nor its subfields are matched
+        """
+        status = None
+        for index, pattern in enumerate(self._patterns):
+            if isinstance(pattern, tuple):
+                if len(pattern) < len(path) or not all(
+                        _match_name(part, name) for part, name in zip(pattern, path)):
+                    continue
+                if len(pattern) == len(path):
+                    used_patterns.add(index)
+                    return 'all'
+                status = 'partial'
+            elif pattern.match(schema_index.dotted_name(path)):
+                used_patterns.add(index)
+                return 'all'
+            elif status is None:
+                status = 'maybe'
+        return status
+
+    def filter_collection_schema(self, collection_schema):
+        """ Copy collection_schema, keeping (or excluding) fields.
+
+        Only dicts on the paths to filtered fields are copied,
+        untouched sub-schemas are shared with collection_schema.
+
+        :param collection_schema: dict
+        :return collection_schema_filtered: dict
+        """
+        used_patterns = set()
+        schema_index = SchemaIndex(collection_schema['object'])
+        filtered_schema = self._filter_object_count_schema(collection_schema, schema_index, (),
+                                                           used_patterns)
+        for index, pattern in enumerate(self._patterns):
+            if index not in used_patterns and isinstance(pattern, tuple) and \
+                    all(isinstance(part, basestring) for part in pattern):
+                logger.warning("WARNING: Field '%s' is present in %s but not in schema",
+                               self.fields_list[index],
+                               'excludeFields' if self.exclude else 'includeFields')
+        return filtered_schema
+
+    def _filter_object_count_schema(self, object_count_schema, schema_index, path,
+                                    used_patterns):
+        """ Recursively filter an object_count_schema (collection or field schema),
+        of given path in schema_index.
+
+        When excluding, the original object_count_schema is returned if no field is excluded.
+        """
+        filtered_object = dict()
+        modified = False
+        for field, field_path in schema_index.children(path).items():
+            field_schema = schema_index[field_path]
+            status = self._field_status(field_path, used_patterns, schema_index)
+            if status == 'all':
+                if self.exclude:
+                    modified = True
+                else:
+                    filtered_object[field] = field_schema
+            elif status is None or 'object' not in field_schema:
+                if self.exclude:
+                    filtered_object[field] = field_schema
+                else:
+                    modified = True
+            else:
+                filtered_field = self._filter_object_count_schema(field_schema, schema_index,
+                                                                  field_path, used_patterns)
+                if filtered_field is not field_schema:
+                    modified = True
+                if status == 'maybe' and not filtered_field['object'] and not self.exclude:
+                    continue
+                filtered_object[field] = filtered_field
+
+        if self.exclude and not modified:
+            return object_count_schema
+        filtered_schema = {k: v for k, v in object_count_schema.items() if k != 'object'}
+        filtered_schema['object'] = filtered_object
+        return filtered_schema
+
+
+class NamespaceFilter(object):
+    """
+    Compiled namespaces dictionary (see module docstring), built once and applied in one
+    traversal of a schema.
+
+    Public methods:
+    collection_filter: filter to apply to a collection (True, FieldsFilter or None if excluded)
+    may_include_database: whether some collections of a database may be included
+    filter_collection_schema: filter a collection schema
+    filter_schema: filter a mongo schema
+    """
+
+    def __init__(self, namespaces_dict):
+        """
+        :param namespaces_dict: dict - mongo-connector namespaces configuration
+        """
+        self.namespaces_dict = namespaces_dict
+        self._exact_namespaces = dict()
+        self._patterns = []
+        for namespace, filt in namespaces_dict.items():
+            filt = self._compile_filter(filt)
+            if namespace.startswith(REGEX_PREFIX):
+                self._patterns.append((_compile_regex(namespace), filt))
+                continue
+            db, collection = namespace.split('.', 1)
+            db_pattern = _compile_name_pattern(db)
+            collection_pattern = _compile_name_pattern(collection)
+            if isinstance(db_pattern, basestring) and \
+                    isinstance(collection_pattern, basestring):
+                self._exact_namespaces[(db, collection)] = filt
+            else:
+                self._patterns.append(((db_pattern, collection_pattern), filt))
+
+    @staticmethod
+    def _compile_filter(filt):
+        """Compile a namespace value into True, False or a FieldsFilter."""
+        if filt is True or filt is False:
+            return filt
+        if 'excludeFields' in filt:
+            return FieldsFilter(filt['excludeFields'], exclude=True)
+        if 'includeFields' in filt:
+            return FieldsFilter(filt['includeFields'])
+        raise NotImplementedError('unknown option, not implemented : %s', filt.keys())
+
+    def collection_filter(self, db, collection):
+        """ Get the filter to apply to a collection.
+
+        :param db: str
+        :param collection: str
+        :return: True to include the whole collection, a FieldsFilter,
+                 or None if the collection is excluded
+        """
+        if (db, collection) in self._exact_namespaces:
+            filt = self._exact_namespaces[(db, collection)]
+            return None if filt is False else filt
+
+        matching_filters = []
+        for pattern, filt in self._patterns:
+            if isinstance(pattern, tuple):
+                if _match_name(pattern[0], db) and _match_name(pattern[1], collection):
+                    matching_filters.append(filt)
+            elif pattern.match('{}.{}'.format(db, collection)):
+                matching_filters.append(filt)
+
+        if not matching_filters or False in matching_filters:
+            return None
+        return matching_filters[0]
+
+    def may_include_database(self, db):
+        """ Whether some collections of database db may be included.
+
+        :param db: str
+        :return: bool
+        """
+        for (exact_db, _), filt in self._exact_namespaces.items():
+            if exact_db == db and filt is not False:
+                return True
+        for pattern, filt in self._patterns:
+            if filt is False:
+                continue
+            if not isinstance(pattern, tuple) or _match_name(pattern[0], db):
+                return True
+        return False
+
+    def filter_collection_schema(self, db, collection, collection_schema):
+        """ Filter a collection schema.
+
+        :param db: str
+        :param collection: str
+        :param collection_schema: dict
+        :return: filtered collection schema, or None if the collection is excluded
+        """
+        filt = self.collection_filter(db, collection)
+        if filt is None:
+            return None
+        if filt is True:
+            logger.info("Include the whole collection %s", collection)
+            return collection_schema
+        logger.info("%s fields from collection %s",
+                    'Exclude' if filt.exclude else 'Include', collection)
+        return filt.filter_collection_schema(collection_schema)
+
+    def filter_schema(self, mongo_schema):
+        """ Filter a mongo schema, in one traversal of its databases and collections.
+
+        :param mongo_schema: dict
+        :return filtered_schema: dict
+        """
+        for db, collection in self._exact_namespaces:
+            if db not in mongo_schema:
+                logger.warning('WARNING : Database %s is supposed to be filtered, but is not '
+                               'present in mongo schema', db)
+            elif collection not in mongo_schema[db]:
+                logger.warning('WARNING : Collection %s is supposed to be filtered from '
+                               'database %s, but is not present in mongo schema', collection, db)
+
+        filtered_schema = dict()
+        for db, database_schema in mongo_schema.items():
+            if not self.may_include_database(db):
+                continue
+            filtered_database_schema = dict()
+            for collection in database_schema:
+                # schemas of excluded collections are not accessed (see schema_file.SchemaFile)
+                if self.collection_filter(db, collection) is None:
+                    continue
+                filtered_database_schema[collection] = self.filter_collection_schema(
+                    db, collection, database_schema[collection])
+            if filtered_database_schema:
+                filtered_schema[db] = filtered_database_schema
+        return filtered_schema
@@ -0,0 +1,245 @@
+# coding: utf8
+"""
+This module intends to compute compact fingerprints of mongo schemas (from extract module).
+
+A fingerprint manifest holds a hash for each database, collection and field of a schema.
+Only the base structure compared by compare module is hashed (names, 'type' and 'array_type'),
+so that two schemas with the same fingerprint have no difference for compare_schemas_bases.
+
+    {
+        "hash": str,
+        "databases": {
+            "database_name": {
+                "hash": str,
+                "collections": {
+                    "collection_name": {
+                        "hash": str,
+                        "fields": {"field.subfield": str, ...}
+                    }
+                }
+            }
+        },
+        "schema_files": {"schema_file_name": {"size": int, "mtime": float}, ...}
+    }
+
+Manifests are only trusted for the schema files they were written with ('schema_files').
+"""
+import hashlib
+import json
+import logging
+import os
+
+from pymongo_schema.compression import split_compression_extension
+
+logger = logging.getLogger(__name__)
+
+# Number of hexadecimal characters kept from each hash, to keep manifests compact
+HASH_LENGTH = 16
+
+FINGERPRINT_EXTENSION = 'fingerprint.json'
+
+# Key of manifests holding stamps of the schema files they describe
+SCHEMA_FILES_KEY = 'schema_files'
+
+
+def make_hash(value):
+    """ Hash a json serializable value in a canonical way.
+
+    :param value: json serializable value
+    :return hash: str
+    """
+    canonical_str = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical_str.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+
+def mongo_schema_fingerprint(mongo_schema):
+    """ Compute the fingerprint manifest of a mongo schema.
+
+    :param mongo_schema: dict
+    :return fingerprint: dict
+    """
+    databases = dict()
+    for database, database_schema in mongo_schema.items():
+        databases[database] = database_schema_fingerprint(database_schema)
+
+    return {
+        'hash': make_hash(sorted((db, fp['hash']) for db, fp in databases.items())),
+        'databases': databases
+    }
+
+
+def database_schema_fingerprint(database_schema):
+    """ Compute the fingerprint of a database schema.
+
+    :param database_schema: dict
+    :return fingerprint: dict
+    """
+    collections = dict()
+    for collection, collection_schema in database_schema.items():
+        collections[collection] = collection_schema_fingerprint(collection_schema)
+
+    return {
+        'hash': make_hash(sorted((coll, fp['hash']) for coll, fp in collections.items())),
+        'collections': collections
+    }
+
+
+def collection_schema_fingerprint(collection_schema):
+    """ Compute the fingerprint of a collection schema.
+
+    :param collection_schema: dict
+    :return fingerprint: dict
+    """
+    fields = dict()
+    add_object_to_fingerprint(collection_schema.get('object', {}), fields)
+    return {
+        'hash': make_hash(sorted(fields.items())),
+        'fields': fields
+    }
+
+
+def add_object_to_fingerprint(object_schema, fields, field_prefix=''):
+    """ Recursively add the hash of each field of object_schema to fields. No return value.
+
+    :param object_schema: dict
+    :param fields: dict - {field full name: hash}
+    :param field_prefix: str - full name of parent object, '.' separated
+    """
+    for field, field_schema in object_schema.items():
+        field_full_name = field_prefix + field
+        fields[field_full_name] = make_hash([field_schema.get('type'),
+                                             field_schema.get('array_type')])
+        if 'object' in field_schema:
+            add_object_to_fingerprint(field_schema['object'], fields,
+                                      field_prefix=field_full_name + '.')
+
+
+def compare_fingerprints(prev_fingerprint, new_fingerprint):
+    """ List namespaces whose fingerprints differ between two manifests.
+
+    A database present in only one manifest is listed as a whole: (database, None).
+    Otherwise each differing collection is listed: (database, collection).
+
+    :param prev_fingerprint: dict
+    :param new_fingerprint: dict
+    :return changed_namespaces: list of tuples (database, collection or None)
+    """
+    if prev_fingerprint['hash'] == new_fingerprint['hash']:
+        return []
+
+    prev_databases = prev_fingerprint['databases']
+    new_databases = new_fingerprint['databases']
+    changed_namespaces = []
+    for database in sorted(set(prev_databases) | set(new_databases)):
+        if database not in prev_databases or database not in new_databases:
+            changed_namespaces.append((database, None))
+            continue
+        prev_db_fp = prev_databases[database]
+        new_db_fp = new_databases[database]
+        if prev_db_fp['hash'] == new_db_fp['hash']:
+            continue
+        prev_collections = prev_db_fp['collections']
+        new_collections = new_db_fp['collections']
+        for collection in sorted(set(prev_collections) | set(new_collections)):
+            prev_hash = prev_collections.get(collection, {}).get('hash')
+            new_hash = new_collections.get(collection, {}).get('hash')
+            if prev_hash != new_hash:
+                changed_namespaces.append((database, collection))
+    return changed_namespaces
+
+
+def restrict_schema_to_namespaces(mongo_schema, namespaces):
+    """ Copy the first levels of mongo_schema, keeping only given namespaces.
+
+    Collection schemas are not copied but shared with mongo_schema.
+
+    :param mongo_schema: dict
+    :param namespaces: list of tuples (database, collection or None) - from compare_fingerprints
+    :return restricted_schema: dict
+    """
+    restricted_schema = dict()
+    for database, collection in namespaces:
+        if database not in mongo_schema:
+            continue
+        if collection is None:
+            restricted_schema[database] = mongo_schema[database]
+            continue
+        restricted_schema.setdefault(database, dict())
+        if collection in mongo_schema[database]:
+            restricted_schema[database][collection] = mongo_schema[database][collection]
+    return restricted_schema
+
+
+def fingerprint_filename(schema_filename):
+    """ Name of the fingerprint manifest written alongside a schema file.
+
+    >>> fingerprint_filename('mongo_schema.json')
+    'mongo_schema.fingerprint.json'
+    >>> fingerprint_filename('mongo_schema.json.gz')
+    'mongo_schema.fingerprint.json'
+
+    :param schema_filename: str
+    :return fingerprint_filename: str
+    """
+    schema_filename = split_compression_extension(schema_filename)[0]
+    base_filename, extension = os.path.splitext(schema_filename)
+    if extension not in ('.json', '.yaml', '.msgpack', '.schemaidx'):
+        base_filename = schema_filename
+    return '{}.{}'.format(base_filename, FINGERPRINT_EXTENSION)
+
+
+def schema_file_stamp(schema_filename):
+    """ Size and modification time of a schema file, tying a manifest to the file it describes.
+
+    :param schema_filename: str
+    :return stamp: dict {'size': int, 'mtime': float}
+    """
+    stat = os.stat(schema_filename)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def write_fingerprint(mongo_schema, schema_filename, schema_filenames=None):
+    """ Write the fingerprint manifest of mongo_schema alongside schema_filename.
+
+    The manifest holds the stamp (see schema_file_stamp) of each schema file it describes,
+    so that it is ignored once one of them is rewritten or edited (see load_fingerprint).
+    It must be written after those files.
+
+    :param mongo_schema: dict
+    :param schema_filename: str
+    :param schema_filenames: list of str, default [schema_filename]
+                             schema files written with mongo_schema, sharing the manifest
+    :return filename: str - name of the manifest written
+    """
+    filename = fingerprint_filename(schema_filename)
+    fingerprint = mongo_schema_fingerprint(mongo_schema)
+    fingerprint[SCHEMA_FILES_KEY] = {
+        os.path.basename(name): schema_file_stamp(name)
+        for name in (schema_filenames or [schema_filename]) if os.path.isfile(name)}
+    logger.info('Write schema fingerprint to %s', filename)
+    with open(filename, 'w') as f:
+        json.dump(fingerprint, f, separators=(',', ':'))
+    return filename
+
+
+def load_fingerprint(schema_filename):
+    """ Load the fingerprint manifest written alongside schema_filename, if any.
+
+    The manifest is ignored if it does not hold the current stamp of schema_filename:
+    schema file was written without fingerprint, or modified, after the manifest.
+
+    :param schema_filename: str
+    :return fingerprint: dict or None if there is no valid manifest
+    """
+    filename = fingerprint_filename(schema_filename)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'r') as f:
+        fingerprint = json.load(f)
+    stamp = fingerprint.pop(SCHEMA_FILES_KEY, {}).get(os.path.basename(schema_filename))
+    if stamp is None or not os.path.isfile(schema_filename) or \
+            stamp != schema_file_stamp(schema_filename):
+        logger.info('Fingerprint %s does not match %s, it is ignored', filename,
+                    schema_filename)
+        return None
+    return fingerprint
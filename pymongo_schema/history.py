@@ -0,0 +1,394 @@
+# coding: utf8
+"""
+This module intends to store successive mongo schemas (from extract module) compactly.
+
+A history is a directory containing:
+- 'history.json': the ordered list of snapshot names
+- 'base.json': the first snapshot, stored entirely
+- 'deltas/<index>.json': for each following snapshot, its delta from the previous one
+- 'latest.json': the last snapshot, stored entirely (with its index in history) to compute the
+  delta of a new snapshot
+- 'checkpoints/<index>.json': every checkpoint_interval snapshots, the snapshot stored entirely,
+  so that a snapshot is reconstructed from the nearest previous checkpoint (or base),
+  replaying at most checkpoint_interval - 1 deltas
+
+Files are written atomically (to a temporary file, then renamed), and 'history.json' last,
+so that an interrupted add_snapshot does not leave a corrupted history: files of the snapshot
+not listed in 'history.json' are overwritten by the next add_snapshot, and 'latest.json' is
+rebuilt from checkpoints and deltas if its index does not match 'history.json'.
+
+Deltas use compare module diff model, with an additional 'path' key (list of names,
+as database or collection names may contain dots).
+Unlike compare_schemas_bases, every difference is recorded, including counts:
+
+- added node (database, collection or field):
+    {'hierarchy': 'db.coll.field', 'path': [...], 'prev_schema': None, 'new_schema': node_schema}
+- removed node:
+    {'hierarchy': 'db.coll.field', 'path': [...], 'prev_schema': node_schema, 'new_schema': None}
+- modified collection or field:
+    {'hierarchy': 'db.coll.field', 'path': [...],
+     'prev_schema': {key: prev_value}, 'new_schema': {key: new_value}}
+  with only modified keys. A key missing from 'new_schema' has been removed.
+  Nested 'object' are compared recursively, unless it is added or removed.
+"""
+import json
+import logging
+import os
+from copy import deepcopy
+
+from pymongo_schema.compare import compare_schemas_bases
+
+try:
+    from os import replace as replace_file
+except ImportError:  # python 2, where rename overwrites destination on posix
+    from os import rename as replace_file
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILENAME = 'history.json'
+BASE_FILENAME = 'base.json'
+LATEST_FILENAME = 'latest.json'
+DELTAS_DIRNAME = 'deltas'
+CHECKPOINTS_DIRNAME = 'checkpoints'
+
+# Number of snapshots between two full snapshots
+CHECKPOINT_INTERVAL = 10
+
+TMP_SUFFIX = '.tmp'
+
+# Keys of 'latest.json'
+LATEST_INDEX_KEY = 'index'
+LATEST_SCHEMA_KEY = 'mongo_schema'
+
+# Sentinel to distinguish a missing key from a None value
+_MISSING = object()
+
+
+def iter_schemas_delta(prev_schema, new_schema, path=()):
+    """ Recursively yield every difference between two schemas (see module docstring).
+
+    :param prev_schema: dict - schema at level given by path
+    :param new_schema: dict - schema at level given by path
+    :param path: tuple - names of parent levels (database, collection, fields)
+    :return: generator of dicts describing differences
+    """
+    if len(path) >= 2:  # collection or field schema
+        prev_attributes = {k: v for k, v in prev_schema.items() if k != 'object'}
+        new_attributes = {k: v for k, v in new_schema.items() if k != 'object'}
+        if ('object' in prev_schema) != ('object' in new_schema):
+            for schema, attributes in [(prev_schema, prev_attributes),
+                                       (new_schema, new_attributes)]:
+                if 'object' in schema:
+                    attributes['object'] = schema['object']
+        changed_keys = [k for k in set(prev_attributes) | set(new_attributes)
+                        if prev_attributes.get(k, _MISSING) != new_attributes.get(k, _MISSING)]
+        if changed_keys:
+            yield _make_delta_line(
+                path,
+                {k: prev_attributes[k] for k in changed_keys if k in prev_attributes},
+                {k: new_attributes[k] for k in changed_keys if k in new_attributes})
+        prev_children = prev_schema.get('object', {}) if 'object' in new_schema else {}
+        new_children = new_schema.get('object', {}) if 'object' in prev_schema else {}
+    else:  # mongo schema or database schema
+        prev_children = prev_schema
+        new_children = new_schema
+
+    for name in sorted(set(prev_children) - set(new_children)):
+        yield _make_delta_line(path + (name,), prev_children[name], None)
+    for name in sorted(set(new_children) - set(prev_children)):
+        yield _make_delta_line(path + (name,), None, new_children[name])
+    for name in sorted(set(prev_children) & set(new_children)):
+        if prev_children[name] != new_children[name]:
+            for line in iter_schemas_delta(prev_children[name], new_children[name],
+                                           path + (name,)):
+                yield line
+
+
+def _make_delta_line(path, prev_value, new_value):
+    """Build a delta line in compare module diff model."""
+    return {'hierarchy': '.'.join(path), 'path': list(path),
+            'prev_schema': prev_value, 'new_schema': new_value}
+
+
+def get_schema_node(mongo_schema, path):
+    """ Get the schema of a database, collection or field given by its path.
+
+    :param mongo_schema: dict
+    :param path: list - names of database, collection and fields
+    :return node_schema: dict
+    """
+    node = mongo_schema
+    for depth, name in enumerate(path):
+        node = _children(node, depth)[name]
+    return node
+
+
+def _children(node, depth):
+    """Children of a node at given depth (databases, collections or fields)."""
+    return node if depth < 2 else node['object']
+
+
+def apply_schema_delta(mongo_schema, delta):
+    """ Apply a delta (from iter_schemas_delta) to mongo_schema, in place. No return value.
+
+    :param mongo_schema: dict
+    :param delta: iterable of dicts
+    """
+    for line in delta:
+        path = line['path']
+        parent_children = _children(get_schema_node(mongo_schema, path[:-1]), len(path) - 1)
+        name = path[-1]
+        if line['prev_schema'] is None:
+            parent_children[name] = deepcopy(line['new_schema'])
+        elif line['new_schema'] is None:
+            del parent_children[name]
+        else:
+            node = parent_children[name]
+            for key in line['prev_schema']:
+                if key not in line['new_schema']:
+                    del node[key]
+            node.update(deepcopy(line['new_schema']))
+
+
+class SchemaHistory(object):
+    """
+    Store successive mongo schemas in a directory, as a base snapshot and successive deltas,
+    with a full snapshot (checkpoint) every checkpoint_interval snapshots.
+
+    Public methods:
+    snapshot_names: ordered list of stored snapshot names
+    add_snapshot: store a new snapshot
+    get_snapshot: reconstruct a snapshot
+    diff: compare two snapshots with compare_schemas_bases
+    field_history: list events (appeared, removed, type changed) of a field
+    """
+
+    def __init__(self, directory, checkpoint_interval=CHECKPOINT_INTERVAL):
+        """
+        :param directory: str - history directory, created if it does not exist
+        :param checkpoint_interval: int, default CHECKPOINT_INTERVAL - number of snapshots
+                                    between two checkpoints
+        """
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval should be positive, not {}'.format(
+                checkpoint_interval))
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        for dirname in [DELTAS_DIRNAME, CHECKPOINTS_DIRNAME]:
+            if not os.path.isdir(os.path.join(directory, dirname)):
+                os.makedirs(os.path.join(directory, dirname))
+        history_filename = os.path.join(directory, HISTORY_FILENAME)
+        if os.path.isfile(history_filename):
+            self._names = self._load(HISTORY_FILENAME)['snapshots']
+        else:
+            self._names = []
+
+    @property
+    def snapshot_names(self):
+        """Ordered list of stored snapshot names."""
+        return list(self._names)
+
+    def add_snapshot(self, name, mongo_schema):
+        """ Store mongo_schema as the new latest snapshot.
+
+        :param name: str - unique name of the snapshot (a date for example)
+        :param mongo_schema: dict
+        :return delta: list - difference with the previous snapshot
+        """
+        if name in self._names:
+            raise ValueError('Snapshot {} already exists in history'.format(name))
+
+        if not self._names:
+            delta = []
+            self._dump(mongo_schema, BASE_FILENAME)
+        else:
+            index = len(self._names)
+            delta = list(iter_schemas_delta(self._load_latest(), mongo_schema))
+            self._dump(delta, self._delta_filename(index))
+            if index % self.checkpoint_interval == 0:
+                self._dump(mongo_schema, self._checkpoint_filename(index))
+        self._dump_latest(len(self._names), mongo_schema)
+        self._dump({'snapshots': self._names + [name]}, HISTORY_FILENAME)
+        self._names.append(name)
+        logger.info('Snapshot %s added to history with %s differences', name, len(delta))
+        return delta
+
+    def get_snapshot(self, name):
+        """ Reconstruct a snapshot, from the nearest previous checkpoint and following deltas.
+
+        :param name: str
+        :return mongo_schema: dict
+        """
+        return self._get_snapshot(self._index(name))
+
+    def _get_snapshot(self, index):
+        """Reconstruct the snapshot at index."""
+        if index == len(self._names) - 1:
+            return self._load_latest()
+        return self._rebuild_snapshot(index)
+
+    def _rebuild_snapshot(self, index):
+        """Reconstruct the snapshot at index from the nearest previous checkpoint."""
+        checkpoint_index, mongo_schema = self._load_checkpoint(index)
+        for delta in self._iter_deltas(checkpoint_index + 1, index + 1):
+            apply_schema_delta(mongo_schema, delta)
+        return mongo_schema
+
+    def _load_latest(self):
+        """ Load the last snapshot listed in 'history.json' from 'latest.json'.
+
+        'latest.json' is rebuilt from checkpoints and deltas if it holds another snapshot
+        (add_snapshot interrupted before 'history.json' was written, or older history format).
+
+        :return mongo_schema: dict
+        """
+        index = len(self._names) - 1
+        latest = None
+        if os.path.isfile(os.path.join(self.directory, LATEST_FILENAME)):
+            latest = self._load(LATEST_FILENAME)
+        if isinstance(latest, dict) and set(latest) == {LATEST_INDEX_KEY, LATEST_SCHEMA_KEY} \
+                and latest[LATEST_INDEX_KEY] == index:
+            return latest[LATEST_SCHEMA_KEY]
+        logger.warning('%s does not hold snapshot %s of history, rebuild it',
+                       LATEST_FILENAME, self._names[index])
+        mongo_schema = self._rebuild_snapshot(index)
+        self._dump_latest(index, mongo_schema)
+        return mongo_schema
+
+    def _dump_latest(self, index, mongo_schema):
+        self._dump({LATEST_INDEX_KEY: index, LATEST_SCHEMA_KEY: mongo_schema}, LATEST_FILENAME)
+
+    def _load_checkpoint(self, index):
+        """ Load the nearest checkpoint before snapshot at index (included), or base snapshot.
+
+        Checkpoints missing (as in histories written with another checkpoint_interval) are
+        looked for at previous indexes.
+
+        :param index: int
+        :return checkpoint_index, mongo_schema: int, dict
+        """
+        checkpoint_index = index - index % self.checkpoint_interval
+        while checkpoint_index > 0:
+            filename = self._checkpoint_filename(checkpoint_index)
+            if os.path.isfile(os.path.join(self.directory, filename)):
+                return checkpoint_index, self._load(filename)
+            checkpoint_index -= self.checkpoint_interval
+        return 0, self._load(BASE_FILENAME)
+
+    def diff(self, prev_name, new_name, detailed_diff=False):
+        """ Compare two snapshots with compare_schemas_bases.
+
+        The newest snapshot is reconstructed from the oldest one with intermediate deltas,
+        unless a checkpoint between them is nearer.
+
+        :param prev_name: str
+        :param new_name: str
+        :param detailed_diff: bool - see compare_schemas_bases
+        :return diff: list of dicts
+        """
+        prev_index, new_index = self._index(prev_name), self._index(new_name)
+        first_index, last_index = sorted([prev_index, new_index])
+        first_schema = self._get_snapshot(first_index)
+        checkpoint_index = last_index - last_index % self.checkpoint_interval
+        if checkpoint_index > first_index or last_index == len(self._names) - 1:
+            last_schema = self._get_snapshot(last_index)
+        else:
+            last_schema = deepcopy(first_schema)
+            for delta in self._iter_deltas(first_index + 1, last_index + 1):
+                apply_schema_delta(last_schema, delta)
+
+        if prev_index <= new_index:
+            return compare_schemas_bases(first_schema, last_schema, detailed_diff=detailed_diff)
+        return compare_schemas_bases(last_schema, first_schema, detailed_diff=detailed_diff)
+
+    def field_history(self, path):
+        """ List events of a database, collection or field, only reading deltas.
+
+        Events are 'added' (including with a parent node), 'removed', and 'type_changed'
+        (when 'type' or 'array_type' changed).
+
+        :param path: list - names of database, collection and fields
+        :return events: list of dicts {'snapshot': name, 'event': str,
+                                       'prev_schema': ..., 'new_schema': ...}
+        """
+        path = list(path)
+        events = []
+        if not self._names:
+            return events
+        try:
+            get_schema_node(self._load(BASE_FILENAME), path)
+        except KeyError:
+            pass
+        else:
+            events.append({'snapshot': self._names[0], 'event': 'added',
+                           'prev_schema': None, 'new_schema': None})
+
+        for index, delta in enumerate(self._iter_deltas(1, len(self._names)), 1):
+            for line in delta:
+                event = self._line_event(line, path)
+                if event:
+                    event['snapshot'] = self._names[index]
+                    events.append(event)
+        return events
+
+    @staticmethod
+    def _line_event(line, path):
+        """Describe the event of a delta line relatively to path, or None if unrelated."""
+        line_path = line['path']
+        if line_path != path[:len(line_path)]:
+            return None
+        sub_path = path[len(line_path):]
+        if line['prev_schema'] is None or line['new_schema'] is None:
+            node = line['new_schema'] if line['prev_schema'] is None else line['prev_schema']
+            try:
+                for depth, name in enumerate(sub_path, len(line_path)):
+                    node = _children(node, depth)[name]
+            except KeyError:
+                return None
+            return {'event': 'added' if line['prev_schema'] is None else 'removed',
+                    'prev_schema': None, 'new_schema': None}
+        if not sub_path and {'type', 'array_type'} & (set(line['prev_schema']) |
+                                                      set(line['new_schema'])):
+            return {'event': 'type_changed',
+                    'prev_schema': {k: v for k, v in line['prev_schema'].items()
+                                    if k in ['type', 'array_type']},
+                    'new_schema': {k: v for k, v in line['new_schema'].items()
+                                   if k in ['type', 'array_type']}}
+        return None
+
+    def _index(self, name):
+        """Index of snapshot name, raise ValueError if not in history."""
+        try:
+            return self._names.index(name)
+        except ValueError:
+            raise ValueError('Snapshot {} does not exist in history'.format(name))
+
+    def _iter_deltas(self, start, stop):
+        """Yield deltas of snapshots from index start (included) to stop (excluded)."""
+        for index in range(start, stop):
+            yield self._load(self._delta_filename(index))
+
+    @staticmethod
+    def _delta_filename(index):
+        return os.path.join(DELTAS_DIRNAME, '{:06d}.json'.format(index))
+
+    @staticmethod
+    def _checkpoint_filename(index):
+        return os.path.join(CHECKPOINTS_DIRNAME, '{:06d}.json'.format(index))
+
+    def _load(self, filename):
+        with open(os.path.join(self.directory, filename), 'r') as f:
+            return json.load(f)
+
+    def _dump(self, data, filename):
+        """Write data atomically: to a temporary file in the same directory, then renamed."""
+        path = os.path.join(self.directory, filename)
+        tmp_path = path + TMP_SUFFIX
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            replace_file(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,185 @@
+# coding: utf8
+"""
+This module intends to serialize json documents (schemas, mappings, ...) with the fastest json
+library installed, among python-rapidjson, orjson and ujson, falling back to standard json module.
+
+Whatever the backend, documents are written as standard json module writes them:
+- BSON types (ObjectId, datetime, ...) are written as MongoDB extended json, with bson.json_util,
+- non ascii characters and '/' are written as is, NaN and Infinity as javascript constants,
+- documents are written indented (indent=4) or compact (without indentation nor spaces),
+  for machine to machine files.
+python-rapidjson writes the same text as standard json module, indented or compact.
+ujson only writes compact documents, which only differ in the formatting of some floats
+(1e-7 for 1e-07): its indented documents are written by standard json module.
+orjson writes NaN and Infinity as null (and only supports indent=2), so it is only used to read
+json.
+
+The backend is chosen at first use. It can be forced with set_json_backend, or with
+PYMONGO_SCHEMA_JSON_BACKEND environment variable (one of JSON_BACKENDS names).
+"""
+import json
+import logging
+import os
+
+from bson import json_util
+from future.moves.collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+class StdlibJsonBackend(object):
+    """Standard library json module, always available."""
+    name = 'json'
+
+    @staticmethod
+    def dumps(data, indent=None):
+        separators = None if indent else COMPACT_SEPARATORS
+        return json.dumps(data, indent=indent, separators=separators, ensure_ascii=False,
+                          default=json_util.default)
+
+    @staticmethod
+    def loads(text):
+        return json.loads(text)
+
+
+class RapidjsonBackend(object):
+    """python-rapidjson library - bytes and datetimes are passed to json_util.default."""
+    name = 'rapidjson'
+
+    @staticmethod
+    def dumps(data, indent=None):
+        import rapidjson
+        try:
+            return rapidjson.dumps(data, indent=indent, ensure_ascii=False,
+                                   default=json_util.default, bytes_mode=rapidjson.BM_NONE)
+        except TypeError:  # keys which are not str, converted by standard json module
+            return StdlibJsonBackend.dumps(data, indent=indent)
+
+    @staticmethod
+    def loads(text):
+        import rapidjson
+        return rapidjson.loads(text)
+
+
+class OrjsonBackend(object):
+    """orjson library - only reads json, as it writes NaN and Infinity as null."""
+    name = 'orjson'
+
+    @staticmethod
+    def dumps(data, indent=None):
+        return StdlibJsonBackend.dumps(data, indent=indent)
+
+    @staticmethod
+    def loads(text):
+        import orjson
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:  # NaN and Infinity constants
+            return StdlibJsonBackend.loads(text)
+
+
+class UjsonBackend(object):
+    """ujson library (version 5 or above, for default argument) - only writes compact json."""
+    name = 'ujson'
+
+    @staticmethod
+    def dumps(data, indent=None):
+        if indent:  # floats are formatted differently
+            return StdlibJsonBackend.dumps(data, indent=indent)
+        import ujson
+        return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False,
+                           default=json_util.default)
+
+    @staticmethod
+    def loads(text):
+        import ujson
+        return ujson.loads(text)
+
+
+# Backends by decreasing order of preference
+JSON_BACKENDS = OrderedDict((backend.name, backend) for backend in [
+    RapidjsonBackend, OrjsonBackend, UjsonBackend, StdlibJsonBackend])
+
+_json_backend = None
+
+
+def is_json_backend_available(name):
+    """ Check if the library of a backend is installed.
+
+    :param name: str - one of JSON_BACKENDS names
+    :return is_available: bool
+    """
+    if name == StdlibJsonBackend.name:
+        return True
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def set_json_backend(name=None):
+    """ Choose the json backend, first available one in JSON_BACKENDS if name is None.
+
+    :param name: str, default None - one of JSON_BACKENDS names
+    :return backend: json backend class
+    """
+    global _json_backend
+    if name is None:
+        name = next(backend_name for backend_name in JSON_BACKENDS
+                    if is_json_backend_available(backend_name))
+    elif name not in JSON_BACKENDS:
+        raise ValueError("json backend should be one of {}, not {}".format(
+            list(JSON_BACKENDS), name))
+    elif not is_json_backend_available(name):
+        raise ValueError("json backend {} is not installed".format(name))
+    logger.debug('Use %s json backend', name)
+    _json_backend = JSON_BACKENDS[name]
+    return _json_backend
+
+
+def get_json_backend():
+    """Get the json backend, chosen at first call (see set_json_backend)."""
+    if _json_backend is None:
+        set_json_backend(os.environ.get('PYMONGO_SCHEMA_JSON_BACKEND') or None)
+    return _json_backend
+
+
+def dumps(data, indent=None):
+    """ Serialize data to a json str.
+
+    :param data: json like structure, possibly with BSON types
+    :param indent: int, default None (compact)
+    :return text: str
+    """
+    return get_json_backend().dumps(data, indent=indent)
+
+
+def dump(data, file_descr, indent=None):
+    """ Serialize data as json into file_descr.
+
+    :param data: json like structure, possibly with BSON types
+    :param file_descr: file like object, opened in text mode
+    :param indent: int, default None (compact)
+    """
+    file_descr.write(dumps(data, indent=indent))
+
+
+def loads(text):
+    """ Deserialize a json str or bytes.
+
+    :param text: str or bytes
+    :return data: json like structure
+    """
+    return get_json_backend().loads(text)
+
+
+def load(file_descr):
+    """ Deserialize json from file_descr.
+
+    :param file_descr: file like object
+    :return data: json like structure
+    """
+    return loads(file_descr.read())
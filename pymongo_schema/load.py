@@ -0,0 +1,327 @@
+# coding: utf8
+"""
+This module intends to load MongoDB documents into PostgreSQL, following a mapping (from tosql).
+
+Documents are flattened into rows of the collection table and of its linked tables
+('_ARRAY' and '_ARRAY_OF_SCALARS' fields), and written as a psql script of COPY blocks:
+
+    COPY "db"."table" ("col1", "col2") FROM stdin;
+    value1<TAB>value2
+    \\.
+
+Documents are read and written by batches, so that memory usage is bounded by batch size.
+Collections are loaded in parallel, each batch being written as a whole in the output.
+
+Primary keys of linked tables ('_id_postgres') are generated while loading,
+so that linked tables of linked tables can reference them.
+Sequences are updated at the end of each collection. This is meant for initial loads,
+in empty tables (see tosql.mapping_to_ddl to create them).
+"""
+import binascii
+import codecs
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+from itertools import count
+from multiprocessing.pool import ThreadPool
+
+from bson import Binary, Decimal128, ObjectId, json_util
+
+from pymongo_schema.tosql import ARRAY_MAPPING_TYPES, get_foreign_keys, quote_sql_identifier, \
+    quote_sql_literal
+
+logger = logging.getLogger(__name__)
+
+# Representation of NULL in COPY text format
+COPY_NULL = '\\N'
+
+# Characters to escape in COPY text format
+COPY_ESCAPES = [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def compile_db_mapping(db_mapping):
+    """ Precompute, for each table of a database mapping, how to make rows from documents.
+
+    :param db_mapping: dict
+    :return compiled_mapping: dict {table_name: {
+        'pk': primary key column, generated if '_id_postgres',
+        'fk': foreign key column or None,
+        'columns': list of column names, in rows order,
+        'fields': list of (field path tuple, column name) for scalar fields,
+        'arrays': list of (field path tuple, linked table name, valueField or None)}}
+    """
+    foreign_keys = get_foreign_keys(db_mapping)
+    compiled_mapping = dict()
+    for table, table_mapping in db_mapping.items():
+        fk = foreign_keys[table][1] if table in foreign_keys else None
+        fields = []
+        arrays = []
+        for field, field_mapping in sorted(table_mapping.items()):
+            if field in ['pk', 'comment', fk]:
+                continue
+            if field_mapping.get('type') in ARRAY_MAPPING_TYPES:
+                arrays.append((tuple(field.split('.')), field_mapping['dest'],
+                               field_mapping.get('valueField')))
+            else:
+                fields.append((tuple(field.split('.')), field_mapping.get('dest', field)))
+
+        pk = table_mapping['pk']
+        generated_columns = [pk] if pk != '_id' else []
+        if fk:
+            generated_columns.append(fk)
+        compiled_mapping[table] = {
+            'pk': pk,
+            'fk': fk,
+            'columns': generated_columns + [column for _, column in fields],
+            'fields': fields,
+            'arrays': arrays,
+        }
+    return compiled_mapping
+
+
+def get_field_value(document, field_path):
+    """ Get the value of a nested field in a document, None if it is missing.
+
+    :param document: dict
+    :param field_path: tuple - field name, and names of parent objects
+    :return value:
+    """
+    value = document
+    for name in field_path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    return value
+
+
+def to_copy_value(value):
+    """ Format a value in PostgreSQL COPY text format.
+
+    Binary values are written in bytea hex format ('\\x' followed by hexadecimal digits).
+
+    :param value:
+    :return copy_value: str
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime.datetime):
+        copy_value = value.isoformat()
+    elif isinstance(value, Binary) or (bytes is not str and isinstance(value, bytes)):
+        copy_value = u'\\x' + binascii.hexlify(value).decode('ascii')
+    elif isinstance(value, ObjectId):
+        copy_value = str(value)
+    elif isinstance(value, Decimal128):
+        copy_value = u'{}'.format(value.to_decimal())
+    elif isinstance(value, (dict, list)):
+        copy_value = json.dumps(value, default=json_util.default, ensure_ascii=False)
+    else:
+        copy_value = u'{}'.format(value)
+    for char, escaped_char in COPY_ESCAPES:
+        copy_value = copy_value.replace(char, escaped_char)
+    return copy_value
+
+
+def add_document_rows(document, table, compiled_mapping, rows, id_counters, fk_value=None):
+    """ Flatten a document (or an object in an array) into rows of table and linked tables.
+
+    :param document: dict
+    :param table: str
+    :param compiled_mapping: dict - from compile_db_mapping
+    :param rows: dict {table_name: list of rows} - rows are added to it
+    :param id_counters: dict {table_name: itertools.count} - generators of '_id_postgres'
+    :param fk_value: primary key value of parent row, for linked tables
+    """
+    table_mapping = compiled_mapping[table]
+    if table_mapping['pk'] == '_id':
+        pk_value = document.get('_id')
+        row = []
+    else:
+        pk_value = next(id_counters.setdefault(table, count(1)))
+        row = [pk_value]
+    if table_mapping['fk']:
+        row.append(fk_value)
+    row += [get_field_value(document, field_path) for field_path, _ in table_mapping['fields']]
+    rows.setdefault(table, []).append(row)
+
+    for field_path, linked_table, value_field in table_mapping['arrays']:
+        if linked_table not in compiled_mapping:
+            continue
+        values = get_field_value(document, field_path)
+        if not isinstance(values, list):
+            continue
+        for value in values:
+            if value_field is None:
+                if isinstance(value, dict):
+                    add_document_rows(value, linked_table, compiled_mapping, rows, id_counters,
+                                      fk_value=pk_value)
+            else:
+                add_document_rows({value_field: value}, linked_table, compiled_mapping, rows,
+                                  id_counters, fk_value=pk_value)
+
+
+def write_copy_blocks(db, rows, compiled_mapping, file_descr, lock=None):
+    """ Write rows as COPY blocks, one per table.
+
+    :param db: str
+    :param rows: dict {table_name: list of rows}
+    :param compiled_mapping: dict - from compile_db_mapping
+    :param file_descr: file like object
+    :param lock: threading.Lock, default None - held while writing, if given
+    """
+    blocks = []
+    for table in sorted(rows):
+        columns = compiled_mapping[table]['columns']
+        blocks.append(u'COPY {}.{} ({}) FROM stdin;\n'.format(
+            quote_sql_identifier(db), quote_sql_identifier(table),
+            ', '.join(quote_sql_identifier(column) for column in columns)))
+        blocks += [u'\t'.join(to_copy_value(value) for value in row) + u'\n'
+                   for row in rows[table]]
+        blocks.append(u'\\.\n')
+    write_text(u''.join(blocks), file_descr, lock)
+
+
+def write_text(text, file_descr, lock=None):
+    """ Write text into file_descr, holding lock if given.
+
+    :param text: str
+    :param file_descr: file like object
+    :param lock: threading.Lock, default None
+    """
+    if lock is None:
+        file_descr.write(text)
+    else:
+        with lock:
+            file_descr.write(text)
+
+
+def load_documents(documents, db, collection, db_mapping, file_descr,
+                   batch_size=DEFAULT_BATCH_SIZE, lock=None):
+    """ Flatten documents of a collection, and write them by batches as COPY blocks.
+
+    :param documents: iterable of dicts
+    :param db: str
+    :param collection: str - name of collection table in db_mapping
+    :param db_mapping: dict
+    :param file_descr: file like object
+    :param batch_size: int - number of documents written at once
+    :param lock: threading.Lock, default None - held while writing a batch, if given
+    :return n_documents: int
+    """
+    compiled_mapping = compile_db_mapping(db_mapping)
+    id_counters = dict()
+    rows = dict()
+    n_documents = 0
+    for document in documents:
+        add_document_rows(document, collection, compiled_mapping, rows, id_counters)
+        n_documents += 1
+        if n_documents % batch_size == 0:
+            write_copy_blocks(db, rows, compiled_mapping, file_descr, lock)
+            rows = dict()
+            logger.info('   loaded %s documents from %s.%s', n_documents, db, collection)
+    if rows:
+        write_copy_blocks(db, rows, compiled_mapping, file_descr, lock)
+
+    sequences_statements = []
+    for table, id_counter in sorted(id_counters.items()):
+        last_id = next(id_counter) - 1
+        sequences_statements.append(u'SELECT setval(pg_get_serial_sequence({}, {}), {});\n'.format(
+            quote_sql_literal('{}.{}'.format(quote_sql_identifier(db),
+                                             quote_sql_identifier(table))),
+            quote_sql_literal(compiled_mapping[table]['pk']), last_id))
+    if sequences_statements:
+        write_text(u''.join(sequences_statements), file_descr, lock)
+
+    logger.info('   loaded %s documents from %s.%s', n_documents, db, collection)
+    return n_documents
+
+
+def load_collection(pymongo_collection, db_mapping, file_descr, batch_size=DEFAULT_BATCH_SIZE,
+                    lock=None):
+    """ Stream documents of a MongoDB collection, and write them as COPY blocks.
+
+    Only fields present in the mapping are fetched.
+
+    :param pymongo_collection: pymongo.collection.Collection
+    :param db_mapping: dict
+    :param file_descr: file like object
+    :param batch_size: int - number of documents fetched and written at once
+    :param lock: threading.Lock, default None - held while writing a batch, if given
+    :return n_documents: int
+    """
+    collection = pymongo_collection.name
+    projection = {field.split('.')[0]: 1 for field in db_mapping[collection]
+                  if field not in ['pk', 'comment']}
+    documents = pymongo_collection.find({}, projection, batch_size=batch_size)
+    return load_documents(documents, pymongo_collection.database.name, collection, db_mapping,
+                          file_descr, batch_size=batch_size, lock=lock)
+
+
+def get_collections_to_load(mapping, database_names=None, collection_names=None):
+    """ List (database, collection) to load: tables with '_id' primary key in the mapping.
+
+    :param mapping: dict
+    :param database_names: list of str, default None (all databases in mapping)
+    :param collection_names: list of str, default None (all collections in mapping)
+    :return namespaces: list of tuples (database, collection)
+    """
+    namespaces = []
+    for db in sorted(mapping):
+        if database_names is not None and db not in database_names:
+            continue
+        for table, table_mapping in sorted(mapping[db].items()):
+            if table_mapping['pk'] != '_id':
+                continue
+            if collection_names is not None and table not in collection_names:
+                continue
+            namespaces.append((db, table))
+    return namespaces
+
+
+def load_pymongo_client_data(pymongo_client, mapping, output=None, database_names=None,
+                             collection_names=None, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    """ Load collections of a MongoDB instance as psql COPY scripts, in parallel by collection.
+
+    :param pymongo_client: pymongo.mongo_client.MongoClient
+    :param mapping: dict
+    :param output: str, default None
+        Directory where to write one '<db>.<collection>.sql' file per collection.
+        Standard output if None.
+    :param database_names: list of str, default None
+    :param collection_names: list of str, default None
+    :param batch_size: int
+    :param workers: int - number of collections loaded in parallel
+    :return n_documents: int - total number of loaded documents
+    """
+    namespaces = get_collections_to_load(mapping, database_names, collection_names)
+    lock = threading.Lock()
+
+    def load_namespace(namespace):
+        """Load one collection, into its own file or into shared standard output."""
+        db, collection = namespace
+        logger.info('Load collection %s.%s', db, collection)
+        pymongo_collection = pymongo_client[db][collection]
+        if output is None:
+            return load_collection(pymongo_collection, mapping[db], sys.stdout,
+                                   batch_size=batch_size, lock=lock)
+        filename = os.path.join(output, '{}.{}.sql'.format(db, collection))
+        with codecs.open(filename, mode='w', encoding='utf-8') as file_descr:
+            return load_collection(pymongo_collection, mapping[db], file_descr,
+                                   batch_size=batch_size)
+
+    if output is not None and not os.path.isdir(output):
+        os.makedirs(output)
+
+    pool = ThreadPool(max(1, workers))
+    try:
+        return sum(pool.map(load_namespace, namespaces))
+    finally:
+        pool.close()
+        pool.join()
+
@@ -167,6 +167,62 @@ def psql_type(mongo_type_str):
     return psql_type_str
 
 
+# Ranges of PostgreSQL integer types, from narrowest to widest
+PSQL_INTEGER_TYPES_RANGES = [
+    ('SMALLINT', -2 ** 15, 2 ** 15 - 1),
+    ('INT', -2 ** 31, 2 ** 31 - 1),
+    ('BIGINT', -2 ** 63, 2 ** 63 - 1),
+]
+
+# Maximal precision of NUMERIC columns for floats, as doubles hold 15 significant digits
+MAX_FLOAT_NUMERIC_PRECISION = 15
+
+# Maximal length of VARCHAR columns in PostgreSQL
+MAX_VARCHAR_LENGTH = 10485760
+
+
+def psql_type_from_stats(mongo_type_str, field_stats=None):
+    """ Map a MongoDB type string to the narrowest PSQL type string holding values in field stats
+
+    - 'integer' and 'biginteger' are mapped to SMALLINT, INT or BIGINT from 'min' and 'max'
+    - 'float' and 'number' are mapped to NUMERIC(precision, scale) from 'min', 'max' and
+    'max_scale', if precision is at most MAX_FLOAT_NUMERIC_PRECISION (DOUBLE PRECISION otherwise)
+    - 'string' is mapped to VARCHAR(n) from 'max_length'
+
+    Other types, or fields without needed stats, are mapped by psql_type.
+
+    :param mongo_type_str: str
+    :param field_stats: dict, default None - 'stats' of a field schema (see extract module)
+    :return psql_type_str: str
+    """
+    field_stats = field_stats or {}
+    if mongo_type_str in ['integer', 'biginteger'] and 'min' in field_stats:
+        for psql_type_str, min_value, max_value in PSQL_INTEGER_TYPES_RANGES:
+            if min_value <= field_stats['min'] and field_stats['max'] <= max_value:
+                return psql_type_str
+        return 'NUMERIC({})'.format(_count_integer_digits(field_stats))
+
+    if mongo_type_str in ['float', 'number'] and 'min' in field_stats:
+        scale = field_stats.get('max_scale', 0)
+        precision = _count_integer_digits(field_stats) + scale
+        if precision > MAX_FLOAT_NUMERIC_PRECISION:
+            return 'DOUBLE PRECISION'
+        return 'NUMERIC({}, {})'.format(precision, scale)
+
+    if mongo_type_str == 'string' and 'max_length' in field_stats:
+        if field_stats['max_length'] > MAX_VARCHAR_LENGTH:
+            return 'TEXT'
+        return 'VARCHAR({})'.format(max(field_stats['max_length'], 1))
+
+    return psql_type(mongo_type_str)
+
+
+def _count_integer_digits(field_stats):
+    """Number of digits of the integer part of values between 'min' and 'max'."""
+    max_abs_value = max(abs(field_stats['min']), abs(field_stats['max']))
+    return len(str(int(max_abs_value)))
+
+
 if __name__ == '__main__':
     logging.basicConfig()
     generate_type_tree_figure("type_tree.png")
@@ -0,0 +1,234 @@
+# coding: utf8
+"""
+This module intends to give access to a schema without loading it entirely in memory.
+
+An indexed schema file ('schemaidx' format) is made of:
+- INDEXED_MAGIC bytes,
+- collection schemas, each one serialized with MessagePack,
+- the index {db: {collection: [offset, length]}} of collection schemas,
+  serialized with MessagePack,
+- the length of the index, as a 8 bytes little endian unsigned integer.
+The index being written last, the file is written collection by collection.
+
+SchemaFile is a read-only mapping {db: {collection: collection_schema}} over such a file,
+mapped in memory (mmap). Only the index is read when it is opened: collection schemas are
+decoded when they are accessed, so that operations touching a few collections
+(filter_mongo_schema_namespaces, compare_schemas_bases, ...) cost proportionally
+to these collections. Recently accessed collection schemas are kept in a bounded cache.
+
+load_schema_file loads json, binary (see binary_schema) or indexed schema files,
+detected from their first bytes, possibly compressed (see compression module): compressed files
+are decoded while they are decompressed, compressed indexed schema files are decompressed
+to a temporary file, mapped in memory.
+"""
+import mmap
+import shutil
+import struct
+import tempfile
+
+from bson import json_util
+from future.moves.collections import OrderedDict
+
+from pymongo_schema.binary_schema import load_schema
+from pymongo_schema.compression import get_compression, open_compressed
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
+
+INDEXED_MAGIC = b'PMSINDEX'
+
+INDEX_LENGTH_FORMAT = '<Q'
+
+# Number of decoded collection schemas kept in memory by a SchemaFile
+DEFAULT_CACHE_SIZE = 64
+
+
+def _packb(data):
+    import msgpack
+    return msgpack.packb(data, default=json_util.default, use_bin_type=True)
+
+
+def _unpackb(packed):
+    import msgpack
+    return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+
+
+def dump_indexed_schema(mongo_schema, file_descr):
+    """ Write a mongo schema as an indexed schema file, collection by collection.
+
+    :param mongo_schema: dict
+    :param file_descr: file like object, opened in binary mode
+    """
+    file_descr.write(INDEXED_MAGIC)
+    offset = len(INDEXED_MAGIC)
+    index = dict()
+    for db, database_schema in mongo_schema.items():
+        index[db] = dict()
+        for collection, collection_schema in database_schema.items():
+            packed = _packb(collection_schema)
+            file_descr.write(packed)
+            index[db][collection] = [offset, len(packed)]
+            offset += len(packed)
+    packed_index = _packb(index)
+    file_descr.write(packed_index)
+    file_descr.write(struct.pack(INDEX_LENGTH_FORMAT, len(packed_index)))
+
+
+def is_indexed_schema(header):
+    """ Check if the first bytes of a file are those of an indexed schema file.
+
+    :param header: bytes - first bytes of a file (at least len(INDEXED_MAGIC))
+    :return is_indexed: bool
+    """
+    return header[:len(INDEXED_MAGIC)] == INDEXED_MAGIC
+
+
+class SchemaFile(Mapping):
+    """
+    Read-only mapping {db: {collection: collection_schema}} over an indexed schema file,
+    decoding collection schemas when they are accessed.
+
+    >>> schema_file = SchemaFile.open('mongo_schema.schemaidx')  # doctest: +SKIP
+    >>> schema_file['db']['coll']['count']  # doctest: +SKIP
+    25359
+    """
+
+    def __init__(self, buffer, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param buffer: bytes like object (mmap, bytes) - content of an indexed schema file
+        :param cache_size: int - number of decoded collection schemas kept in memory
+        """
+        if not is_indexed_schema(buffer[:len(INDEXED_MAGIC)]):
+            raise ValueError("Not an indexed schema, it should start with {!r}".format(
+                INDEXED_MAGIC))
+        self.buffer = buffer
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        index_length_size = struct.calcsize(INDEX_LENGTH_FORMAT)
+        index_end = len(buffer) - index_length_size
+        index_length = struct.unpack(INDEX_LENGTH_FORMAT, buffer[index_end:])[0]
+        self.index = _unpackb(buffer[index_end - index_length:index_end])
+
+    @classmethod
+    def open(cls, filename, cache_size=DEFAULT_CACHE_SIZE):
+        """ Map an indexed schema file in memory.
+
+        :param filename: str
+        :param cache_size: int - number of decoded collection schemas kept in memory
+        :return schema_file: SchemaFile
+        """
+        with open(filename, 'rb') as file_descr:
+            buffer = mmap.mmap(file_descr.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, cache_size=cache_size)
+
+    def close(self):
+        """Unmap the file, if it was mapped by SchemaFile.open."""
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __getitem__(self, db):
+        if db not in self.index:
+            raise KeyError(db)
+        return _LazyDatabaseSchema(self, db)
+
+    def __contains__(self, db):
+        return db in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_collection_schema(self, db, collection):
+        """ Decode a collection schema, or get it from cache.
+
+        :param db: str
+        :param collection: str
+        :return collection_schema: dict
+        """
+        key = (db, collection)
+        if key in self._cache:
+            self._cache[key] = self._cache.pop(key)  # most recently used is last
+            return self._cache[key]
+        offset, length = self.index[db][collection]
+        collection_schema = _unpackb(self.buffer[offset:offset + length])
+        self._cache[key] = collection_schema
+        if len(self._cache) > self.cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        return collection_schema
+
+    def to_dict(self):
+        """ Decode the whole schema.
+
+        :return mongo_schema: dict
+        """
+        return {db: {collection: _unpackb(self.buffer[offset:offset + length])
+                     for collection, (offset, length) in collections_index.items()}
+                for db, collections_index in self.index.items()}
+
+
+class _LazyDatabaseSchema(Mapping):
+    """Read-only mapping {collection: collection_schema} of a database in a SchemaFile."""
+
+    def __init__(self, schema_file, db):
+        self.schema_file = schema_file
+        self.db = db
+
+    def __getitem__(self, collection):
+        if collection not in self.schema_file.index[self.db]:
+            raise KeyError(collection)
+        return self.schema_file.get_collection_schema(self.db, collection)
+
+    def __contains__(self, collection):
+        return collection in self.schema_file.index[self.db]
+
+    def __iter__(self):
+        return iter(self.schema_file.index[self.db])
+
+    def __len__(self):
+        return len(self.schema_file.index[self.db])
+
+
+def load_schema_file(filename):
+    """ Load a schema (or mapping, ...) from a json, binary or indexed schema file.
+
+    Indexed schema files are not loaded but mapped in memory, as a SchemaFile.
+    Files compressed according to their extension (see compression module) are decoded
+    while they are decompressed. Compressed indexed schema files are decompressed to a
+    temporary file, mapped in memory and decoded lazily as well.
+
+    :param filename: str
+    :return data: json like structure, or SchemaFile
+    """
+    if get_compression(filename) is not None:
+        with open_compressed(filename, 'rb') as file_descr:
+            header = file_descr.read(len(INDEXED_MAGIC))
+            if is_indexed_schema(header):
+                return SchemaFile(_decompress_to_mmap(header, file_descr))
+        with open_compressed(filename, 'rb') as file_descr:
+            return load_schema(file_descr)
+
+    with open(filename, 'rb') as file_descr:
+        if is_indexed_schema(file_descr.read(len(INDEXED_MAGIC))):
+            return SchemaFile.open(filename)
+        file_descr.seek(0)
+        return load_schema(file_descr)
+
+
+def _decompress_to_mmap(header, file_descr):
+    """ Write a decompressed file to a temporary file, and map it in memory.
+
+    The temporary file is removed once unmapped.
+
+    :param header: bytes - first bytes, already read from file_descr
+    :param file_descr: file like object, decompressing a file
+    :return buffer: mmap.mmap
+    """
+    with tempfile.TemporaryFile() as tmp_file_descr:
+        tmp_file_descr.write(header)
+        shutil.copyfileobj(file_descr, tmp_file_descr)
+        tmp_file_descr.flush()
+        return mmap.mmap(tmp_file_descr.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,164 @@
+# coding: utf8
+"""
+This module intends to index the fields of an object schema (collection 'object', see extract
+module) by their path, walking each object of the nested 'object' tree at most once.
+
+A field path is the tuple of names from a top-level field to the field:
+('address', 'building') is the path of field 'building' of object field 'address'.
+
+SchemaIndex gives access to:
+- field schemas by path (it is a read-only mapping {path: field_schema}),
+- parent, children and depth of fields,
+- names of fields, each one being built once from the name of its parent:
+  full_name with '.' separating object subfields and ':' separating subfields of arrays
+  of objects (as in table like outputs), dotted_name with '.' only (as in filters, diffs and
+  mappings).
+
+It is shared by export, filter, compare, tosql and catalog modules,
+instead of each one walking the tree and building names of fields.
+An object schema is expected not to be modified once indexed.
+"""
+from future.moves.collections import OrderedDict
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
+
+# Separators of subfields in full names
+OBJECT_SEPARATOR = '.'
+ARRAY_SEPARATOR = ':'
+
+
+class SchemaIndex(Mapping):
+    """
+    Read-only mapping {path: field_schema} of the fields of an object schema, at any depth.
+
+    Objects are indexed lazily: subfields of a field are only walked the first time they are
+    accessed, so that a filter touching a few paths does not walk untouched sub-objects.
+    Iterating (or len) walks all of them, depth first, each field being followed by its
+    subfields, fields of an object being in object schema order.
+
+    >>> schema_index = SchemaIndex({'a': {'type': 'OBJECT', 'object': {'b': {'type': 'string'}}}})
+    >>> list(schema_index)
+    [('a',), ('a', 'b')]
+    >>> schema_index.full_name(('a', 'b'))
+    'a.b'
+    """
+
+    def __init__(self, object_schema, prefix=''):
+        """
+        :param object_schema: dict - {field: field_schema}
+        :param prefix: str, default '' - prefix of full names of fields,
+                                         as full name of parent object followed by a separator
+        """
+        self.object_schema = object_schema
+        self._fields = dict()
+        self._children = dict()
+        self._prefixes = {(): prefix}  # prefix of full names of subfields, by parent path
+        self._full_names = dict()
+        self._dotted_names = dict()
+
+    def _index_object(self, parent_path):
+        """Index subfields of parent_path (an object field, or () for top-level fields)."""
+        if parent_path:
+            field_schema = self[parent_path]
+            object_schema = field_schema['object']
+            types = field_schema.get('types_count', [field_schema.get('type')])
+            separator = ARRAY_SEPARATOR if 'ARRAY' in types else OBJECT_SEPARATOR
+            self._prefixes[parent_path] = self.full_name(parent_path) + separator
+        else:
+            object_schema = self.object_schema
+        children = self._children[parent_path] = OrderedDict()
+        for field, field_schema in object_schema.items():
+            field_path = parent_path + (field,)
+            self._fields[field_path] = field_schema
+            children[field] = field_path
+
+    def __getitem__(self, path):
+        if path not in self._fields and path:
+            self.children(path[:-1])  # raises KeyError if a parent field does not exist
+        return self._fields[path]
+
+    def __contains__(self, path):
+        try:
+            self[path]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return self._iter_paths(())
+
+    def _iter_paths(self, parent_path):
+        """Generate paths of subfields of parent_path, depth first."""
+        for field_path in self.children(parent_path).values():
+            yield field_path
+            for path in self._iter_paths(field_path):
+                yield path
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def children(self, path=()):
+        """ Subfields of a field, or top-level fields if path is ().
+
+        :param path: tuple, default ()
+        :return children: OrderedDict {subfield name: subfield path} (empty for scalar fields)
+        """
+        if path not in self._children:
+            if path and 'object' not in self[path]:
+                return OrderedDict()
+            self._index_object(path)
+        return self._children[path]
+
+    @staticmethod
+    def parent(path):
+        """Path of the parent field, () for top-level fields."""
+        return path[:-1]
+
+    @staticmethod
+    def depth(path):
+        """Level of imbrication of a field, 0 for top-level fields."""
+        return len(path) - 1
+
+    def prefix(self, path):
+        """ Prefix of the full name of a field: full name of its parent followed by a separator.
+
+        :param path: tuple
+        :return prefix: str
+        """
+        if path[:-1] not in self._prefixes:
+            self.children(path[:-1])
+        return self._prefixes[path[:-1]]
+
+    def full_name(self, path):
+        """ Full name of a field, with '.' separating object subfields, ':' separating
+        subfields of arrays of objects.
+
+        :param path: tuple
+        :return full_name: str
+        """
+        if path not in self._full_names:
+            self._full_names[path] = self.prefix(path) + path[-1]
+        return self._full_names[path]
+
+    def dotted_name(self, path, root=()):
+        """ Name of a field with '.' separating all subfields, relative to root.
+
+        >>> schema_index = SchemaIndex({'a': {'type': 'ARRAY', 'object': {'b': {}}}})
+        >>> schema_index.dotted_name(('a', 'b')), schema_index.dotted_name(('a', 'b'), ('a',))
+        ('a.b', 'b')
+
+        :param path: tuple
+        :param root: tuple, default () - path of an ancestor of the field
+        :return dotted_name: str
+        """
+        key = (path, root)
+        if key not in self._dotted_names:
+            if len(path) == len(root) + 1:
+                self._dotted_names[key] = path[-1]
+            else:
+                self._dotted_names[key] = '{}.{}'.format(self.dotted_name(path[:-1], root),
+                                                         path[-1])
+        return self._dotted_names[key]
@@ -0,0 +1,234 @@
+# coding: utf8
+"""
+This module intends to provide fixed-size sketches, to summarize values of fields while
+extracting a schema, without keeping values in memory.
+
+- HyperLogLog estimates the number of distinct values, with a standard error of about
+  1.04 / sqrt(2 ** precision). Sketches with the same precision can be merged.
+- SpaceSaving keeps the most frequent values, with a bounded over-estimation of their count.
+  Its summaries can be merged, keeping the same error bounds. Long strings are kept truncated
+  (and counted by their prefix), so that the memory of a sketch is bounded.
+
+Sketches are serialized to json compatible dicts (to_dict, from_dict), so that they can be
+stored in schemas.
+
+Values are hashed from their string representation, with a hash stable across processes,
+so that sketches of partial extractions can be merged.
+"""
+import base64
+import hashlib
+import math
+import struct
+
+from past.builtins import basestring
+
+# Number of bits of hash used to select a register (2 ** 10 = 1024 registers of 1 byte)
+DEFAULT_PRECISION = 10
+
+HASH_BITS = 64
+
+# Number of counters kept by SpaceSaving sketches
+DEFAULT_TOP_SIZE = 10
+
+# Maximal length of strings kept by SpaceSaving sketches, longer ones are truncated
+MAX_VALUE_LENGTH = 100
+TRUNCATED_SUFFIX = '...'
+
+
+def hash_value(value):
+    """ Hash a value to a 64 bits integer, in a way stable across processes.
+
+    :param value: scalar value
+    :return hash: int
+    """
+    digest = hashlib.md5(u'{}'.format(value).encode('utf-8')).digest()
+    return struct.unpack('<Q', digest[:8])[0]
+
+
+class HyperLogLog(object):
+    """ HyperLogLog sketch, estimating the number of distinct values added to it.
+
+    >>> sketch = HyperLogLog()
+    >>> for value in ['a', 'b', 'a']:
+    ...     sketch.add(value)
+    >>> sketch.cardinality()
+    2
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        """
+        :param precision: int - number of bits of hash used to select a register
+        :param registers: bytearray, default None - registers of an existing sketch
+        """
+        self.precision = precision
+        self.n_registers = 1 << precision
+        if registers is None:
+            registers = bytearray(self.n_registers)
+        elif len(registers) != self.n_registers:
+            raise ValueError("HyperLogLog of precision {} has {} registers, got {}".format(
+                precision, self.n_registers, len(registers)))
+        self.registers = registers
+
+    def add(self, value):
+        """ Add a value to the sketch.
+
+        :param value: scalar value
+        """
+        self.add_hash(hash_value(value))
+
+    def add_hash(self, hashed_value):
+        """ Add a hashed value (64 bits integer) to the sketch.
+
+        :param hashed_value: int
+        """
+        remaining_bits = HASH_BITS - self.precision
+        index = hashed_value >> remaining_bits
+        remaining = hashed_value & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def to_dict(self):
+        """ Serialize the sketch to a json compatible dict.
+
+        :return sketch_dict: dict {'precision': int, 'registers': base64 str}
+        """
+        return {'precision': self.precision,
+                'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        """ Deserialize a sketch from to_dict output.
+
+        :param sketch_dict: dict
+        :return sketch: HyperLogLog
+        """
+        return cls(sketch_dict['precision'],
+                   bytearray(base64.b64decode(sketch_dict['registers'])))
+
+    def merge(self, other):
+        """ Merge another sketch into this one, as if its values had been added.
+
+        :param other: HyperLogLog - with same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog of precisions {} and {}".format(
+                self.precision, other.precision))
+        self.registers = bytearray(max(rank, other_rank) for rank, other_rank
+                                   in zip(self.registers, other.registers))
+
+    def cardinality(self):
+        """ Estimate the number of distinct values added to the sketch.
+
+        Linear counting is used for small cardinalities, where it is more accurate.
+
+        :return cardinality: int
+        """
+        n_registers = self.n_registers
+        alpha = 0.7213 / (1 + 1.079 / n_registers)
+        estimate = alpha * n_registers ** 2 / sum(2.0 ** -rank for rank in self.registers)
+        n_zeros = sum(1 for rank in self.registers if not rank)
+        if estimate <= 2.5 * n_registers and n_zeros:
+            estimate = n_registers * math.log(float(n_registers) / n_zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving(object):
+    """ SpaceSaving sketch, keeping the most frequent values with at most 'size' counters.
+
+    Each counter holds a value, its count and the maximal over-estimation of this count.
+    When all counters are used, a new value replaces the value with the smallest count,
+    taking its count (plus one) as over-estimation.
+    Strings longer than MAX_VALUE_LENGTH are counted by their prefix, followed by '...'.
+
+    >>> sketch = SpaceSaving(size=2)
+    >>> for value in ['a', 'b', 'a', 'c']:
+    ...     sketch.add(value)
+    >>> sketch.top()
+    [('a', 2), ('c', 2)]
+    """
+
+    def __init__(self, size=DEFAULT_TOP_SIZE, counters=None):
+        """
+        :param size: int - maximal number of counters
+        :param counters: list of [value, count, error], default None
+        """
+        self.size = size
+        self.counters = dict()
+        for value, count, error in counters or []:
+            self.counters[self._key(value)] = [value, count, error]
+
+    @staticmethod
+    def _key(value):
+        """Key of a value in counters, so that True and 1 are counted apart."""
+        return isinstance(value, bool), value
+
+    def add(self, value):
+        """ Add a value to the sketch.
+
+        :param value: hashable scalar value
+        """
+        if isinstance(value, basestring) and len(value) > MAX_VALUE_LENGTH:
+            value = value[:MAX_VALUE_LENGTH] + TRUNCATED_SUFFIX
+        key = self._key(value)
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[1] += 1
+        elif len(self.counters) < self.size:
+            self.counters[key] = [value, 1, 0]
+        else:
+            min_key = min(self.counters, key=lambda k: self.counters[k][1])
+            min_count = self.counters.pop(min_key)[1]
+            self.counters[key] = [value, min_count + 1, min_count]
+
+    def min_count(self):
+        """Count of values missing from the sketch is at most min_count (0 if not full)."""
+        if len(self.counters) < self.size:
+            return 0
+        return min(count for _, count, _ in self.counters.values())
+
+    def merge(self, other):
+        """ Merge another sketch into this one, as if its values had been added.
+
+        Values missing from a full sketch are counted with its min_count, as over-estimation.
+
+        :param other: SpaceSaving
+        """
+        self_min_count, other_min_count = self.min_count(), other.min_count()
+        merged_counters = dict()
+        for key in set(self.counters) | set(other.counters):
+            value = (self.counters.get(key) or other.counters.get(key))[0]
+            _, self_count, self_error = self.counters.get(key, [value, self_min_count,
+                                                                self_min_count])
+            _, other_count, other_error = other.counters.get(key, [value, other_min_count,
+                                                                   other_min_count])
+            merged_counters[key] = [value, self_count + other_count, self_error + other_error]
+        self.size = max(self.size, other.size)
+        kept_keys = sorted(merged_counters, key=lambda k: -merged_counters[k][1])[:self.size]
+        self.counters = {key: merged_counters[key] for key in kept_keys}
+
+    def top(self, n=None):
+        """ Most frequent values, with their (over-estimated) count.
+
+        :param n: int, default None (all values in sketch)
+        :return top_values: list of tuples (value, count), sorted by decreasing count
+        """
+        counters = sorted(self.counters.values(), key=lambda c: (-c[1], u'{}'.format(c[0])))
+        return [(value, count) for value, count, _ in counters[:n]]
+
+    def to_dict(self):
+        """ Serialize the sketch to a json compatible dict.
+
+        :return sketch_dict: dict {'size': int, 'counters': list of [value, count, error]}
+        """
+        counters = sorted(self.counters.values(), key=lambda c: (-c[1], u'{}'.format(c[0])))
+        return {'size': self.size, 'counters': [list(counter) for counter in counters]}
+
+    @classmethod
+    def from_dict(cls, sketch_dict):
+        """ Deserialize a sketch from to_dict output.
+
+        :param sketch_dict: dict
+        :return sketch: SpaceSaving
+        """
+        return cls(sketch_dict['size'], sketch_dict['counters'])
@@ -7,9 +7,11 @@ https://github.com/Hopwork/mongo-connector-postgresql
 """
 
 
+import hashlib
 import logging
 
-from pymongo_schema.mongo_sql_types import psql_type
+from pymongo_schema.mongo_sql_types import psql_type, psql_type_from_stats
+from pymongo_schema.schema_index import SchemaIndex
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ logger = logging.getLogger(__name__)
 # It may depend from mongo-connector-postgresql branch in use
 AUTO_GENERATED_PK_TYPE = 'SERIAL'
 
+# Maximum length of PostgreSQL identifiers, in bytes (longer ones are silently truncated)
+MAX_IDENTIFIER_LENGTH = 63
+
 
 def mongo_schema_to_mapping(mongo_schema):
     """ Create a mapping to SQL from a mongo schema
@@ -45,10 +50,11 @@ def mongo_schema_to_mapping(mongo_schema):
 def init_collection_mapping(collection, mapping, collection_schema):
     """ Initialize a mapping for a collection
     """
-    id_mongo_type = collection_schema['object']['_id']['type']
+    id_schema = collection_schema['object']['_id']
+    id_mongo_type = id_schema['type']
 
     try:
-        id_psql_type = psql_type(id_mongo_type)
+        id_psql_type = psql_type_from_stats(id_mongo_type, id_schema.get('stats'))
     except KeyError:
         logger.warning("WARNING : Mongo type '%s' is not mapped to an SQL type. As this field is "
                        "an '_id', the entire collection is skipped from the mapping.",
@@ -77,25 +83,42 @@ def add_object_to_mapping(object_schema, mapping, table_name, field_prefix=''):
         used to get full name of nested object,
         from table's parent object (either collection or ARRAY(OBJECT))
     """
-    for field, field_info in object_schema.items():
-        # Assemble mongo_field_name, the full field name from table's parent object,
+    _add_indexed_object_to_mapping(SchemaIndex(object_schema), (), (), mapping, table_name,
+                                   field_prefix=field_prefix)
+
+
+def _add_indexed_object_to_mapping(schema_index, object_path, table_path, mapping, table_name,
+                                   field_prefix=''):
+    """ Add subfields of object_path in schema_index to a mapping (see add_object_to_mapping)
+
+    :param schema_index: SchemaIndex
+    :param object_path: tuple - path of the object field, () for top-level fields
+    :param table_path: tuple - path of table's parent object (either collection or ARRAY(OBJECT))
+    :param mapping: dict
+    :param table_name: str
+    :param field_prefix: str - prefix of full names of fields of table's parent object
+    """
+    for field, field_path in schema_index.children(object_path).items():
+        field_info = schema_index[field_path]
+        # mongo_field_name is the full field name from table's parent object,
         # either collection or ARRAY(OBJECT)
-        mongo_field_name = field_prefix + field
+        mongo_field_name = field_prefix + schema_index.dotted_name(field_path, root=table_path)
 
         mongo_type = field_info['type']
         if mongo_type == 'ARRAY':
             mongo_array_type = field_info['array_type']
             if mongo_array_type == 'OBJECT':
                 add_object_array_to_mapping(mongo_field_name, field_info['object'],
-                                            mapping, table_name)
+                                            mapping, table_name, schema_index=schema_index,
+                                            object_path=field_path)
             else:
                 add_scalar_array_field_to_mapping(field, mongo_field_name, mongo_array_type,
-                                                  mapping, table_name)
+                                                  mapping, table_name, field_info.get('stats'))
 
         elif mongo_type == 'OBJECT':
             if 'object' in field_info:
-                add_object_to_mapping(field_info['object'], mapping, table_name,
-                                      field_prefix=mongo_field_name + '.')
+                _add_indexed_object_to_mapping(schema_index, field_path, table_path, mapping,
+                                               table_name, field_prefix=field_prefix)
             else:   # can happen in extract from code (DictField)
                 logger.warning(
                     "WARNING : 'JSON' SQL type is not managed yet. Field '%s' from table "
@@ -104,11 +127,12 @@ def add_object_to_mapping(object_schema, mapping, table_name, field_prefix=''):
 
         else:
             comment = field_info.get('comment', '')
-            add_field_to_table_mapping(mongo_field_name, mapping[table_name], mongo_type, comment)
+            add_field_to_table_mapping(mongo_field_name, mapping[table_name], mongo_type, comment,
+                                       field_info.get('stats'))
 
 
 def add_scalar_array_field_to_mapping(field, mongo_field_name, mongo_array_type, mapping,
-                                      parent_table_name):
+                                      parent_table_name, field_stats=None):
     """ Add a linked table to the mapping, corresponding to an array of scalars
 
     :param field: str
@@ -118,6 +142,7 @@ def add_scalar_array_field_to_mapping(field, mongo_field_name, mongo_array_type,
     :param mongo_array_type: str
     :param mapping: dict
     :param parent_table_name: str
+    :param field_stats: dict, default None - used to choose a precise SQL type
     """
     try:
         psql_type(mongo_array_type)
@@ -130,10 +155,12 @@ def add_scalar_array_field_to_mapping(field, mongo_field_name, mongo_array_type,
     linked_table_name = initiate_array_mapping(mongo_field_name, mapping, parent_table_name)
     mapping[parent_table_name][mongo_field_name]['type'] = '_ARRAY_OF_SCALARS'
     mapping[parent_table_name][mongo_field_name]['valueField'] = field
-    add_field_to_table_mapping(field, mapping[linked_table_name], mongo_array_type)
+    add_field_to_table_mapping(field, mapping[linked_table_name], mongo_array_type,
+                               field_stats=field_stats)
 
 
-def add_object_array_to_mapping(mongo_field_name, object_schema, mapping, parent_table_name):
+def add_object_array_to_mapping(mongo_field_name, object_schema, mapping, parent_table_name,
+                                schema_index=None, object_path=()):
     """ Add a linked table to the mapping, corresponding to an array of objects
 
     :param mongo_field_name: str
@@ -141,10 +168,17 @@ def add_object_array_to_mapping(mongo_field_name, object_schema, mapping, parent
     :param object_schema: str
     :param mapping: dict
     :param parent_table_name: str
+    :param schema_index: SchemaIndex, default None
+        index of the collection schema, where object_schema is the schema of object_path.
+        Index of object_schema is built if None.
+    :param object_path: tuple - path of the array field in schema_index
     """
+    if schema_index is None:
+        schema_index, object_path = SchemaIndex(object_schema), ()
     linked_table_name = initiate_array_mapping(mongo_field_name, mapping, parent_table_name)
     mapping[parent_table_name][mongo_field_name]['type'] = '_ARRAY'
-    add_object_to_mapping(object_schema, mapping, linked_table_name, field_prefix='')
+    _add_indexed_object_to_mapping(schema_index, object_path, object_path, mapping,
+                                   linked_table_name)
 
 
 def initiate_array_mapping(mongo_field_name, mapping, parent_table_name):
@@ -186,16 +220,19 @@ def initiate_array_mapping(mongo_field_name, mapping, parent_table_name):
     return linked_table_name
 
 
-def add_field_to_table_mapping(mongo_field_name, table_mapping, mongo_type, comment=""):
+def add_field_to_table_mapping(mongo_field_name, table_mapping, mongo_type, comment="",
+                               field_stats=None):
     """ Add a field to a table mapping
 
     :param mongo_field_name: str
         full field name from table's parent object, either collection or ARRAY(OBJECT)
     :param table_mapping: dict
     :param mongo_type: str
+    :param field_stats: dict, default None
+        'stats' of field schema (extract with stats), to choose the narrowest SQL type
     """
     try:
-        field_psql_type = psql_type(mongo_type)
+        field_psql_type = psql_type_from_stats(mongo_type, field_stats)
     except KeyError:
         logger.warning("WARNING : Mongo type '%s' is not mapped to an SQL type. Field '%s' is "
                        "skipped from the mapping.", mongo_type, mongo_field_name)
@@ -213,3 +250,170 @@ def to_sql_identifier(identifier):
     """ Replace character in MongoDB identifier that are illegal in SQL
     """
     return identifier.replace('.', '__').replace('-', '_').replace(' ', '_')
+
+
+###
+# Generation of PostgreSQL DDL from a mapping
+
+# Types of array fields in a mapping, which are linked tables rather than columns
+ARRAY_MAPPING_TYPES = ['_ARRAY', '_ARRAY_OF_SCALARS']
+
+# Column type of foreign keys referencing an automatically generated primary key
+AUTO_GENERATED_FK_TYPE = 'INTEGER'
+
+
+def mapping_to_ddl(mapping, with_indexes=False):
+    """ Generate PostgreSQL DDL (CREATE statements) from a mapping, in one transaction.
+
+    - each database is a PostgreSQL schema
+    - tables are created after the table they reference (dependency order)
+    - primary keys are either '_id' or an automatically generated '_id_postgres'
+    - foreign keys of linked tables ('fk') reference primary key of parent table
+    - 'comment' of tables and columns are added
+
+    :param mapping: dict
+    :param with_indexes: bool - create an index on each foreign key column
+    :return ddl: str
+    """
+    statements = ['BEGIN;']
+    for db in sorted(mapping):
+        statements.append('CREATE SCHEMA IF NOT EXISTS {};'.format(quote_sql_identifier(db)))
+        db_mapping = mapping[db]
+        foreign_keys = get_foreign_keys(db_mapping)
+        for table in sort_tables_by_dependencies(db_mapping, foreign_keys):
+            statements += table_mapping_to_ddl(db, table, db_mapping, foreign_keys.get(table),
+                                               with_indexes)
+    statements.append('COMMIT;')
+    return '\n'.join(statements) + '\n'
+
+
+def get_foreign_keys(db_mapping):
+    """ Get foreign keys of linked tables, from array fields of their parent table.
+
+    :param db_mapping: dict
+    :return foreign_keys: dict {linked_table_name: (parent_table_name, fk_column_name)}
+    """
+    foreign_keys = dict()
+    for table, table_mapping in db_mapping.items():
+        for field_mapping in table_mapping.values():
+            if isinstance(field_mapping, dict) and \
+                    field_mapping.get('type') in ARRAY_MAPPING_TYPES:
+                foreign_keys[field_mapping['dest']] = (table, field_mapping['fk'])
+    return foreign_keys
+
+
+def sort_tables_by_dependencies(db_mapping, foreign_keys):
+    """ Sort tables so that each table comes after the table referenced by its foreign key.
+
+    :param db_mapping: dict
+    :param foreign_keys: dict - from get_foreign_keys
+    :return sorted_tables: list of table names
+    """
+    children = dict()
+    roots = []
+    for table in sorted(db_mapping):
+        parent = foreign_keys.get(table, (None,))[0]
+        if parent in db_mapping:
+            children.setdefault(parent, []).append(table)
+        else:
+            roots.append(table)
+
+    sorted_tables = []
+    tables_to_add = list(reversed(roots))
+    while tables_to_add:
+        table = tables_to_add.pop()
+        sorted_tables.append(table)
+        tables_to_add += reversed(children.get(table, []))
+    return sorted_tables
+
+
+def table_mapping_to_ddl(db, table, db_mapping, foreign_key=None, with_indexes=False):
+    """ Generate statements creating a table, its comments and indexes.
+
+    :param db: str
+    :param table: str
+    :param db_mapping: dict
+    :param foreign_key: tuple (parent_table_name, fk_column_name), default None
+    :param with_indexes: bool - create an index on foreign key column
+    :return statements: list of str
+    """
+    table_mapping = db_mapping[table]
+    qualified_table = '{}.{}'.format(quote_sql_identifier(db), quote_sql_identifier(table))
+    pk = table_mapping['pk']
+    fk_column = foreign_key[1] if foreign_key else None
+
+    columns = []
+    comments = []
+    if pk == '_id':
+        columns.append('{} {} PRIMARY KEY'.format(quote_sql_identifier(
+            table_mapping['_id'].get('dest', '_id')), table_mapping['_id']['type']))
+    else:
+        columns.append('{} {} PRIMARY KEY'.format(quote_sql_identifier(pk),
+                                                  AUTO_GENERATED_PK_TYPE))
+    if fk_column:
+        parent_table, _ = foreign_key
+        parent_pk = db_mapping[parent_table]['pk']
+        if parent_pk == '_id':
+            parent_pk = db_mapping[parent_table]['_id'].get('dest', '_id')
+        fk_type = table_mapping[fk_column]['type']
+        if fk_type == AUTO_GENERATED_PK_TYPE:
+            fk_type = AUTO_GENERATED_FK_TYPE
+        columns.append('{} {} REFERENCES {}.{} ({})'.format(
+            quote_sql_identifier(fk_column), fk_type, quote_sql_identifier(db),
+            quote_sql_identifier(parent_table), quote_sql_identifier(parent_pk)))
+
+    for field, field_mapping in sorted(table_mapping.items()):
+        if field in ['pk', 'comment', '_id', fk_column] or \
+                field_mapping.get('type') in ARRAY_MAPPING_TYPES:
+            continue
+        column = field_mapping.get('dest', field)
+        columns.append('{} {}'.format(quote_sql_identifier(column), field_mapping['type']))
+        if field_mapping.get('comment'):
+            comments.append('COMMENT ON COLUMN {}.{} IS {};'.format(
+                qualified_table, quote_sql_identifier(column),
+                quote_sql_literal(field_mapping['comment'])))
+
+    statements = ['CREATE TABLE {} (\n    {}\n);'.format(qualified_table,
+                                                         ',\n    '.join(columns))]
+    if table_mapping.get('comment'):
+        statements.append('COMMENT ON TABLE {} IS {};'.format(
+            qualified_table, quote_sql_literal(table_mapping['comment'])))
+    statements += comments
+    if with_indexes and fk_column:
+        statements.append('CREATE INDEX {} ON {} ({});'.format(
+            quote_sql_identifier(index_name(table, fk_column)), qualified_table,
+            quote_sql_identifier(fk_column)))
+    return statements
+
+
+def index_name(table, column):
+    """ Name of the index on a column of a table.
+
+    Names longer than MAX_IDENTIFIER_LENGTH bytes are truncated and suffixed with a hash of
+    the full name, so that PostgreSQL does not truncate them itself, possibly to the name of
+    the index of another table.
+
+    :param table: str
+    :param column: str
+    :return index_name: str
+    """
+    name = u'{}__{}_idx'.format(table, column)
+    encoded_name = name.encode('utf-8')
+    if len(encoded_name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    suffix = u'_{}_idx'.format(hashlib.md5(encoded_name).hexdigest()[:8])
+    # 'ignore' drops a multi-byte character cut by truncation
+    prefix = encoded_name[:MAX_IDENTIFIER_LENGTH - len(suffix)].decode('utf-8', 'ignore')
+    return prefix + suffix
+
+
+def quote_sql_identifier(identifier):
+    """ Quote a PostgreSQL identifier (database, table or column name)
+    """
+    return '"{}"'.format(identifier.replace('"', '""'))
+
+
+def quote_sql_literal(value):
+    """ Quote a PostgreSQL string literal
+    """
+    return "'{}'".format(value.replace("'", "''"))
@@ -20,6 +20,11 @@ setup(name='pymongo-schema',
           'future==0.16.0',
           'scipy'
       ],
+      extras_require={
+          'msgpack': ['msgpack'],
+          'arrow': ['pyarrow'],
+          'zstd': ['zstandard'],  # msgpack payload and .zst files compression
+      },
       dependency_links=[
           'git@github.com:etetoolkit/ete.git'
       ],
@@ -0,0 +1,48 @@
+import io
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pymongo_schema.binary_schema import *
+
+msgpack = pytest.importorskip('msgpack')
+
+
+@pytest.fixture(scope='module')
+def schema():
+    return {'db': {'coll': {'count': 3, 'object': {
+        'name': {'type': 'string', 'count': 3, 'prop_in_object': 1.0,
+                 'types_count': {'string': 2, 'null': 1}, 'top_values': [[u'Geneviève', 2]]}}}}}
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test00_binary_schema_round_trip(schema, compression):
+    binary_schema = dumps_binary_schema(schema, compression=compression)
+    assert is_binary_schema(binary_schema)
+    assert loads_binary_schema(binary_schema) == schema
+
+
+def test01_binary_schema_zstd(schema):
+    pytest.importorskip('zstandard')
+    assert loads_binary_schema(dumps_binary_schema(schema, compression='zstd')) == schema
+
+
+def test02_binary_schema_bson_types():
+    data = {'_id': ObjectId('5a0c5ef4d7d7a300012e3d4e'), 'date': datetime(2015, 1, 1)}
+    loaded = loads_binary_schema(dumps_binary_schema(data))
+    assert loaded['_id'] == {'$oid': '5a0c5ef4d7d7a300012e3d4e'}
+    assert list(loaded['date']) == ['$date']
+
+
+def test03_binary_schema_wrong_compression(schema):
+    with pytest.raises(ValueError):
+        dumps_binary_schema(schema, compression='lzma')
+    with pytest.raises(ValueError):
+        loads_binary_schema(b'{"db": {}}')
+
+
+def test04_load_schema_detects_format(schema):
+    assert load_schema(io.BytesIO(dumps_binary_schema(schema))) == schema
+    assert load_schema(io.BytesIO(u'{"db": {"coll": {"count": 3}}}'.encode('utf-8'))) == \
+        {'db': {'coll': {'count': 3}}}
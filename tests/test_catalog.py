@@ -0,0 +1,77 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from pymongo_schema.catalog import *
+from pymongo_schema.compare import compare_schemas_bases
+from tests import TEST_DIR
+
+
+@pytest.fixture(scope='module')
+def mongo_schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def new_mongo_schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def mapping():
+    with open(os.path.join(TEST_DIR, 'resources', 'expected', 'mapping.json')) as f:
+        return json.load(f)
+
+
+def test00_write_schema_catalog(mongo_schema):
+    connection = sqlite3.connect(':memory:')
+    write_catalog(mongo_schema, connection)
+    assert connection.execute(
+        "SELECT d.name, c.name, c.count FROM collections c "
+        "JOIN databases d ON d.id = c.database_id WHERE c.name = 'test_col1'").fetchall() == \
+        [('test_db1', 'test_col1', 25359)]
+    assert connection.execute(
+        "SELECT f.path, f.depth, p.name, f.type FROM fields f JOIN fields p ON p.id = f.parent_id "
+        "WHERE f.name = 'building' AND f.collection_id = 1").fetchall() == \
+        [('address.building', 1, 'address', 'string')]
+    assert connection.execute(
+        "SELECT t.type, t.count, t.in_array FROM types_count t JOIN fields f ON f.id = t.field_id "
+        "WHERE f.path = 'grades' AND f.collection_id = 1").fetchall() == \
+        [('ARRAY', 25359, 0), ('OBJECT', 93463, 1), ('null', 738, 1)]
+    n_fields = connection.execute('SELECT count(*) FROM fields').fetchone()[0]
+    assert n_fields > 10
+    assert not connection.in_transaction
+
+
+def test01_write_mapping_catalog(mapping):
+    connection = sqlite3.connect(':memory:')
+    write_catalog(mapping, connection, category='mapping')
+    assert connection.execute(
+        "SELECT t.pk, c.dest, c.type FROM mapping_columns c "
+        "JOIN mapping_tables t ON t.id = c.table_id "
+        "WHERE t.database = 'test_db2' AND t.name = 'test_col__grades' AND c.field = 'score'"
+    ).fetchall() == [('_id_postgres', 'score', 'INT')]
+
+
+def test02_write_diff_catalog(mongo_schema, new_mongo_schema):
+    connection = sqlite3.connect(':memory:')
+    diff = compare_schemas_bases(mongo_schema, new_mongo_schema)
+    write_catalog(iter(diff), connection, category='diff')
+    rows = connection.execute('SELECT database, collection, hierarchy, prev_schema, new_schema '
+                              'FROM diffs ORDER BY id').fetchall()
+    assert len(rows) == len(diff)
+    assert [row[2] for row in rows] == [line['hierarchy'] for line in diff]
+    assert [json.loads(row[3]) if row[3] else None for row in rows] == \
+        [line['prev_schema'] for line in diff]
+
+
+def test03_write_catalog_rollback_on_error():
+    connection = sqlite3.connect(':memory:')
+    with pytest.raises(AttributeError):
+        write_catalog({'db': {'coll': {'count': 1, 'object': {'field': 'not a schema'}}}},
+                      connection)
+    assert connection.execute("SELECT name FROM sqlite_master").fetchall() == []
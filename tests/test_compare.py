@@ -121,3 +121,65 @@ def test06_is_retrocompatible_false_type_modif():
 
 def test05_is_retrocompatible_false(long_diff):
     assert not is_retrocompatible(long_diff)
+
+
+def test07_iter_schemas_bases_diff_same_as_list():
+    prev_schema = {'db': {'coll': {'object': {'field1': {'type': 'string'},
+                                              'field2': {'type': 'integer'}}}}}
+    new_schema = {'db': {'coll': {'object': {'field1': {'type': 'integer'},
+                                             'field3': {'type': 'integer'}}}}}
+    res = iter_schemas_bases_diff(prev_schema, new_schema)
+    assert not isinstance(res, list)
+    assert list(res) == compare_schemas_bases(prev_schema, new_schema)
+
+
+def test08_is_retrocompatible_stops_at_first_breaking_change():
+    consumed = []
+
+    def diff():
+        for line in [{'hierarchy': 'db1', 'prev_schema': None, 'new_schema': 'db1'},
+                     {'hierarchy': 'db0', 'prev_schema': 'db0', 'new_schema': None},
+                     {'hierarchy': 'db2', 'prev_schema': None, 'new_schema': 'db2'}]:
+            consumed.append(line['hierarchy'])
+            yield line
+
+    assert not is_retrocompatible(diff())
+    assert consumed == ['db1', 'db0']
+
+
+def test09_is_schema_retrocompatible():
+    prev_schema = {'db': {'coll': {'object': {'field1': {'type': 'string'}}}}}
+    new_schema = {'db': {'coll': {'object': {'field1': {'type': 'string'},
+                                             'field2': {'type': 'integer'}}}}}
+    assert is_schema_retrocompatible(prev_schema, new_schema)
+    assert not is_schema_retrocompatible(new_schema, prev_schema)
+
+
+def test10_iter_schemas_drift_prop_in_object():
+    prev_schema = {'db': {'coll': {'count': 100, 'object': {
+        'field1': {'count': 99, 'prop_in_object': 0.99, 'types_count': {'integer': 99}}}}}}
+    new_schema = {'db': {'coll': {'count': 100, 'object': {
+        'field1': {'count': 40, 'prop_in_object': 0.4, 'types_count': {'integer': 40}}}}}}
+    assert list(iter_schemas_drift(prev_schema, new_schema)) == [
+        {'hierarchy': 'db.coll.field1',
+         'prev_schema': {'prop_in_object': 0.99}, 'new_schema': {'prop_in_object': 0.4}}]
+
+
+def test11_iter_schemas_drift_types_and_count():
+    prev_schema = {'db': {'coll': {'count': 1000, 'object': {
+        'field': {'type': 'OBJECT', 'count': 1000, 'prop_in_object': 1.0,
+                  'types_count': {'OBJECT': 1000},
+                  'object': {'sub': {'count': 1000, 'prop_in_object': 1.0,
+                                     'types_count': {'integer': 1000}}}}}}}}
+    new_schema = {'db': {'coll': {'count': 3000, 'object': {
+        'field': {'type': 'OBJECT', 'count': 3000, 'prop_in_object': 1.0,
+                  'types_count': {'OBJECT': 3000},
+                  'object': {'sub': {'count': 3000, 'prop_in_object': 1.0,
+                                     'types_count': {'integer': 2997, 'string': 3}}}}}}}}
+    assert list(iter_schemas_drift(prev_schema, new_schema)) == [
+        {'hierarchy': 'db.coll', 'prev_schema': {'count': 1000}, 'new_schema': {'count': 3000}},
+        {'hierarchy': 'db.coll.field.sub',
+         'prev_schema': {'types_prop': {'integer': 1.0, 'string': 0.}},
+         'new_schema': {'types_prop': {'integer': 0.999, 'string': 0.001}}}]
+    assert list(iter_schemas_drift(prev_schema, new_schema, types_threshold=0.01,
+                                   count_threshold=3)) == []
@@ -0,0 +1,27 @@
+import pytest
+
+from pymongo_schema.compression import *
+
+
+@pytest.mark.parametrize('extension, magic', [('.gz', b'\x1f\x8b'), ('.bz2', b'BZh'),
+                                              ('.xz', b'\xfd7zXZ'), ('.zst', b'(\xb5/\xfd')])
+def test00_open_compressed_text_and_binary(tmpdir, extension, magic):
+    if extension == '.zst':
+        pytest.importorskip('zstandard')
+    filename = str(tmpdir.join('schema.json' + extension))
+    with open_compressed(filename, 'w') as file_descr:
+        file_descr.write(u'{"name": "Geneviève"}')
+    with open(filename, 'rb') as file_descr:
+        assert file_descr.read().startswith(magic)
+    with open_compressed(filename, 'rb') as file_descr:
+        assert file_descr.read() == u'{"name": "Geneviève"}'.encode('utf-8')
+    with open_compressed(filename, 'r') as file_descr:
+        assert file_descr.read() == u'{"name": "Geneviève"}'
+
+
+def test01_get_compression():
+    assert get_compression('schema.json.gz') == 'gzip'
+    assert get_compression('schema.zst') == 'zstd'
+    assert get_compression('schema.json') is None
+    with pytest.raises(ValueError):
+        open_compressed('schema.json')
@@ -1,9 +1,13 @@
 # coding: utf8
 import filecmp
+import io
+import subprocess
+import sys
 from datetime import datetime
 
+import pandas as pd
 import pytest
-from bson import ObjectId
+from bson import ObjectId, json_util
 from pandas.util.testing import assert_frame_equal
 
 from pymongo_schema.export import *
@@ -199,22 +203,20 @@ def test12_mongo_schema_as_dataframe_long(long_full_schema):
 
 # INTEGRATION LIKE TESTS
 
-def test02_write_md(schema_ex_df):
+def test02_write_md(schema_ex_dict, columns):
     output = os.path.join(TEST_DIR, 'output_data_dict.md')
     expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'data_dict.md')
-    output_maker = MdOutput({})
-    output_maker.data_df = schema_ex_df.copy()
+    output_maker = MdOutput(schema_ex_dict, columns_to_get=columns)
     with open(output, 'w') as out_fd:
         output_maker.write_data(out_fd)
     assert filecmp.cmp(output, expected_file)
     os.remove(output)
 
 
-def test03_write_html(schema_ex_df):
+def test03_write_html(schema_ex_dict, columns):
     output = os.path.join(TEST_DIR, 'output_data_dict.html')
     expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'data_dict.html')
-    output_maker = HtmlOutput({})
-    output_maker.data_df = schema_ex_df.copy()
+    output_maker = HtmlOutput(schema_ex_dict, columns_to_get=columns)
     with open(output, 'w') as out_fd:
         output_maker.write_data(out_fd)
     with open(output) as out_fd, open(expected_file) as exp_fd:
@@ -222,11 +224,10 @@ def test03_write_html(schema_ex_df):
     os.remove(output)
 
 
-def test04_write_xlsx(schema_ex_df):
+def test04_write_xlsx(schema_ex_dict, columns):
     output = os.path.join(TEST_DIR, 'output_data_dict.xlsx')
     expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'data_dict.xlsx')
-    output_maker = XlsxOutput({})
-    output_maker.data_df = schema_ex_df.copy()
+    output_maker = XlsxOutput(schema_ex_dict, columns_to_get=columns)
     output_maker.write_data(output)
     res = [cell.value for row in load_workbook(output).active for cell in row]
     exp = [cell.value for row in load_workbook(expected_file).active for cell in row]
@@ -254,6 +255,14 @@ def test04_write_json_with_mongo_objects():
     os.remove(output)
 
 
+def test05_write_json_compact(simple_schema):
+    output_maker = JsonOutput({'db': {'coll': simple_schema}}, compact=True)
+    file_descr = io.StringIO()
+    output_maker.write_data(file_descr)
+    assert '\n' not in file_descr.getvalue()
+    assert json.loads(file_descr.getvalue()) == {'db': {'coll': simple_schema}}
+
+
 def test06_write_output_dict_schema_md(schema_ex_dict, columns):
     output = os.path.join(TEST_DIR, 'output_data_dict_from_schema.md')
     expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'data_dict.md')
@@ -382,6 +391,15 @@ def test16_schema_diff_to_md(long_diff):
     os.remove(output_file)
 
 
+def test16_schema_diff_generator_to_md(long_diff):
+    output_file = os.path.join(TEST_DIR, 'output_test_diff_generator.md')
+    expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'schema_diff.md')
+    arg = {'formats': ['md'], 'output': output_file, 'category': 'diff'}
+    transform_data_to_file((line for line in long_diff), **arg)  # md reads lines twice
+    assert filecmp.cmp(output_file, expected_file)
+    os.remove(output_file)
+
+
 def test17_mapping_to_tsv(mapping_ex_dict):
     output_file = os.path.join(TEST_DIR, 'output_mapping.tsv')
     expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'mapping.tsv')
@@ -400,4 +418,279 @@ def test18_schema_from_code():
            'columns': ['Field_compact_name', 'Field_name', 'Default', 'Field', 'Count']}
     transform_data_to_file(schema, **arg)
     assert filecmp.cmp(output_file, expected_file)
-    os.remove(output_file)
\ No newline at end of file
+    os.remove(output_file)
+
+def test19_write_diff_jsonl(long_diff):
+    output_file = os.path.join(TEST_DIR, 'output_test_diff.jsonl')
+    arg = {'formats': ['jsonl'], 'output': output_file, 'category': 'diff'}
+    transform_data_to_file(iter(long_diff), **arg)
+    with open(output_file) as out_fd:
+        assert [json.loads(line) for line in out_fd] == long_diff
+    os.remove(output_file)
+
+
+def test20_write_schema_jsonl(long_full_schema):
+    output_file = os.path.join(TEST_DIR, 'output_schema.jsonl')
+    arg = {'formats': ['jsonl'], 'output': output_file}
+    transform_data_to_file(long_full_schema, **arg)
+    with open(output_file) as out_fd:
+        lines = [json.loads(line) for line in out_fd]
+    assert lines == [{'db1': long_full_schema['db1']}, {'db2': long_full_schema['db2']}]
+    os.remove(output_file)
+
+
+def test21_write_mapping_sql(mapping_ex_dict):
+    output_file = os.path.join(TEST_DIR, 'output_mapping.sql')
+    arg = {'formats': ['sql'], 'output': output_file, 'category': 'mapping',
+           'with_indexes': True}
+    transform_data_to_file(mapping_ex_dict, **arg)
+    with open(output_file) as out_fd:
+        assert out_fd.read() == mapping_to_ddl(mapping_ex_dict, with_indexes=True)
+    os.remove(output_file)
+    with pytest.raises(ValueError):
+        transform_data_to_file({}, formats=['sql'], output=output_file, category='schema')
+
+
+def test22_schema_sketches_and_indexes_columns():
+    field_schema = {'types_count': {'string': 3}, 'count': 3, 'type': 'string',
+                    'prop_in_object': 1.0, 'cardinality': 2,
+                    'top_values': [['Paris', 2], ['Lyon', 1]],
+                    'sketches': {'cardinality': {'precision': 4, 'registers': ''},
+                                 'top_values': {'size': 10, 'counters': []}}}
+    schema = {'db': {'coll': {'count': 3, 'object': {'city': field_schema}}}}
+    df = _SchemaPreProcessing.convert_to_dataframe(schema, ['Field_name', 'Cardinality',
+                                                            'Top_values'])
+    assert df.values.tolist() == [['db', 'coll', 'city', 2, 'Paris : 2, Lyon : 1']]
+    field_schema['indexes'] = ['city_1', 'city_1_name_1']
+    df = _SchemaPreProcessing.convert_to_dataframe(schema, ['Field_name', 'Indexes'])
+    assert df.values.tolist() == [['db', 'coll', 'city', 'city_1, city_1_name_1']]
+    assert _SchemaPreProcessing.filter_data(schema) == {
+        'db': {'coll': {'object': {'city': {'type': 'string', 'cardinality': 2,
+                                            'indexes': ['city_1', 'city_1_name_1']}}}}}
+
+
+def test23_transform_data_to_file_preprocesses_once(long_full_schema, monkeypatch):
+    calls = []
+    convert_to_dataframe = _SchemaPreProcessing.convert_to_dataframe
+    filter_data = _SchemaPreProcessing.filter_data
+
+    def counting_convert_to_dataframe(data, **kwargs):
+        calls.append('convert_to_dataframe')
+        return convert_to_dataframe(data, **kwargs)
+
+    def counting_filter_data(data):
+        if data is long_full_schema:  # not counting recursive calls
+            calls.append('filter_data')
+        return filter_data(data)
+
+    monkeypatch.setattr(_SchemaPreProcessing, 'convert_to_dataframe',
+                        staticmethod(counting_convert_to_dataframe))
+    monkeypatch.setattr(_SchemaPreProcessing, 'filter_data', staticmethod(counting_filter_data))
+    output = os.path.join(TEST_DIR, 'output_shared')
+    formats = ['xlsx', 'html', 'tsv', 'md', 'json', 'yaml']
+    transform_data_to_file(long_full_schema, formats, output=output, without_counts=True)
+    # list like outputs do not build a dataframe, hierarchical ones share filtered data
+    assert calls == ['filter_data']
+    for output_format in formats:
+        os.remove('{}.{}'.format(output, output_format))
+
+
+def test24_write_tsv_and_md_without_pandas(long_full_schema):
+    output = os.path.join(TEST_DIR, 'output_streaming')
+    script = ("import json, sys\n"
+              "pandas_imported = 'pandas' in sys.modules\n"
+              "from pymongo_schema.export import transform_data_to_file\n"
+              "transform_data_to_file(json.loads(sys.argv[1]), ['tsv', 'md'], output=sys.argv[2],"
+              " md_column_width=12)\n"
+              "assert pandas_imported or 'pandas' not in sys.modules\n")
+    subprocess.check_call([sys.executable, '-c', script, json.dumps(long_full_schema), output])
+    with open(output + '.tsv') as tsv_fd:
+        assert tsv_fd.readline() == ('Database\tCollection\tField_full_name\tDepth\t'
+                                     'Field_name\tType\n')
+        assert tsv_fd.readline() == 'db1\tcoll\tfield\t0\tfield\tstring\n'
+    with open(output + '.md') as md_fd:
+        lines = md_fd.read().split('\n')
+    assert lines[:6] == ['', '### Database: db1', '#### Collection: coll ',
+                         '|Field_compact_name|Field_name  |Count       |Percentage  |Types_count |',
+                         '|------------|------------|------------|------------|------------|',
+                         '|field       |field       |25359       |100.0       |string : 25359|']
+    for output_format in ['tsv', 'md']:
+        os.remove('{}.{}'.format(output, output_format))
+
+
+def _many_collections_schema(n_collections, collection_schema):
+    return {'db{}'.format(db): {'coll{}'.format(col): collection_schema
+                                for col in range(db, n_collections, 10)}
+            for db in range(10)}
+
+
+@pytest.mark.parametrize('output_class, n_passes', [(HtmlOutput, 1), (MdOutput, 1)])
+def test25_write_many_collections_is_linear(output_class, n_passes, simple_schema, monkeypatch):
+    yielded_lines = []
+    iter_lines = _SchemaPreProcessing.iter_lines
+
+    def counting_iter_lines(data, columns_to_get, cache=None):
+        for line in iter_lines(data, columns_to_get, cache=cache):
+            yielded_lines.append(line)
+            yield line
+
+    monkeypatch.setattr(_SchemaPreProcessing, 'iter_lines', staticmethod(counting_iter_lines))
+    n_collections = 3000
+    output = output_class(_many_collections_schema(n_collections, simple_schema))
+    file_descr = io.StringIO()
+    output.write_data(file_descr)
+    assert file_descr.getvalue().count('coll2999') >= 1
+    # Each line (one per collection) is generated once, not per collection
+    assert len(yielded_lines) == n_passes * n_collections
+
+
+def test26_write_html_with_user_template(simple_schema, tmpdir):
+    tmpdir.join('data_dict.tmpl').write(
+        '{% for db, subdict in data.items() %}{% for coll, table in subdict.items() %}'
+        '{{ db }}.{{ coll }}: {{ table }}\n{% endfor %}{% endfor %}')
+    output_maker = HtmlOutput({'db': {'coll': simple_schema}}, columns_to_get=['Count'],
+                              template_dirs=[str(tmpdir)])
+    file_descr = io.StringIO()
+    output_maker.write_data(file_descr)
+    assert file_descr.getvalue() == 'db.coll: [[25359]]\n'
+    assert get_template_environment([str(tmpdir)]) is get_template_environment([str(tmpdir)])
+    assert get_template_environment() is not get_template_environment([str(tmpdir)])
+
+
+def test27_write_xlsx_keeps_existing_sheets(simple_schema):
+    output = os.path.join(TEST_DIR, 'output_existing.xlsx')
+    book = Workbook()
+    book.active.title = 'Notes'
+    book.active.append(['note', 1])
+    book.save(output)
+    arg = {'formats': ['xlsx'], 'output': output, 'columns': ['Count', 'Percentage']}
+    transform_data_to_file({'db': {'coll': simple_schema}}, **arg)
+    transform_data_to_file({'db': {'coll': simple_schema}}, **arg)
+    book = load_workbook(output)
+    assert book.sheetnames == ['Notes', 'Mongo_Schema']
+    assert [cell.value for row in book['Notes'] for cell in row] == ['note', 1]
+    assert [[cell.value for cell in row] for row in book['Mongo_Schema']] == [
+        [None, 'Database', 'Collection', 'Count', 'Percentage'],
+        [0, 'db', 'coll', 25359, 100.0]]
+    os.remove(output)
+
+
+@pytest.mark.parametrize('output_format', ['arrow', 'parquet'])
+def test28_write_arrow_and_parquet(long_full_schema, output_format, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(ArrowOutput, 'batch_size', 1)
+    output = os.path.join(TEST_DIR, 'output_columnar')
+    columns = ['Field_full_name', 'Depth', 'Count', 'Percentage', 'Types_count']
+    transform_data_to_file(long_full_schema, [output_format], output=output, columns=columns)
+    filename = '{}.{}'.format(output, output_format)
+    if output_format == 'parquet':
+        table = pq.read_table(filename)
+    else:
+        table = pa.ipc.open_file(filename).read_all()
+    assert table.schema.names == ['Database', 'Collection'] + columns
+    assert [str(field.type) for field in table.schema] == \
+        ['string', 'string', 'string', 'int8', 'int64', 'double', 'string']
+    assert table.to_pylist()[0] == {
+        'Database': 'db1', 'Collection': 'coll', 'Field_full_name': 'field', 'Depth': 0,
+        'Count': 25359, 'Percentage': 100.0, 'Types_count': 'string : 25359'}
+    assert table.num_rows == len(list(_SchemaPreProcessing.iter_lines(long_full_schema,
+                                                                      columns)))
+    os.remove(filename)
+
+
+def test29_write_sqlite_replaces_existing_file(long_full_schema, mapping_ex_dict):
+    import sqlite3
+
+    output = os.path.join(TEST_DIR, 'output_catalog')
+    filename = output + '.sqlite'
+    for _ in range(2):  # second write replaces the first database
+        transform_data_to_file(long_full_schema, ['sqlite'], output=output)
+    connection = sqlite3.connect(filename)
+    assert connection.execute('SELECT count(*) FROM collections').fetchone()[0] == 3
+    assert connection.execute(
+        "SELECT type FROM fields WHERE path = 'field' AND collection_id = 1").fetchall() == \
+        [('string',)]
+    connection.close()
+
+    transform_data_to_file(mapping_ex_dict, ['sqlite'], output=output, category='mapping')
+    connection = sqlite3.connect(filename)
+    assert connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                              "ORDER BY name").fetchall() == \
+        [('mapping_columns',), ('mapping_tables',)]
+    connection.close()
+    os.remove(filename)
+
+    with pytest.raises(ValueError):
+        transform_data_to_file(long_full_schema, ['sqlite'])
+
+
+def test30_list_outputs_share_schema_indexes(long_full_schema, monkeypatch):
+    indexed = []
+
+    class CountingSchemaIndex(SchemaIndex):
+        def __init__(self, object_schema, prefix=''):
+            indexed.append(object_schema)
+            super(CountingSchemaIndex, self).__init__(object_schema, prefix=prefix)
+
+    monkeypatch.setattr('pymongo_schema.export.SchemaIndex', CountingSchemaIndex)
+    output = os.path.join(TEST_DIR, 'output_indexes')
+    formats = ['tsv', 'md', 'html']
+    transform_data_to_file(long_full_schema, formats, output=output)
+    # one index by collection, walked by each output
+    assert len(indexed) == 3
+    for output_format in formats:
+        os.remove('{}.{}'.format(output, output_format))
+
+
+def test31_line_maker_same_as_column_values(long_schema, monkeypatch):
+    columns = ['Field_full_name', 'Field_compact_name', 'Field_name', 'Depth', 'Type', 'Count',
+               'Percentage', 'Types_count', 'Top_values', 'Description']
+    fields = [('field', long_schema['object']['field'], 'foo.bar:'),
+              ('subfield1', long_schema['object']['field3']['object']['subfield1'],
+               'foo.bar:field3:'),
+              ('field3', long_schema['object']['field3'], 'foo.bar:')]
+    make_line = _SchemaPreProcessing._make_line_maker(columns)
+    for field, field_schema, field_prefix in fields:
+        assert make_line(field_schema, field, field_prefix) == tuple(
+            _SchemaPreProcessing.make_column_value(column, field_schema, field, field_prefix)
+            for column in columns)
+
+    prefixes = []
+    prefix_separators = _SchemaPreProcessing._prefix_separators
+
+    def counting_prefix_separators(field_prefix):
+        prefixes.append(field_prefix)
+        return prefix_separators(field_prefix)
+
+    monkeypatch.setattr(_SchemaPreProcessing, '_prefix_separators',
+                        staticmethod(counting_prefix_separators))
+    lines = _SchemaPreProcessing._object_schema_to_line_tuples(
+        long_schema['object'], ['Depth', 'Field_compact_name'], 'foo.bar:')
+    assert [line[0] for line in lines] == [2, 2, 2, 3, 3]
+    assert prefixes == ['foo.bar:', 'foo.bar:field3:']  # once per object
+
+
+def test32_list_outputs_share_lines(long_full_schema, monkeypatch):
+    generated = []
+    iter_lines = _SchemaPreProcessing.iter_lines
+
+    def counting_iter_lines(data, columns_to_get, cache=None):
+        generated.append(tuple(columns_to_get))
+        return iter_lines(data, columns_to_get, cache=cache)
+
+    monkeypatch.setattr(_SchemaPreProcessing, 'iter_lines', staticmethod(counting_iter_lines))
+    output = os.path.join(TEST_DIR, 'output_shared_lines')
+    formats = ['tsv', 'md', 'html', 'xlsx']
+    transform_data_to_file(long_full_schema, formats, output=output, columns=['Count', 'Type'])
+    assert generated == [('Count', 'Type')]  # lines generated once for all formats
+    with open(output + '.tsv') as f:
+        assert len(f.readlines()) > 1
+    for output_format in formats:
+        os.remove('{}.{}'.format(output, output_format))
+
+    del generated[:]
+    transform_data_to_file(long_full_schema, ['tsv'], output=output, columns=['Count'])
+    assert generated == [('Count',)]
+    os.remove(output + '.tsv')
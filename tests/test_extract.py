@@ -2,9 +2,12 @@ import json
 import os
 
 import pytest
+from bson import ObjectId
 from pymongo import MongoClient
 
 from pymongo_schema.extract import *
+from pymongo_schema.filter import NamespaceFilter, filter_mongo_schema_namespaces
+from pymongo_schema.mongo_sql_types import psql_type_from_stats
 from tests import TEST_DIR
 
 
@@ -107,6 +110,120 @@ def test12_summarize_types_long():
     assert schema == expected
 
 
+def test13_add_doc_to_object_schema_with_stats():
+    object_schema = init_empty_object_schema(with_stats=True)
+    for document in [{"a": 1, "b": ["xy", "xyz"], "c": {"d": 2.25}},
+                     {"a": -300, "b": "x", "c": {"d": 1e-3}},
+                     {"a": 1, "b": None, "c": {"d": float('nan')}}]:
+        add_document_to_object_schema(document, object_schema)
+    for field_schema in object_schema.values():
+        summarize_stats(field_schema['stats'])
+    assert object_schema['a']['stats'] == {'distinct': 2, 'min': -300, 'max': 1}
+    assert object_schema['b']['stats'] == {'distinct': 3, 'max_length': 3}
+    assert object_schema['c']['stats'] == {'distinct': 0}
+    summarize_stats(object_schema['c']['object']['d']['stats'])
+    assert object_schema['c']['object']['d']['stats'] == {'distinct': 3, 'min': 1e-3, 'max': 2.25,
+                                                          'max_scale': 3}
+
+
+def test13_add_doc_to_object_schema_with_stats_string_and_oid():
+    object_schema = init_empty_object_schema(with_stats=True)
+    for document in [{'a': 'xy'}, {'a': ObjectId('5a0c33fb9a0b2e0001c9c001')}]:
+        add_document_to_object_schema(document, object_schema)
+    field_schema = object_schema['a']
+    summarize_types(field_schema)
+    summarize_stats(field_schema['stats'])
+    assert field_schema['type'] == 'string'
+    assert field_schema['stats'] == {'distinct': 2, 'max_length': 24}
+    assert psql_type_from_stats(field_schema['type'], field_schema['stats']) == 'VARCHAR(24)'
+
+
+def test14_add_doc_to_object_schema_with_sketches():
+    object_schema = init_empty_object_schema(with_sketches=True)
+    oid = ObjectId('5a0c33fb9a0b2e0001c9c001')
+    for document in [{"a": "x", "b": [oid, oid]}, {"a": "x"}, {"a": "y", "b": None}]:
+        add_document_to_object_schema(document, object_schema)
+    for field_schema in object_schema.values():
+        summarize_sketches(field_schema)
+    assert object_schema['a']['cardinality'] == 2
+    assert object_schema['a']['top_values'] == [['x', 2], ['y', 1]]
+    assert object_schema['b']['top_values'] == [[str(oid), 2]]
+    assert json.loads(json.dumps(object_schema['a']['sketches'])) == object_schema['a']['sketches']
+
+
+def test15_merge_mongo_schemas():
+    documents = [{"a": 1, "b": {"c": "x"}}, {"a": "z"}, {"a": 2, "b": {"c": "y", "d": 1}},
+                 {"b": [{"c": "x"}]}]
+    schemas = []
+    for documents_part in [documents, documents[:1], documents[1:]]:
+        collection_schema = {'count': len(documents_part),
+                             'object': init_empty_object_schema(with_stats=True,
+                                                                with_sketches=True)}
+        for document in documents_part:
+            add_document_to_object_schema(document, collection_schema['object'])
+        post_process_schema(collection_schema)
+        schemas.append({'db': {'coll': recursive_default_to_regular_dict(collection_schema)}})
+    schema, schema_part1, schema_part2 = schemas
+    assert merge_mongo_schemas(schema_part1, schema_part2) == schema
+    assert merge_mongo_schemas(schema_part1, {'db2': {}}) == {'db': schema_part1['db'], 'db2': {}}
+
+
+def test16_add_indexes_to_collection_schema():
+    collection_schema = {'count': 2, 'object': {
+        '_id': {'type': 'oid'},
+        'name': {'type': 'string'},
+        'tags': {'type': 'ARRAY', 'array_type': 'OBJECT', 'object': {'label': {'type': 'string'}}}}}
+    index_information = {
+        '_id_': {'key': [('_id', 1)], 'v': 2},
+        'name_1_tags.label_-1': {'key': [('name', 1), ('tags.label', -1)], 'unique': True},
+        'name_text': {'key': [('_fts', 'text'), ('_ftsx', 1)], 'weights': {'name': 1}},
+        'missing_1': {'key': [('missing', 1)]}}
+    collection_stats = {'size': 100, 'count': 2, 'nindexes': 4,
+                        'indexSizes': {'_id_': 10, 'name_1_tags.label_-1': 20}}
+    add_indexes_to_collection_schema(collection_schema, index_information, collection_stats)
+    assert collection_schema['indexes']['name_1_tags.label_-1'] == {
+        'key': [['name', 1], ['tags.label', -1]], 'unique': True, 'size': 20}
+    assert collection_schema['indexes']['missing_1'] == {'key': [['missing', 1]],
+                                                         'unique': False}
+    assert collection_schema['storage'] == {'size': 100, 'nindexes': 4}
+    assert collection_schema['object']['_id']['indexes'] == ['_id_']
+    assert collection_schema['object']['name']['indexes'] == ['name_1_tags.label_-1', 'name_text']
+    assert 'indexes' not in collection_schema['object']['tags']
+    assert collection_schema['object']['tags']['object']['label']['indexes'] == \
+        ['name_1_tags.label_-1']
+
+
+def test17_add_doc_to_object_schema_with_stats_and_sketches():
+    object_schema = init_empty_object_schema(with_stats=True, with_sketches=True)
+    field_schema = object_schema['a']
+    assert field_schema['stats']['distinct'] is field_schema['sketches']['cardinality']
+    for document in [{"a": "x"}, {"a": ["y", "x"]}, {"a": 1}]:
+        add_document_to_object_schema(document, object_schema)
+    summarize_stats(field_schema['stats'])
+    summarize_sketches(field_schema)
+    assert field_schema['stats']['distinct'] == field_schema['cardinality'] == 3
+    assert field_schema['top_values'] == [['x', 2], [1, 1], ['y', 1]]
+
+
+def test18_merge_mongo_schemas_drops_partial_summaries():
+    schemas = []
+    for documents, with_summaries in [([{"a": "x"}, {"a": "y"}], True), ([{"a": "z"}], False)]:
+        collection_schema = {'count': len(documents),
+                             'object': init_empty_object_schema(with_stats=with_summaries,
+                                                                with_sketches=with_summaries)}
+        for document in documents:
+            add_document_to_object_schema(document, collection_schema['object'])
+        post_process_schema(collection_schema)
+        schemas.append({'db': {'coll': recursive_default_to_regular_dict(collection_schema)}})
+    schema, other_schema = schemas
+    assert 'top_values' in schema['db']['coll']['object']['a']
+    merged_schema = merge_mongo_schemas(schema, other_schema)
+    assert merge_mongo_schemas(other_schema, schema) == merged_schema
+    field_schema = merged_schema['db']['coll']['object']['a']
+    assert field_schema['count'] == 3
+    assert not set(field_schema) & {'stats', 'sketches', 'cardinality', 'top_values'}
+
+
 def test_extract_schema(pymongo_client):
     with open(os.path.join(TEST_DIR, 'resources', 'expected', 'schema.json')) as data_file:
         mongo_schema_expected = json.load(data_file, encoding='utf-8')
@@ -116,3 +233,25 @@ def test_extract_schema(pymongo_client):
                                                      collection_names='test_col')
 
     assert mongo_schema_got == mongo_schema_expected
+
+
+def test_extract_schema_with_namespace_filter(pymongo_client):
+    with open(os.path.join(TEST_DIR, 'resources', 'expected', 'schema.json')) as data_file:
+        mongo_schema_expected = json.load(data_file)
+    namespaces = {'test_*.test_col': {'excludeFields': ['address.*']}, 'test_db.other': True}
+    mongo_schema_expected = filter_mongo_schema_namespaces(mongo_schema_expected, namespaces)
+
+    mongo_schema_got = extract_pymongo_client_schema(pymongo_client,
+                                                     database_names='test_db',
+                                                     namespace_filter=NamespaceFilter(namespaces))
+
+    assert mongo_schema_got == mongo_schema_expected
+
+
+def test_extract_schema_with_indexes(pymongo_client):
+    mongo_schema = extract_pymongo_client_schema(pymongo_client, database_names='test_db',
+                                                 collection_names='test_col', with_indexes=True)
+    collection_schema = mongo_schema['test_db']['test_col']
+    assert collection_schema['indexes']['_id_']['key'] == [['_id', 1]]
+    assert collection_schema['object']['_id']['indexes'] == ['_id_']
+    assert collection_schema['storage']['nindexes'] >= 1
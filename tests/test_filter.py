@@ -1,4 +1,5 @@
 import json
+from copy import deepcopy
 import os
 import pytest
 
@@ -173,3 +174,110 @@ def test17_filter_schema_from_code():    # functional test
 
     res = filter_mongo_schema_namespaces(deepcopy(schema), namespaces)
     assert res == expected
+
+
+def test18_exclude_fields_from_collection_schema_shares_untouched(schema):
+    schema_copy = deepcopy(schema)
+    res = exclude_fields_from_collection_schema(['field', 'field3.subfield1'], schema)
+    expected = deepcopy(schema)
+    exclude_fields_from_object_schema({"field": "present", "field3": {"subfield1": "present"}},
+                                      expected["object"])
+    assert res == expected
+    assert schema == schema_copy
+    assert res["object"]["field2"] is schema["object"]["field2"]
+    assert res["object"]["field3"]["object"]["subfield2"] is \
+        schema["object"]["field3"]["object"]["subfield2"]
+    assert res["object"]["field3"] is not schema["object"]["field3"]
+
+
+def test19_namespace_filter_precedence():
+    namespace_filter = NamespaceFilter({"db.*": True,
+                                        "db.coll": {"includeFields": ["field"]},
+                                        "db.log_?": False,
+                                        "re:tenant_\\d+\\.users": True,
+                                        "tenant_*.*": {"excludeFields": ["field"]}})
+    assert namespace_filter.collection_filter("db", "other") is True
+    assert namespace_filter.collection_filter("db", "coll").fields_list == ["field"]
+    assert namespace_filter.collection_filter("db", "log_1") is None
+    assert namespace_filter.collection_filter("db", "log_10") is True
+    assert namespace_filter.collection_filter("tenant_1", "users") is True
+    assert namespace_filter.collection_filter("tenant_a", "users").exclude
+    assert namespace_filter.collection_filter("other", "users") is None
+    assert namespace_filter.may_include_database("tenant_b")
+    # regular expressions on namespaces may match any database
+    assert namespace_filter.may_include_database("other")
+    assert not NamespaceFilter({"db.*": True, "db2.coll": False}).may_include_database("db2")
+
+
+def test20_namespace_filter_wildcard_fields(schema):
+    namespaces = {"db*.coll": {"excludeFields": ["*.subfield?"]},
+                  "db1.other": {"includeFields": ["field", "re:field3\\.sub.*1"]}}
+    mongo_schema = {"db1": {"coll": schema, "other": schema, "coll2": schema},
+                    "db2": {"coll": schema}}
+    expected_coll = deepcopy(schema)
+    expected_coll["object"]["field3"]["object"] = {}
+    expected_other = include_fields_from_collection_schema(["field", "field3.subfield1"], schema)
+    assert filter_mongo_schema_namespaces(mongo_schema, namespaces) == {
+        "db1": {"coll": expected_coll, "other": expected_other},
+        "db2": {"coll": expected_coll}}
+
+
+def test21_fields_filter_exclude_nothing_shares_schema(schema):
+    fields_filter = FieldsFilter(["unknown", "*.unknown"], exclude=True)
+    assert fields_filter.filter_collection_schema(schema) is schema
+
+
+def test22_namespace_filter_unknown_option():
+    with pytest.raises(NotImplementedError):
+        NamespaceFilter({"db.coll": {"renameFields": []}})
+
+
+def test23_fields_filter_projection():
+    assert FieldsFilter(["field", "field3.subfield1", "field3"],
+                        exclude=True).projection == {"field": 0, "field3": 0}
+    assert FieldsFilter(["field", "*.secret"], exclude=True).projection == {"field": 0}
+    assert FieldsFilter(["re:.*secret"], exclude=True).projection is None
+    assert FieldsFilter(["field", "field3.subfield1", "field3.sub*"]).projection == \
+        {"field": 1, "field3": 1}
+    assert FieldsFilter(["field", "*.subfield1"]).projection is None
+
+
+class UntouchableDict(dict):
+    """Object schema failing when its fields are walked."""
+
+    def items(self):
+        raise AssertionError('untouched object schema is walked')
+
+
+def test24_fields_filter_does_not_walk_untouched_objects():
+    untouched = {'type': 'OBJECT', 'object': UntouchableDict(sub={'type': 'string'})}
+    collection_schema = {'count': 2, 'object': {
+        'field': {'type': 'string'}, 'other': untouched,
+        'obj': {'type': 'OBJECT', 'object': {'a': {'type': 'string'}, 'b': {'type': 'string'}}}}}
+    excluded = FieldsFilter(['obj.a'], exclude=True).filter_collection_schema(collection_schema)
+    assert excluded['object'] == {'field': {'type': 'string'}, 'other': untouched,
+                                  'obj': {'type': 'OBJECT', 'object': {'b': {'type': 'string'}}}}
+    included = FieldsFilter(['field', 'obj.b']).filter_collection_schema(collection_schema)
+    assert included['object'] == {'field': {'type': 'string'},
+                                  'obj': {'type': 'OBJECT', 'object': {'b': {'type': 'string'}}}}
+
+
+def test25_field_dict_to_list():
+    field_list = ["field", "field1.subfield1", "field1.subfield2", "field2.subfield.subsubfield"]
+    assert field_dict_to_list(field_list_to_dict(field_list)) == field_list
+    assert field_dict_to_list({}) == []
+
+
+def test26_legacy_helpers_match_exact_names(schema):
+    schema = deepcopy(schema)
+    schema["object"]["f*"] = schema["object"]["field"]
+    schema["object"]["re:field"] = schema["object"]["field2"]
+    res = exclude_fields_from_collection_schema(["f*", "re:field"], schema)
+    assert sorted(res["object"]) == ["field", "field2", "field3"]
+    res = include_fields_from_collection_schema(["f*"], schema)
+    assert list(res["object"]) == ["f*"]
+    fields = {"f*": "present", "field3": {"subfield1": "present"}}
+    res = exclude_fields_from_object_count_schema(fields, schema)
+    assert sorted(res["object"]) == ["field", "field2", "field3", "re:field"]
+    assert list(res["object"]["field3"]["object"]) == ["subfield2"]
+    assert res["object"]["field"] is schema["object"]["field"]
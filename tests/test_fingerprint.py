@@ -0,0 +1,99 @@
+import json
+import os
+from copy import deepcopy
+
+import pytest
+
+from pymongo_schema.compare import compare_schemas_bases
+from pymongo_schema.fingerprint import *
+from tests import TEST_DIR
+
+
+@pytest.fixture(scope='module')
+def schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def schema2():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')) as f:
+        return json.load(f)
+
+
+def test00_make_hash_canonical():
+    assert make_hash({'a': 1, 'b': [1, 2]}) == make_hash({'b': [1, 2], 'a': 1})
+    assert make_hash({'a': 1}) != make_hash({'a': 2})
+    assert len(make_hash(None)) == HASH_LENGTH
+
+
+def test01_collection_fingerprint_fields():
+    collection_schema = {'count': 1, 'object': {
+        'field': {'type': 'string', 'count': 1},
+        'sub': {'type': 'ARRAY', 'array_type': 'OBJECT', 'object': {
+            'field': {'type': 'integer'}}}}}
+    fingerprint = collection_schema_fingerprint(collection_schema)
+    assert sorted(fingerprint['fields']) == ['field', 'sub', 'sub.field']
+
+
+def test02_fingerprint_ignores_counts(schema):
+    schema_other_counts = deepcopy(schema)
+    field_schema = schema_other_counts['test_db1']['test_col1']['object']['name']
+    field_schema['count'] = 1
+    field_schema['types_count'] = {'string': 1}
+    assert mongo_schema_fingerprint(schema) == mongo_schema_fingerprint(schema_other_counts)
+
+
+def test03_compare_fingerprints_identical(schema):
+    fingerprint = mongo_schema_fingerprint(schema)
+    assert compare_fingerprints(fingerprint, deepcopy(fingerprint)) == []
+
+
+def test04_compare_fingerprints(schema, schema2):
+    res = compare_fingerprints(mongo_schema_fingerprint(schema), mongo_schema_fingerprint(schema2))
+    assert res == [('test_db1', 'test_col1'), ('test_db1', 'test_col2'),
+                   ('test_db1', 'test_col3'), ('test_db2', None)]
+
+
+def test05_restricted_compare_equals_full_compare(schema, schema2):
+    namespaces = compare_fingerprints(mongo_schema_fingerprint(schema),
+                                      mongo_schema_fingerprint(schema2))
+    res = compare_schemas_bases(restrict_schema_to_namespaces(schema, namespaces),
+                                restrict_schema_to_namespaces(schema2, namespaces))
+    exp = compare_schemas_bases(schema, schema2)
+    assert sorted(res, key=json.dumps) == sorted(exp, key=json.dumps)
+
+
+def test06_fingerprint_filename():
+    assert fingerprint_filename('schema.json') == 'schema.fingerprint.json'
+    assert fingerprint_filename('schema') == 'schema.fingerprint.json'
+    assert fingerprint_filename('schema.json.gz') == 'schema.fingerprint.json'
+
+
+def test07_write_load_fingerprint(schema):
+    output = os.path.join(TEST_DIR, 'output_schema.json')
+    with open(output, 'w') as f:
+        json.dump(schema, f)
+    filename = write_fingerprint(schema, output)
+    assert load_fingerprint(output) == mongo_schema_fingerprint(schema)
+    os.remove(filename)
+    assert load_fingerprint(output) is None
+    os.remove(output)
+
+
+def test08_load_fingerprint_of_modified_schema_file(schema, schema2):
+    base_output = os.path.join(TEST_DIR, 'output_schema')
+    json_output, yaml_output = base_output + '.json', base_output + '.yaml'
+    for output in [json_output, yaml_output]:
+        with open(output, 'w') as f:
+            json.dump(schema, f)
+    filename = write_fingerprint(schema, base_output,
+                                 schema_filenames=[json_output, yaml_output])
+    assert load_fingerprint(yaml_output) == mongo_schema_fingerprint(schema)
+    with open(json_output, 'w') as f:  # rewritten without fingerprint
+        json.dump(schema2, f)
+    os.utime(json_output, (0, 0))
+    assert load_fingerprint(json_output) is None
+    assert load_fingerprint(os.path.join(TEST_DIR, 'output_schema.msgpack')) is None
+    for output in [filename, json_output, yaml_output]:
+        os.remove(output)
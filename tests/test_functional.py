@@ -6,7 +6,9 @@ import pytest
 from openpyxl import load_workbook
 from pymongo import MongoClient
 
+from pymongo_schema.compression import open_compressed
 from pymongo_schema.extract import extract_pymongo_client_schema
+from pymongo_schema.filter import filter_mongo_schema_namespaces
 from pymongo_schema.tosql import mongo_schema_to_mapping
 from pymongo_schema.__main__ import main
 from tests import TEST_DIR
@@ -190,4 +192,98 @@ def test07_compare_detailed():
     exp = [cell.value for row in load_workbook("{}.xlsx".format(exp)).active for cell in row]
     assert res == exp
     for output in outputs.values():
-        os.remove(output)
\ No newline at end of file
+        os.remove(output)
+
+def test08_compare_fingerprint():
+    base_output = "output_fctl_fingerprint"
+    prev_schema = base_output + "_prev"
+    exp_schema = os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')
+
+    main(['transform', SCHEMA_FILE, '--output', prev_schema, '--fingerprint'])
+    assert os.path.isfile(prev_schema + '.fingerprint.json')
+
+    argv = ['compare', prev_schema + '.json', SCHEMA_FILE, '--fingerprint',
+            '--output', base_output, '--formats', 'tsv']
+    main(argv)
+    assert not os.path.isfile(base_output + '.tsv')
+
+    argv = ['compare', prev_schema + '.json', exp_schema, '--fingerprint',
+            '--output', base_output, '--formats', 'tsv']
+    main(argv)
+    exp = os.path.join(TEST_DIR, 'resources', 'functional', 'expected', 'diff.tsv')
+    with open(base_output + '.tsv') as out_fd, open(exp) as exp_fd:
+        assert sorted(out_fd.readlines()) == sorted(exp_fd.readlines())
+    os.remove(base_output + '.tsv')
+
+    # stale manifest is ignored once schema is rewritten without fingerprint
+    main(['transform', exp_schema, '--output', prev_schema])
+    argv = ['compare', prev_schema + '.json', SCHEMA_FILE, '--fingerprint',
+            '--output', base_output, '--formats', 'tsv']
+    main(argv)
+    with open(base_output + '.tsv') as out_fd, open(exp) as exp_fd:
+        assert len(out_fd.readlines()) == len(exp_fd.readlines())
+    for output in [base_output + '.tsv', prev_schema + '.json',
+                   prev_schema + '.fingerprint.json']:
+        os.remove(output)
+
+
+def test09_compare_drift():
+    base_output = "output_fctl_drift"
+    exp_schema = os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')
+    argv = ['compare', SCHEMA_FILE, exp_schema, '--drift', '--output', base_output,
+            '--formats', 'json']
+    main(argv)
+    with open(base_output + '.json') as out_fd:
+        diff = json.load(out_fd)
+    assert len(diff) == 8
+    assert diff[-1] == {'hierarchy': 'test_db1.test_col1.cuisine',
+                        'prev_schema': {'types_prop': {'ARRAY': 0.0, 'string': 1.0}},
+                        'new_schema': {'types_prop': {'ARRAY': 1.0, 'string': 0.0}}}
+    os.remove(base_output + '.json')
+
+
+def test10_extract_filter():
+    output = os.path.join(TEST_DIR, "output_fctl_schema_filtered.json")
+    expected_file = os.path.join(TEST_DIR, 'resources', 'expected', 'schema.json')
+    namespace = os.path.join(TEST_DIR, 'resources', 'input', 'namespace.json')
+    argv = ['extract', '--database', 'test_db', '--collection', 'test_col',
+            '--output', output, '--format', 'json', '--filter', namespace]
+    main(argv)
+    with open(namespace) as namespace_f:
+        namespaces = json.load(namespace_f)['namespaces']
+    with open(output) as out_f, open(expected_file) as exp_f:
+        assert json.load(out_f) == filter_mongo_schema_namespaces(json.load(exp_f), namespaces)
+    os.remove(output)
+
+
+def test11_tosql_from_msgpack():
+    pytest.importorskip('msgpack')
+    binary_schema = os.path.join(TEST_DIR, "output_fctl_schema")
+    output = os.path.join(TEST_DIR, "output_fctl_mapping_from_msgpack.json")
+    exp = os.path.join(TEST_DIR, 'resources', 'expected', 'mapping.json')
+
+    main(['transform', SCHEMA_FILE, '--output', binary_schema, '--formats', 'msgpack',
+          '--binary-compression', 'gzip'])
+    main(['tosql', binary_schema + '.msgpack', '--output', output])
+
+    with open(output) as out_fd, open(exp) as exp_fd:
+        assert json.load(out_fd) == json.load(exp_fd)
+    for filename in [binary_schema + '.msgpack', output]:
+        os.remove(filename)
+
+
+@pytest.mark.parametrize('extension', ['.gz', '.bz2', '.xz'])
+def test12_compressed_input_and_output(extension):
+    compressed_schema = os.path.join(TEST_DIR, "output_fctl_compressed_schema")
+    output = os.path.join(TEST_DIR, "output_fctl_compressed_mapping.json" + extension)
+    exp = os.path.join(TEST_DIR, 'resources', 'expected', 'mapping.json')
+
+    main(['transform', SCHEMA_FILE, '--output', compressed_schema + extension,
+          '--formats', 'json', 'tsv'])
+    main(['tosql', compressed_schema + '.json' + extension, '--output', output])
+
+    with open_compressed(output, 'r') as out_fd, open(exp) as exp_fd:
+        assert json.load(out_fd) == json.load(exp_fd)
+    for filename in [compressed_schema + '.json' + extension,
+                     compressed_schema + '.tsv' + extension, output]:
+        os.remove(filename)
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+from copy import deepcopy
+
+import pytest
+
+from pymongo_schema.compare import compare_schemas_bases
+from pymongo_schema.history import *
+from tests import TEST_DIR
+
+
+@pytest.fixture(scope='module')
+def schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def schema2():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture()
+def history_dir():
+    directory = os.path.join(TEST_DIR, 'output_history')
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def test00_iter_schemas_delta_counts():
+    prev_schema = {'db': {'coll': {'count': 2, 'object': {
+        'field': {'type': 'string', 'count': 2, 'types_count': {'string': 2}}}}}}
+    new_schema = {'db': {'coll': {'count': 3, 'object': {
+        'field': {'type': 'string', 'count': 3, 'types_count': {'string': 3}}}}}}
+    res = list(iter_schemas_delta(prev_schema, new_schema))
+    assert res == [{'hierarchy': 'db.coll', 'path': ['db', 'coll'],
+                    'prev_schema': {'count': 2}, 'new_schema': {'count': 3}},
+                   {'hierarchy': 'db.coll.field', 'path': ['db', 'coll', 'field'],
+                    'prev_schema': {'count': 2, 'types_count': {'string': 2}},
+                    'new_schema': {'count': 3, 'types_count': {'string': 3}}}]
+
+
+def test01_apply_schema_delta(schema, schema2):
+    for prev_schema, new_schema in [(schema, schema2), (schema2, schema)]:
+        reconstructed = deepcopy(prev_schema)
+        apply_schema_delta(reconstructed, iter_schemas_delta(prev_schema, new_schema))
+        assert reconstructed == new_schema
+
+
+def test02_apply_schema_delta_object_removed():
+    prev_schema = {'db': {'coll': {'count': 1, 'object': {
+        'field': {'type': 'OBJECT', 'object': {'sub': {'type': 'string'}}}}}}}
+    new_schema = {'db': {'coll': {'count': 1, 'object': {'field': {'type': 'string'}}}}}
+    reconstructed = deepcopy(prev_schema)
+    apply_schema_delta(reconstructed, iter_schemas_delta(prev_schema, new_schema))
+    assert reconstructed == new_schema
+
+
+def test03_history_snapshots(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir)
+    history.add_snapshot('day1', schema)
+    history.add_snapshot('day2', schema2)
+    history.add_snapshot('day3', schema)
+    with pytest.raises(ValueError):
+        history.add_snapshot('day1', schema)
+
+    history = SchemaHistory(history_dir)
+    assert history.snapshot_names == ['day1', 'day2', 'day3']
+    assert history.get_snapshot('day1') == schema
+    assert history.get_snapshot('day2') == schema2
+    assert history.get_snapshot('day3') == schema
+
+
+def test04_history_diff(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir)
+    history.add_snapshot('day1', schema)
+    history.add_snapshot('day2', schema2)
+    assert history.diff('day1', 'day2') == compare_schemas_bases(schema, schema2)
+    assert history.diff('day2', 'day1') == compare_schemas_bases(schema2, schema)
+    assert history.diff('day1', 'day1') == []
+
+
+def test05_history_field_history(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir)
+    history.add_snapshot('day1', schema)
+    history.add_snapshot('day2', schema2)
+    history.add_snapshot('day3', schema)
+
+    events = history.field_history(['test_db1', 'test_col1', 'cuisine'])
+    assert [(e['snapshot'], e['event']) for e in events] == [
+        ('day1', 'added'), ('day2', 'type_changed'), ('day3', 'type_changed')]
+    assert events[1]['new_schema'] == {'type': 'ARRAY', 'array_type': 'string'}
+
+    events = history.field_history(['test_db1', 'test_col1', '_borough'])
+    assert [(e['snapshot'], e['event']) for e in events] == [('day2', 'added'),
+                                                               ('day3', 'removed')]
+
+
+def test06_history_checkpoints(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir, checkpoint_interval=3)
+    schemas = [schema, schema2] * 4
+    for index, mongo_schema in enumerate(schemas):
+        history.add_snapshot('day{}'.format(index), mongo_schema)
+    assert sorted(os.listdir(os.path.join(history_dir, CHECKPOINTS_DIRNAME))) == [
+        '000003.json', '000006.json']
+
+    loaded_deltas = []
+    history._iter_deltas = lambda start, stop: (loaded_deltas.append(index) or
+                                                history._load(history._delta_filename(index))
+                                                for index in range(start, stop))
+    assert history.get_snapshot('day5') == schema2
+    assert loaded_deltas == [4, 5]
+    del loaded_deltas[:]
+    assert history.diff('day1', 'day6') == compare_schemas_bases(schema2, schema)
+    assert loaded_deltas == [1]  # day6 is loaded from its checkpoint
+
+    # a history written with another interval uses existing checkpoints
+    history = SchemaHistory(history_dir, checkpoint_interval=4)
+    for index, mongo_schema in enumerate(schemas[:-1]):
+        assert history.get_snapshot('day{}'.format(index)) == mongo_schema
+
+
+def test07_history_atomic_writes(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir)
+    history.add_snapshot('day1', schema)
+
+    class Unserializable(object):
+        pass
+
+    with pytest.raises(TypeError):
+        history.add_snapshot('day2', dict(schema2, db=Unserializable()))
+    history = SchemaHistory(history_dir)
+    assert history.snapshot_names == ['day1']
+    assert history.get_snapshot('day1') == schema
+    assert not [filename for filename in os.listdir(history_dir) if filename.endswith(TMP_SUFFIX)]
+    assert os.listdir(os.path.join(history_dir, DELTAS_DIRNAME)) == []
+
+
+def test08_history_interrupted_before_history_file(schema, schema2, history_dir):
+    history = SchemaHistory(history_dir)
+    history.add_snapshot('day1', schema)
+    dump = history._dump
+
+    def failing_dump(data, filename):
+        if filename == HISTORY_FILENAME:
+            raise IOError('Interrupted')
+        dump(data, filename)
+
+    history._dump = failing_dump
+    with pytest.raises(IOError):
+        history.add_snapshot('day2', schema2)
+    assert history.snapshot_names == ['day1']
+
+    history = SchemaHistory(history_dir)
+    assert history.snapshot_names == ['day1']
+    assert history.get_snapshot('day1') == schema
+    assert history.add_snapshot('day2', schema) == []
+    assert history.get_snapshot('day1') == schema
+    assert history.get_snapshot('day2') == schema
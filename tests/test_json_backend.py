@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId, json_util
+
+from pymongo_schema import json_backend
+from pymongo_schema.json_backend import *
+
+AVAILABLE_BACKENDS = [name for name in JSON_BACKENDS if is_json_backend_available(name)]
+
+
+@pytest.fixture(params=AVAILABLE_BACKENDS)
+def backend(request):
+    previous_backend = get_json_backend()
+    yield set_json_backend(request.param)
+    set_json_backend(previous_backend.name)
+
+
+@pytest.fixture(scope='module')
+def document():
+    return {'_id': ObjectId('5a0c5ef4d7d7a300012e3d4e'), 'date': datetime(2015, 1, 1),
+            'name': u'Geneviève', 'count': 25359, 'prop_in_object': 0.5,
+            'types_count': {'string': 3, 'null': 1}, 'values': [1, None, True]}
+
+
+def test00_stdlib_backend_always_available():
+    assert StdlibJsonBackend.name in AVAILABLE_BACKENDS
+    assert not is_json_backend_available('not_a_json_library')
+
+
+def test01_dumps_bson_types_and_non_ascii(backend, document):
+    text = dumps(document, indent=4)
+    assert u'Geneviève' in text
+    json_options = json_util.JSONOptions(tz_aware=False)
+    assert json_util.loads(text, json_options=json_options) == document
+    assert json.loads(text) == json.loads(json_util.dumps(document, json_options=json_options))
+
+
+def test02_dumps_compact(backend, document):
+    text = dumps(document)
+    assert '\n' not in text
+    assert ': ' not in text and ', ' not in text
+    assert '\n' in dumps(document, indent=4)
+
+
+def test03_loads(backend):
+    text = u'{"name": "Geneviève", "count": 3, "values": [1.5, null, true]}'
+    expected = {'name': u'Geneviève', 'count': 3, 'values': [1.5, None, True]}
+    assert loads(text) == expected
+    assert loads(text.encode('utf-8')) == expected
+
+
+def test04_set_wrong_json_backend():
+    with pytest.raises(ValueError):
+        set_json_backend('not_a_json_library')
+    assert json_backend.get_json_backend().name in AVAILABLE_BACKENDS
+
+
+@pytest.fixture(scope='module')
+def parity_document(document):
+    return dict(document, url='http://example.com/a/b', nan=float('nan'), inf=float('-inf'),
+                big_int=2 ** 63 + 1, floats=[0.1, 1e-7, 1e22, -0.0, 1.0],
+                nested={'array': [{'pattern': u'é/€'}], 'empty': {}}, int_keys={1: 2})
+
+
+def test05_same_indented_text_whatever_backend(backend, parity_document):
+    assert dumps(parity_document, indent=4) == StdlibJsonBackend.dumps(parity_document, indent=4)
+
+
+def test06_same_compact_json_whatever_backend(backend, parity_document):
+    text = dumps(parity_document)
+    expected_text = StdlibJsonBackend.dumps(parity_document)
+    assert '\\/' not in text and 'NaN' in text and '-Infinity' in text
+    # only formatting of floats may differ (ujson): read back data is the same
+    assert json.dumps(json.loads(text), sort_keys=True) == \
+        json.dumps(json.loads(expected_text), sort_keys=True)
+    assert json.dumps(loads(expected_text), sort_keys=True) == \
+        json.dumps(json.loads(expected_text), sort_keys=True)
+
+
+def test07_indented_text_written_by_backend(backend, parity_document, monkeypatch):
+    expected_text = StdlibJsonBackend.dumps(parity_document, indent=4)
+    document = dict(parity_document)
+    document.pop('int_keys')  # written by standard json module with python-rapidjson
+    expected_document_text = StdlibJsonBackend.dumps(document, indent=4)
+    if backend is RapidjsonBackend:  # standard json module is not used
+        monkeypatch.setattr(json_backend.json, 'dumps', None)
+    assert dumps(document, indent=4).encode('utf-8') == expected_document_text.encode('utf-8')
+    monkeypatch.undo()
+    assert dumps(parity_document, indent=4).encode('utf-8') == expected_text.encode('utf-8')
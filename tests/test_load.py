@@ -0,0 +1,99 @@
+# coding: utf8
+import io
+import datetime
+
+import pytest
+from bson import Binary, Decimal128, ObjectId
+
+from pymongo_schema.load import *
+from pymongo_schema.tosql import mongo_schema_to_mapping
+from tests.test_tosql import long_schema
+
+
+@pytest.fixture(scope='module')
+def db_mapping(long_schema):
+    return mongo_schema_to_mapping({'db': {'coll1': long_schema}})['db']
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return [{'_id': ObjectId('5a0c33fb9a0b2e0001c9c001'), 'field': 'a\tb', 'field2': None,
+             'field3': [{'subfield1': 'x', 'subfield2': ['s1', 's2']},
+                        {'subfield1': 'y'}]},
+            {'_id': ObjectId('5a0c33fb9a0b2e0001c9c002'), 'field': u'Ça va?',
+             'field3': [{'subfield1': 'z', 'subfield2': ['s3']}]}]
+
+
+def test00_to_copy_value():
+    assert to_copy_value(None) == '\\N'
+    assert to_copy_value(True) == 't'
+    assert to_copy_value(3) == '3'
+    assert to_copy_value('a\tb\nc\\') == 'a\\tb\\nc\\\\'
+    assert to_copy_value(datetime.datetime(2015, 1, 1, 1, 1, 1)) == '2015-01-01T01:01:01'
+    assert to_copy_value({'a': [1]}) == '{"a": [1]}'
+
+
+def test01_get_field_value():
+    assert get_field_value({'a': {'b': 1}}, ('a', 'b')) == 1
+    assert get_field_value({'a': 5}, ('a', 'b')) is None
+    assert get_field_value({}, ('a',)) is None
+
+
+def test02_compile_db_mapping(db_mapping):
+    compiled_mapping = compile_db_mapping(db_mapping)
+    assert compiled_mapping['coll1']['columns'] == ['_id', 'field', 'field2']
+    assert compiled_mapping['coll1']['arrays'] == [(('field3',), 'coll1__field3', None)]
+    assert compiled_mapping['coll1__field3']['columns'] == ['_id_postgres', 'id_coll1',
+                                                            'subfield1']
+    assert compiled_mapping['coll1__field3__subfield2']['arrays'] == []
+    assert compiled_mapping['coll1__field3__subfield2']['columns'] == [
+        '_id_postgres', 'id_coll1__field3', 'subfield2']
+
+
+def test03_add_document_rows(db_mapping, documents):
+    rows = {}
+    id_counters = {}
+    compiled_mapping = compile_db_mapping(db_mapping)
+    for document in documents:
+        add_document_rows(document, 'coll1', compiled_mapping, rows, id_counters)
+    oid1, oid2 = documents[0]['_id'], documents[1]['_id']
+    assert rows == {'coll1': [[oid1, 'a\tb', None], [oid2, u'Ça va?', None]],
+                    'coll1__field3': [[1, oid1, 'x'], [2, oid1, 'y'], [3, oid2, 'z']],
+                    'coll1__field3__subfield2': [[1, 1, 's1'], [2, 1, 's2'], [3, 3, 's3']]}
+
+
+def test04_load_documents_batches(db_mapping, documents):
+    file_descr = io.StringIO()
+    assert load_documents(documents, 'db', 'coll1', db_mapping, file_descr, batch_size=1) == 2
+    lines = file_descr.getvalue().split('\n')
+    assert lines[:6] == [
+        'COPY "db"."coll1" ("_id", "field", "field2") FROM stdin;',
+        '5a0c33fb9a0b2e0001c9c001\ta\\tb\t\\N',
+        '\\.',
+        'COPY "db"."coll1__field3" ("_id_postgres", "id_coll1", "subfield1") FROM stdin;',
+        '1\t5a0c33fb9a0b2e0001c9c001\tx',
+        '2\t5a0c33fb9a0b2e0001c9c001\ty']
+    assert lines.count('\\.') == 6
+    assert lines[-3:] == [
+        'SELECT setval(pg_get_serial_sequence(\'"db"."coll1__field3"\', '
+        '\'_id_postgres\'), 3);',
+        'SELECT setval(pg_get_serial_sequence(\'"db"."coll1__field3__subfield2"\', '
+        '\'_id_postgres\'), 3);',
+        '']
+
+
+def test05_get_collections_to_load(db_mapping):
+    mapping = {'db': db_mapping, 'db2': db_mapping}
+    assert get_collections_to_load(mapping) == [('db', 'coll1'), ('db2', 'coll1')]
+    assert get_collections_to_load(mapping, database_names=['db2']) == [('db2', 'coll1')]
+    assert get_collections_to_load(mapping, collection_names=['coll2']) == []
+
+
+def test06_to_copy_value_bson_types():
+    # bytea hex format, backslash being escaped in COPY text format
+    assert to_copy_value(b'\x00\xffA') == '\\\\x00ff41'
+    assert to_copy_value(Binary(b'AB', 4)) == '\\\\x4142'
+    assert to_copy_value(ObjectId('5a0c5ef4d7d7a300012e3d4e')) == '5a0c5ef4d7d7a300012e3d4e'
+    assert to_copy_value(Decimal128('-1.50')) == '-1.50'
+    assert to_copy_value(Decimal128('NaN')) == 'NaN'
+
@@ -21,3 +21,21 @@ def test01_common_parent_type():
     assert common_parent_type(['integer', 'float']) == 'number'
     assert common_parent_type(['integer', 'unknown']) == 'general_scalar'
     assert common_parent_type(['integer', 'OBJECT']) == 'mixed_scalar_object'
+
+
+def test02_psql_type_from_stats():
+    assert psql_type_from_stats('integer') == 'INT'
+    assert psql_type_from_stats('integer', {'distinct': 0}) == 'INT'
+    assert psql_type_from_stats('integer', {'min': -3, 'max': 32767}) == 'SMALLINT'
+    assert psql_type_from_stats('integer', {'min': -32769, 'max': 1}) == 'INT'
+    assert psql_type_from_stats('biginteger', {'min': 0, 'max': 2 ** 40}) == 'BIGINT'
+    assert psql_type_from_stats('biginteger', {'min': 0, 'max': 2 ** 70}) == 'NUMERIC(22)'
+    assert psql_type_from_stats('float', {'min': -12.5, 'max': 1.25, 'max_scale': 2}) == \
+        'NUMERIC(4, 2)'
+    assert psql_type_from_stats('number', {'min': 0, 'max': 123}) == 'NUMERIC(3, 0)'
+    assert psql_type_from_stats('float', {'min': 0, 'max': 0.3, 'max_scale': 17}) == \
+        'DOUBLE PRECISION'
+    assert psql_type_from_stats('string', {'max_length': 12}) == 'VARCHAR(12)'
+    assert psql_type_from_stats('string', {'max_length': 0}) == 'VARCHAR(1)'
+    assert psql_type_from_stats('string', {'max_length': 2 ** 24}) == 'TEXT'
+    assert psql_type_from_stats('oid', {'max_length': 24}) == 'TEXT'
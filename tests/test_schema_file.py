@@ -0,0 +1,105 @@
+import io
+import json
+import mmap
+import os
+
+import pytest
+
+from pymongo_schema.compare import compare_schemas_bases
+from pymongo_schema.filter import filter_mongo_schema_namespaces
+from pymongo_schema.schema_file import *
+from pymongo_schema.tosql import mongo_schema_to_mapping
+from tests import TEST_DIR
+
+msgpack = pytest.importorskip('msgpack')
+
+
+@pytest.fixture(scope='module')
+def mongo_schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def new_mongo_schema():
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema2.json')) as f:
+        return json.load(f)
+
+
+def make_schema_file(mongo_schema, cache_size=DEFAULT_CACHE_SIZE):
+    file_descr = io.BytesIO()
+    dump_indexed_schema(mongo_schema, file_descr)
+    return SchemaFile(file_descr.getvalue(), cache_size=cache_size)
+
+
+def test00_schema_file_round_trip(mongo_schema):
+    schema_file = make_schema_file(mongo_schema)
+    assert set(schema_file) == set(mongo_schema)
+    assert 'test_db1' in schema_file and 'other_db' not in schema_file
+    assert schema_file.to_dict() == mongo_schema
+    assert not schema_file._cache
+
+
+def test01_schema_file_decodes_accessed_collections(mongo_schema):
+    schema_file = make_schema_file(mongo_schema, cache_size=1)
+    assert dict(schema_file['test_db1']['test_col1']) == mongo_schema['test_db1']['test_col1']
+    assert list(schema_file._cache) == [('test_db1', 'test_col1')]
+    with pytest.raises(KeyError):
+        schema_file['test_db1']['missing_collection']
+
+
+def test02_schema_file_open(mongo_schema):
+    output = os.path.join(TEST_DIR, 'output_schema.schemaidx')
+    with open(output, 'wb') as file_descr:
+        dump_indexed_schema(mongo_schema, file_descr)
+    schema_file = load_schema_file(output)
+    assert isinstance(schema_file, SchemaFile)
+    assert schema_file.to_dict() == mongo_schema
+    schema_file.close()
+    os.remove(output)
+
+
+def test03_filter_schema_file(mongo_schema):
+    namespaces = {'test_db1.test_col1': {'includeFields': ['cuisine']}}
+    schema_file = make_schema_file(mongo_schema)
+    assert filter_mongo_schema_namespaces(schema_file, namespaces) == \
+        filter_mongo_schema_namespaces(mongo_schema, namespaces)
+    assert list(schema_file._cache) == [('test_db1', 'test_col1')]
+
+
+def test04_tosql_and_compare_schema_file(mongo_schema, new_mongo_schema):
+    schema_file = make_schema_file(mongo_schema)
+    assert mongo_schema_to_mapping(schema_file) == mongo_schema_to_mapping(mongo_schema)
+    for detailed_diff in [False, True]:
+        assert compare_schemas_bases(schema_file, make_schema_file(new_mongo_schema),
+                                     detailed_diff=detailed_diff) == \
+            compare_schemas_bases(mongo_schema, new_mongo_schema, detailed_diff=detailed_diff)
+
+
+@pytest.mark.parametrize('extension', ['.gz', '.xz'])
+def test05_load_compressed_schema_files(mongo_schema, extension, monkeypatch):
+    from pymongo_schema.binary_schema import dumps_binary_schema
+    from pymongo_schema.compression import open_compressed
+
+    output = os.path.join(TEST_DIR, 'output_schema.schemaidx' + extension)
+    with open_compressed(output, 'wb') as file_descr:
+        dump_indexed_schema(mongo_schema, file_descr)
+    schema_file = load_schema_file(output)
+    assert isinstance(schema_file.buffer, mmap.mmap)  # decompressed to a mapped temporary file
+    assert schema_file.to_dict() == mongo_schema
+    schema_file.close()
+
+    with open_compressed(output, 'wb') as file_descr:
+        file_descr.write(dumps_binary_schema(mongo_schema))
+    read_sizes = []
+    unpacker = msgpack.Unpacker
+
+    def recording_unpacker(file_like, **kwargs):
+        read = file_like.read
+        file_like.read = lambda *args: read_sizes.append(args) or read(*args)
+        return unpacker(file_like, **kwargs)
+
+    monkeypatch.setattr(msgpack, 'Unpacker', recording_unpacker)
+    assert load_schema_file(output) == mongo_schema
+    assert read_sizes and () not in read_sizes  # decoded from the stream, not read at once
+    os.remove(output)
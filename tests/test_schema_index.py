@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from pymongo_schema.schema_index import *
+from tests import TEST_DIR
+
+
+@pytest.fixture(scope='module')
+def object_schema():
+    return {
+        'field': {'type': 'string', 'count': 10},
+        'obj': {'type': 'OBJECT', 'types_count': {'OBJECT': 5, 'null': 1}, 'object': {
+            'array': {'type': 'ARRAY', 'array_type': 'OBJECT', 'types_count': {'ARRAY': 5},
+                      'object': {'sub': {'type': 'integer'}}},
+            'other': {'type': 'boolean'}}},
+    }
+
+
+def test00_schema_index_paths(object_schema):
+    schema_index = SchemaIndex(object_schema)
+    assert list(schema_index) == [('field',), ('obj',), ('obj', 'array'),
+                                  ('obj', 'array', 'sub'), ('obj', 'other')]
+    assert len(schema_index) == 5
+    assert schema_index[('obj', 'array', 'sub')] == {'type': 'integer'}
+    assert ('obj', 'array') in schema_index
+    assert ('array',) not in schema_index
+
+
+def test01_schema_index_hierarchy(object_schema):
+    schema_index = SchemaIndex(object_schema)
+    assert list(schema_index.children()) == ['field', 'obj']
+    assert schema_index.children(('obj',)) == {'array': ('obj', 'array'),
+                                               'other': ('obj', 'other')}
+    assert schema_index.children(('field',)) == {}
+    assert schema_index.parent(('obj', 'array')) == ('obj',)
+    assert schema_index.parent(('obj',)) == ()
+    assert schema_index.depth(('obj', 'array', 'sub')) == 2
+    assert schema_index.depth(('field',)) == 0
+
+
+def test02_schema_index_names(object_schema):
+    schema_index = SchemaIndex(object_schema, prefix='foo:')
+    assert schema_index.full_name(('obj', 'array', 'sub')) == 'foo:obj.array:sub'
+    assert schema_index.prefix(('obj', 'array', 'sub')) == 'foo:obj.array:'
+    assert schema_index.prefix(('field',)) == 'foo:'
+    assert schema_index.dotted_name(('obj', 'array', 'sub')) == 'obj.array.sub'
+    assert schema_index.dotted_name(('obj', 'array', 'sub'), root=('obj', 'array')) == 'sub'
+    assert schema_index.dotted_name(('obj', 'array', 'sub'), root=('obj',)) == 'array.sub'
+
+
+def test03_schema_index_walks_objects_once_when_accessed(monkeypatch):
+    with open(os.path.join(TEST_DIR, 'resources', 'input', 'test_schema.json')) as f:
+        collection_schema = json.load(f)['test_db1']['test_col1']
+    walked = []
+    index_object = SchemaIndex._index_object
+
+    def counting_index_object(self, parent_path):
+        walked.append(parent_path)
+        return index_object(self, parent_path)
+
+    monkeypatch.setattr(SchemaIndex, '_index_object', counting_index_object)
+    schema_index = SchemaIndex(collection_schema['object'])
+    assert walked == []
+    assert schema_index[('grades', 'score')]['type'] == 'integer'
+    assert walked == [(), ('grades',)]  # address object is not walked
+    names = [schema_index.full_name(path) for path in schema_index]
+    assert 'grades:score' in names and 'address.coord' in names
+    assert len(walked) == len(set(walked))
+    assert len(walked) == 1 + sum(1 for path in schema_index if 'object' in schema_index[path])
+    assert ('grades', 'unknown') not in schema_index
+    assert ('unknown', 'field') not in schema_index
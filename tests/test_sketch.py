@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from pymongo_schema.sketch import *
+
+
+def test00_hash_value_stable():
+    assert hash_value('a') == hash_value(u'a')
+    assert hash_value(1) == hash_value('1')
+    assert hash_value('a') != hash_value('b')
+    assert 0 <= hash_value('a') < 2 ** 64
+
+
+def test01_hyperloglog_small_cardinality():
+    sketch = HyperLogLog()
+    assert sketch.cardinality() == 0
+    for value in ['a', 'b', 'a', 3, 3.5]:
+        sketch.add(value)
+    assert sketch.cardinality() == 4
+
+
+def test02_hyperloglog_large_cardinality():
+    sketch = HyperLogLog()
+    for value in range(50000):
+        sketch.add(value)
+    assert abs(sketch.cardinality() - 50000) < 50000 * 0.1
+
+
+def test03_hyperloglog_merge():
+    sketch1, sketch2, sketch_all = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for value in range(2000):
+        (sketch1 if value % 3 else sketch2).add(value)
+        sketch_all.add(value)
+    sketch1.merge(sketch2)
+    assert sketch1.registers == sketch_all.registers
+    with pytest.raises(ValueError):
+        sketch1.merge(HyperLogLog(precision=4))
+
+
+def test04_hyperloglog_to_dict():
+    sketch = HyperLogLog()
+    for value in range(100):
+        sketch.add(value)
+    sketch_dict = json.loads(json.dumps(sketch.to_dict()))
+    assert HyperLogLog.from_dict(sketch_dict).registers == sketch.registers
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=4, registers=sketch.registers)
+
+
+def test05_space_saving():
+    sketch = SpaceSaving(size=3)
+    for value in ['a', 'b', 'a', 1, True, 'c', 'a']:
+        sketch.add(value)
+    assert sketch.top(1) == [('a', 3)]
+    assert sketch.top() == [('a', 3), (True, 2), ('c', 2)]
+    assert sketch.min_count() == 2
+    assert SpaceSaving.from_dict(json.loads(json.dumps(sketch.to_dict()))).top() == sketch.top()
+
+
+def test06_space_saving_merge():
+    sketch1, sketch2 = SpaceSaving(size=2), SpaceSaving(size=2)
+    for value in ['a'] * 5 + ['b'] * 2:
+        sketch1.add(value)
+    for value in ['c'] * 4 + ['a'] + ['d']:
+        sketch2.add(value)
+    sketch1.merge(sketch2)
+    # 'a' is missing from full sketch2, its count is over-estimated by sketch2 min_count
+    assert sketch1.top() == [('a', 7), ('c', 6)]
+    assert sketch1.counters[(False, 'c')] == ['c', 6, 2]
+
+
+def test07_space_saving_truncates_long_strings():
+    sketch = SpaceSaving(size=3)
+    prefix = 'x' * MAX_VALUE_LENGTH
+    for value in [prefix + 'a', prefix + 'b' * 10 ** 6, prefix]:
+        sketch.add(value)
+    assert sketch.top() == [(prefix + TRUNCATED_SUFFIX, 2), (prefix, 1)]
@@ -1,5 +1,7 @@
 import json
 import os
+from copy import deepcopy
+
 import pytest
 
 from pymongo_schema.tosql import *
@@ -173,3 +175,73 @@ def test11_schema_from_code_to_mapping():
     with open(os.path.join(TEST_DIR, 'resources', 'expected', 'mapping_from_code.json')) as f:
         exp_mapping = json.load(f)
     assert mongo_schema_to_mapping(schema) == exp_mapping
+
+
+def test12_sort_tables_by_dependencies(simple_schema, long_schema):
+    mapping = mongo_schema_to_mapping({'db': {'coll1': long_schema, 'coll0': simple_schema}})
+    foreign_keys = get_foreign_keys(mapping['db'])
+    assert foreign_keys == {'coll1__field3': ('coll1', 'id_coll1'),
+                            'coll1__field3__subfield2': ('coll1__field3', 'id_coll1__field3')}
+    assert sort_tables_by_dependencies(mapping['db'], foreign_keys) == [
+        'coll0', 'coll1', 'coll1__field3', 'coll1__field3__subfield2']
+
+
+def test13_mapping_to_ddl(long_schema):
+    mapping = mongo_schema_to_mapping({'db': {'coll1': long_schema}})
+    mapping['db']['coll1']['comment'] = "Collection's comment"
+    mapping['db']['coll1']['field']['comment'] = 'Field comment'
+    exp = '\n'.join([
+        'BEGIN;',
+        'CREATE SCHEMA IF NOT EXISTS "db";',
+        'CREATE TABLE "db"."coll1" (',
+        '    "_id" TEXT PRIMARY KEY,',
+        '    "field" TEXT,',
+        '    "field2" TEXT',
+        ');',
+        'COMMENT ON TABLE "db"."coll1" IS \'Collection\'\'s comment\';',
+        'COMMENT ON COLUMN "db"."coll1"."field" IS \'Field comment\';',
+        'CREATE TABLE "db"."coll1__field3" (',
+        '    "_id_postgres" SERIAL PRIMARY KEY,',
+        '    "id_coll1" TEXT REFERENCES "db"."coll1" ("_id"),',
+        '    "subfield1" TEXT',
+        ');',
+        'CREATE INDEX "coll1__field3__id_coll1_idx" ON "db"."coll1__field3" ("id_coll1");',
+        'CREATE TABLE "db"."coll1__field3__subfield2" (',
+        '    "_id_postgres" SERIAL PRIMARY KEY,',
+        '    "id_coll1__field3" INTEGER REFERENCES "db"."coll1__field3" ("_id_postgres"),',
+        '    "subfield2" TEXT',
+        ');',
+        'CREATE INDEX "coll1__field3__subfield2__id_coll1__field3_idx" '
+        'ON "db"."coll1__field3__subfield2" ("id_coll1__field3");',
+        'COMMIT;', ''])
+    assert mapping_to_ddl(mapping, with_indexes=True) == exp
+    assert 'CREATE INDEX' not in mapping_to_ddl(mapping)
+
+
+def test14_mongo_schema_to_mapping_with_stats(long_schema):
+    collection_schema = deepcopy(long_schema)
+    collection_schema['object']['_id'] = {'types_count': {'integer': 10}, 'count': 10,
+                                          'type': 'integer', 'prop_in_object': 1.0,
+                                          'stats': {'distinct': 10, 'min': 1, 'max': 10}}
+    collection_schema['object']['field']['stats'] = {'distinct': 3, 'max_length': 20}
+    field3_object = collection_schema['object']['field3']['object']
+    field3_object['subfield2']['stats'] = {'distinct': 5, 'max_length': 3}
+    mapping = mongo_schema_to_mapping({'db': {'coll1': collection_schema}})['db']
+    assert mapping['coll1']['_id']['type'] == 'SMALLINT'
+    assert mapping['coll1']['field']['type'] == 'VARCHAR(20)'
+    assert mapping['coll1']['field2']['type'] == 'TEXT'
+    assert mapping['coll1__field3']['id_coll1'] == {'type': 'SMALLINT'}
+    assert mapping['coll1__field3__subfield2']['subfield2']['type'] == 'VARCHAR(3)'
+
+
+def test15_index_name_truncated():
+    assert index_name('coll1__field3', 'id_coll1') == 'coll1__field3__id_coll1_idx'
+    table = 'collection__' + 'nested_array__' * 4
+    name = index_name(table, 'id_' + table)
+    assert len(name) == MAX_IDENTIFIER_LENGTH and name.endswith('_idx')
+    assert name.startswith(table[:40])
+    # names sharing the 63 first bytes are still different
+    assert index_name(table, 'id_' + table + 'other') != name
+    name = index_name(u'é' * 40, 'id')
+    assert len(name.encode('utf-8')) <= MAX_IDENTIFIER_LENGTH
+    assert name.startswith(u'é' * 25)